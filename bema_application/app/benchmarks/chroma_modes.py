@@ -0,0 +1,176 @@
+"""
+Compares embedded (PersistentClient per process) and client/server (HttpClient) Chroma.
+
+    python -m benchmarks.chroma_modes --start-server --workers 4 --docs 20000
+    python -m benchmarks.chroma_modes --host localhost --port 8001 --workers 4
+
+Every worker process stands in for one uvicorn worker: it opens the store the
+way CHROMA_MODE would, runs similarity queries from a few threads, and appends
+chat-history entries at the same time. Reported per mode: query latency and
+throughput, write latency and failed writes, and the resident memory of all
+workers (plus the server with --start-server). Vectors are random 384-d unit
+vectors, so only the store is measured, not MiniLM.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import httpx
+import numpy as np
+from benchmarks.load_test import _percentile
+
+DIMENSIONS = 384
+COLLECTION = "bench-chat-history"
+
+
+def _rss_mib(pid: str = "self") -> float:
+    with open(f"/proc/{pid}/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _vectors(rng, n: int) -> list:
+    vectors = rng.standard_normal((n, DIMENSIONS), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.tolist()
+
+
+def _client(mode: str, path: str, host: str, port: int):
+    import chromadb
+    from chromadb.config import Settings
+    settings = Settings(anonymized_telemetry=False)
+    if mode == "http":
+        return chromadb.HttpClient(host=host, port=port, settings=settings)
+    return chromadb.PersistentClient(path=path, settings=settings)
+
+
+def _seed(mode: str, path: str, host: str, port: int, docs: int):
+    client = _client(mode, path, host, port)
+    try:
+        client.delete_collection(COLLECTION)
+    except Exception:
+        pass
+    collection = client.create_collection(COLLECTION, metadata={"hnsw:space": "cosine"})
+    rng = np.random.default_rng(0)
+    for start in range(0, docs, 1000):
+        count = min(1000, docs - start)
+        collection.add(
+            ids=[str(start + i) for i in range(count)],
+            embeddings=_vectors(rng, count),
+            documents=[f"chat turn {start + i}" for i in range(count)],
+        )
+
+
+def _worker(args) -> dict:
+    mode, path, host, port, threads, queries, writes, seed = args
+    collection = _client(mode, path, host, port).get_collection(COLLECTION)
+    rng = np.random.default_rng(seed)
+    query_vectors = _vectors(rng, queries)
+    write_vectors = _vectors(rng, writes)
+    collection.query(query_embeddings=[query_vectors[0]], n_results=3)  # load the index before timing
+
+    def query(i):
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query_vectors[i]], n_results=3)
+        return time.perf_counter() - started
+
+    def write(i):
+        started = time.perf_counter()
+        try:
+            collection.add(ids=[str(uuid.uuid4())], embeddings=[write_vectors[i]], documents=[f"new turn {i}"])
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, f"{type(e).__name__}: {e}"
+
+    started = time.perf_counter()
+    # One thread appends chat history (like add_to_memory) while the others query.
+    with ThreadPoolExecutor(max_workers=1) as writer, ThreadPoolExecutor(max_workers=threads) as readers:
+        writes_done = writer.submit(lambda: [write(i) for i in range(writes)])
+        query_latencies = list(readers.map(query, range(queries)))
+        write_results = writes_done.result()
+    return {
+        "elapsed": time.perf_counter() - started,
+        "query_latencies": query_latencies,
+        "write_latencies": [latency for latency, error in write_results if error is None],
+        "write_errors": [error for _, error in write_results if error is not None],
+        "rss_mib": _rss_mib(),
+    }
+
+
+def _bench(mode: str, path: str, host: str, port: int, args, server_pid: Optional[int]):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:  # seed from a separate process so no worker starts with a warm cache
+        pool.apply(_seed, (mode, path, host, port, args.docs))
+
+    jobs = [(mode, path, host, port, args.threads, args.queries, args.writes, seed) for seed in range(args.workers)]
+    started = time.perf_counter()
+    with context.Pool(args.workers) as pool:
+        results = pool.map(_worker, jobs)
+    wall = time.perf_counter() - started
+
+    query_latencies = sorted(l for r in results for l in r["query_latencies"])
+    write_latencies = sorted(l for r in results for l in r["write_latencies"])
+    errors = [e for r in results for e in r["write_errors"]]
+    worker_rss = sum(r["rss_mib"] for r in results)
+    server_rss = _rss_mib(str(server_pid)) if server_pid else None
+
+    print(f"\n{mode} ({args.workers} workers x {args.threads} threads, {args.docs} stored entries):")
+    print(f"  query  p50 {_percentile(query_latencies, 0.5) * 1000:7.2f}ms   p95 {_percentile(query_latencies, 0.95) * 1000:7.2f}ms"
+          f"   {len(query_latencies) / wall:8.1f} queries/s")
+    print(f"  write  p50 {_percentile(write_latencies, 0.5) * 1000:7.2f}ms   p95 {_percentile(write_latencies, 0.95) * 1000:7.2f}ms"
+          f"   {len(errors)} failed")
+    if errors:
+        print(f"         first failure: {errors[0][:120]}")
+    server_note = f" + server {server_rss:.0f} MiB" if server_rss is not None else ""
+    print(f"  memory workers {worker_rss:.0f} MiB ({worker_rss / args.workers:.0f} MiB each){server_note}")
+
+
+def _start_server(chroma_bin: str, path: str, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [chroma_bin, "run", "--path", path, "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://localhost:{port}/api/v2/heartbeat", timeout=1).raise_for_status()
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    server.kill()
+    raise SystemExit("Chroma server did not start within 60s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--start-server", action="store_true", help="Start `chroma run` on --port for the run")
+    parser.add_argument("--chroma-bin", default=shutil.which("chroma") or "chroma")
+    parser.add_argument("--modes", nargs="+", choices=("embedded", "http"), default=["embedded", "http"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500, help="Queries per worker")
+    parser.add_argument("--writes", type=int, default=100, help="Chat-history writes per worker")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chroma-bench-")
+    server = _start_server(args.chroma_bin, os.path.join(workdir, "server"), args.port) if args.start_server and "http" in args.modes else None
+    try:
+        for mode in args.modes:
+            server_pid = server.pid if server and mode == "http" else None
+            _bench(mode, os.path.join(workdir, "embedded"), args.host, args.port, args, server_pid)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
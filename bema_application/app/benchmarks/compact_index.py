@@ -0,0 +1,120 @@
+"""
+Memory and latency of the compact chat-memory index against Chroma.
+
+    python -m benchmarks.compact_index --rows 10000 100000
+    python -m benchmarks.compact_index --rows 50000 --pca-dims 128 --queries 1000
+
+For every size, one index per backend is built from the same vectors, then
+reopened in a fresh process that runs the queries, so the reported resident
+memory is what a worker pays to serve that index. Recall@k is measured against
+an exact float32 scan. The vectors are clustered 384-d unit vectors, shaped
+like MiniLM chat embeddings (many turns about a few topics).
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from benchmarks.chroma_modes import _rss_mib
+from benchmarks.load_test import _percentile
+from utils.compact_index import CompactVectorIndex
+
+DIMENSIONS = 384
+COLLECTION = "bench-chat-history"
+
+
+def _dataset(rows: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 200, 10), DIMENSIONS), dtype=np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, DIMENSIONS), dtype=np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(rows), sample(queries)
+
+
+def _directory_mib(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files) / 2**20
+
+
+def _build(backend: str, path: str, vectors: np.ndarray, pca_dims: int):
+    ids = [str(i) for i in range(len(vectors))]
+    documents = [f"chat turn {i}" for i in ids]
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection(COLLECTION, metadata={"hnsw:space": "cosine"})
+        for start in range(0, len(vectors), 5000):
+            collection.add(
+                ids=ids[start:start + 5000], embeddings=vectors[start:start + 5000].tolist(), documents=documents[start:start + 5000]
+            )
+        return
+    index = CompactVectorIndex(path)
+    if backend == "compact-pca":
+        index.fit_pca(vectors[:min(len(vectors), 5000)], pca_dims)
+    for start in range(0, len(vectors), 5000):
+        index.add(ids[start:start + 5000], vectors[start:start + 5000], documents[start:start + 5000])
+
+
+def _serve(backend: str, path: str, queries: np.ndarray, k: int, rescore_factor: int) -> dict:
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+        baseline = _rss_mib()  # after the import: count the index, not the library
+        collection = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False)).get_collection(COLLECTION)
+        search = lambda q: [int(i) for i in collection.query(query_embeddings=[q.tolist()], n_results=k)["ids"][0]]
+    else:
+        baseline = _rss_mib()
+        index = CompactVectorIndex(path, rescore_factor=rescore_factor)
+        search = lambda q: [int(entry_id) for entry_id, _, _ in index.search(q, k)]
+    search(queries[0])  # open/load the index before timing
+    latencies, hits = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits.append(search(query))
+        latencies.append(time.perf_counter() - started)
+    return {"latencies": sorted(latencies), "hits": hits, "rss_mib": _rss_mib() - baseline}
+
+
+def _run(rows: int, args, workdir: str):
+    vectors, queries = _dataset(rows, args.queries)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+    context = multiprocessing.get_context("spawn")
+    print(f"\n{rows} entries, {args.queries} queries, k={args.k} (float32 vectors alone: {vectors.nbytes / 2**20:.1f} MiB):")
+    print(f"  {'backend':<12} {'build':>8} {'disk':>10} {'resident':>10} {'p50':>9} {'p95':>9} {'recall':>7}")
+    for backend in args.backends:
+        path = os.path.join(workdir, f"{backend}-{rows}")
+        started = time.perf_counter()
+        with context.Pool(1) as pool:
+            pool.apply(_build, (backend, path, vectors, args.pca_dims))
+        build_seconds = time.perf_counter() - started
+        with context.Pool(1) as pool:
+            result = pool.apply(_serve, (backend, path, queries, args.k, args.rescore_factor))
+        recall = np.mean([len(set(h) & set(e)) / args.k for h, e in zip(result["hits"], exact.tolist())])
+        print(
+            f"  {backend:<12} {build_seconds:7.1f}s {_directory_mib(path):7.1f} MiB {result['rss_mib']:7.1f} MiB "
+            f"{_percentile(result['latencies'], 0.5) * 1000:7.2f}ms {_percentile(result['latencies'], 0.95) * 1000:7.2f}ms "
+            f"{recall:7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3, help="Results per query (chat_service uses 3)")
+    parser.add_argument("--pca-dims", type=int, default=128)
+    parser.add_argument("--rescore-factor", type=int, default=10, help="Candidates re-scored with float vectors, per result")
+    parser.add_argument("--backends", nargs="+", choices=("chroma", "compact", "compact-pca"), default=["chroma", "compact", "compact-pca"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="compact-index-bench-")
+    try:
+        for rows in args.rows:
+            _run(rows, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,108 @@
+"""
+Parity check and CPU throughput benchmark for the emotion detection backends.
+
+    python -m benchmarks.emotion_backends --images path/to/sample_images --backend onnx
+    python -m benchmarks.emotion_backends --images path/to/sample_images --backend openvino --int8
+
+The PyTorch models are the reference. For every image, the person box and
+the emotion label from the chosen backend are compared with the reference.
+Throughput is measured end to end (both models) one image at a time and in
+batches.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+from typing import List, Tuple
+from dotenv import load_dotenv
+from PIL import Image
+from services.emotion_service import EMOTION_LABELS
+from services.yolo_backends import YOLO_BACKENDS, load_yolo_model
+
+load_dotenv()
+
+# Same defaults as routes/emotion_route.py (not imported: that module loads the models on import).
+YOLO_PATH = os.getenv("YOLO_PATH", "resources/yolo11n.pt")
+EMOTION_PATH = os.getenv("EMOTION_PATH", "resources/best.pt")
+
+
+def _iou(a, b) -> float:
+    ix1, iy1, ix2, iy2 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def _predict(person_model, emotion_model, images: List[Image.Image]) -> List[Tuple[object, str]]:
+    """Returns (person box or None, emotion label or None) per image, mirroring EmotionService."""
+    outputs = []
+    person_results = person_model(images, verbose=False)
+    crops = []
+    for image, result in zip(images, person_results):
+        if len(result.boxes) == 0:
+            outputs.append([None, None])
+            continue
+        box = result.boxes[0].xyxy[0].cpu().numpy().tolist()
+        outputs.append([box, None])
+        crops.append((len(outputs) - 1, image.crop(tuple(box))))
+    if crops:
+        emotion_results = emotion_model([crop for _, crop in crops], verbose=False)
+        for (i, _), result in zip(crops, emotion_results):
+            if len(result.boxes):
+                outputs[i][1] = EMOTION_LABELS[int(result.boxes.cls[0].item())]
+    return [tuple(output) for output in outputs]
+
+
+def _throughput(person_model, emotion_model, images, batch_size: int) -> float:
+    _predict(person_model, emotion_model, images[:batch_size])  # warmup
+    started = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        _predict(person_model, emotion_model, images[i:i + batch_size])
+    return len(images) / (time.perf_counter() - started)
+
+
+def run(image_dir: str, backend: str, int8: bool, batch_size: int):
+    paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(image_dir, f"*.{ext}")))
+    if not paths:
+        raise SystemExit(f"No jpg/jpeg/png images found in {image_dir}")
+    images = [Image.open(path).convert("RGB") for path in paths]
+    print(f"{len(images)} sample image(s) from {image_dir}")
+
+    reference = (load_yolo_model(YOLO_PATH), load_yolo_model(EMOTION_PATH))
+    candidate = (
+        load_yolo_model(YOLO_PATH, backend=backend, int8=int8),
+        load_yolo_model(EMOTION_PATH, backend=backend, int8=int8),
+    )
+
+    # --- Parity ---
+    expected = _predict(*reference, images)
+    actual = _predict(*candidate, images)
+    detection_agree = sum((e[0] is None) == (a[0] is None) for e, a in zip(expected, actual))
+    label_agree = sum(e[1] == a[1] for e, a in zip(expected, actual))
+    ious = [_iou(e[0], a[0]) for e, a in zip(expected, actual) if e[0] is not None and a[0] is not None]
+    print(f"\nParity of {backend}{' int8' if int8 else ''} against torch:")
+    print(f"  person detected/not detected agreement: {detection_agree}/{len(images)}")
+    print(f"  emotion label agreement:                {label_agree}/{len(images)}")
+    if ious:
+        print(f"  person box IoU: mean={statistics.mean(ious):.3f} min={min(ious):.3f}")
+    for path, e, a in zip(paths, expected, actual):
+        if e[1] != a[1]:
+            print(f"    mismatch {os.path.basename(path)}: torch={e[1]} {backend}={a[1]}")
+
+    # --- Throughput ---
+    print("\nCPU throughput (images/s, both models):")
+    for name, models in (("torch", reference), (backend, candidate)):
+        single = _throughput(*models, images, 1)
+        batched = _throughput(*models, images, batch_size)
+        print(f"  {name:<10} batch=1: {single:7.2f}   batch={batch_size}: {batched:7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Directory with sample jpg/png images")
+    parser.add_argument("--backend", choices=[b for b in YOLO_BACKENDS if b != "torch"], default="onnx")
+    parser.add_argument("--int8", action="store_true", help="Use the int8-quantized export")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+    run(args.images, args.backend, args.int8, args.batch_size)
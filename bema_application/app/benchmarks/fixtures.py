@@ -0,0 +1,12 @@
+"""Sample inputs shared by the benchmark and load-test scripts."""
+from models.user_health import UserHealthProfile
+
+SAMPLE_PROFILE = UserHealthProfile(
+    userId="benchmark-user", age=45, gender="Male", height=175, heightUnit="cm", weight=85, weightUnit="kg",
+    profession="Software Developer", smokes=False, smokingFrequency=None, drinks=True, glassesPerWeek="3-5",
+    exercises=False, favoriteExercise=None, hasDisabilitiesOrSpecialNeeds=False, disabilityDiscription=None,
+    hasAllergies=False, allergyType=None, hadSurgeries=False, surgeryType=None, surgeryYear=None,
+    hasHighBloodPressure=True, highBloodPressureTreatmentYears=5, hasDiabetes=False, diabetesTreatmentYears=None,
+    hasCholesterol=True, cholesterolTreatmentYears=3, hasFamilyMedicalHistory=True,
+    familyMedicalHistoryDiscription="Father had a heart attack at age 55."
+)
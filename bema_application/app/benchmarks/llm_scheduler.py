@@ -0,0 +1,97 @@
+"""
+Queue wait of chat turns behind a burst of bulk generations, with and without core.llm_scheduler.
+
+    python -m benchmarks.llm_scheduler
+    python -m benchmarks.llm_scheduler --bulk-burst 60 --chat-calls 40 --time-scale 0.05
+
+The backend is simulated (every call sleeps for its service time), so only the
+queueing is measured. Scenario: one user submits a burst of recommendation
+generations, a few other users submit a couple each, and chat turns from
+different users arrive at a steady rate. The "fifo" run is a plain semaphore of
+the same size (first come, first served, like Ollama's own queue); the
+"scheduler" run uses LlmScheduler with its default class caps.
+"""
+import argparse
+import threading
+import time
+from collections import defaultdict
+from core.llm_scheduler import BULK, INTERACTIVE, LLM_CLASS_CONCURRENCY, LlmDeadlineExceeded, LlmScheduler
+from benchmarks.load_test import _percentile
+
+
+def _calls(args):
+    """(start offset, priority, user, service seconds) in unscaled seconds."""
+    calls = [(0.0, BULK, "burst-user", args.bulk_seconds) for _ in range(args.bulk_burst)]
+    for user in range(args.bulk_users):
+        calls += [(0.5 + user * 0.1, BULK, f"bulk-user-{user}", args.bulk_seconds) for _ in range(2)]
+    calls += [(1.0 + i * args.chat_interval, INTERACTIVE, f"chat-user-{i % 10}", args.chat_seconds) for i in range(args.chat_calls)]
+    return calls
+
+
+def _run(mode: str, args) -> dict:
+    scale = args.time_scale
+    scheduler = LlmScheduler(
+        concurrency=args.concurrency,
+        class_concurrency={INTERACTIVE: args.concurrency, BULK: min(args.concurrency, LLM_CLASS_CONCURRENCY[BULK])},
+        max_wait={INTERACTIVE: args.chat_max_wait * scale, BULK: 10_000.0},
+    )
+    fifo = threading.Semaphore(args.concurrency)
+    waits, finished, dropped = defaultdict(list), defaultdict(float), defaultdict(int)
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def call(offset, priority, user, service):
+        time.sleep(max(0.0, started + offset * scale - time.perf_counter()))
+        queued = time.perf_counter()
+        try:
+            if mode == "fifo":
+                with fifo:
+                    wait = time.perf_counter() - queued
+                    time.sleep(service * scale)
+            else:
+                with scheduler.slot(priority, user_id=user):
+                    wait = time.perf_counter() - queued
+                    time.sleep(service * scale)
+        except LlmDeadlineExceeded:
+            with lock:
+                dropped[priority] += 1
+            return
+        with lock:
+            waits[priority].append(wait / scale)
+            finished[user] = max(finished[user], (time.perf_counter() - started) / scale)
+
+    threads = [threading.Thread(target=call, args=c) for c in _calls(args)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"waits": waits, "finished": finished, "dropped": dropped}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="Backend slots (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--bulk-burst", type=int, default=40, help="Generations submitted at once by one user")
+    parser.add_argument("--bulk-users", type=int, default=3, help="Other users submitting 2 generations each")
+    parser.add_argument("--bulk-seconds", type=float, default=8.0)
+    parser.add_argument("--chat-calls", type=int, default=30)
+    parser.add_argument("--chat-interval", type=float, default=2.0)
+    parser.add_argument("--chat-seconds", type=float, default=2.0)
+    parser.add_argument("--chat-max-wait", type=float, default=20.0)
+    parser.add_argument("--time-scale", type=float, default=0.02, help="Wall seconds per simulated second")
+    args = parser.parse_args()
+
+    for mode in ("fifo", "scheduler"):
+        result = _run(mode, args)
+        print(f"\n{mode}:")
+        for priority in (INTERACTIVE, BULK):
+            waits = sorted(result["waits"][priority])
+            print(
+                f"  {priority:<12} wait p50 {_percentile(waits, 0.5):6.1f}s  p95 {_percentile(waits, 0.95):6.1f}s  "
+                f"max {max(waits, default=0):6.1f}s  dropped {result['dropped'][priority]}"
+            )
+        light = [t for user, t in result["finished"].items() if user.startswith("bulk-user-")]
+        print(
+            f"  bulk users done at: burst user {result['finished']['burst-user']:.0f}s, "
+            f"other bulk users {max(light, default=0):.0f}s (simulated)"
+        )
@@ -0,0 +1,135 @@
+"""
+Closed-loop load test for the BeMA API. Reports throughput and tail latency per endpoint.
+
+Start the stand-in server and the API pointed at it (see benchmarks/standin_server.py), then:
+
+    python -m benchmarks.load_test --base-url http://localhost:8000 --concurrency 8 --duration 60
+    python -m benchmarks.load_test --targets bot voice --requests 200
+
+`agent` runs once first (unless skipped) so that the load-test profile exists in
+MySQL for the workout endpoints.
+"""
+import argparse
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import httpx
+from benchmarks.fixtures import SAMPLE_PROFILE
+
+LOAD_TEST_USER_ID = "load-test-user"
+# The stand-in STT ignores the audio content; any small payload will do.
+FAKE_AUDIO = b"ID3" + b"\x00" * 2048
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+@dataclass
+class TargetStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=dict)
+
+
+def _profile_payload() -> dict:
+    return SAMPLE_PROFILE.model_copy(update={"userId": LOAD_TEST_USER_ID}).model_dump()
+
+
+async def _call(client: httpx.AsyncClient, target: str) -> httpx.Response:
+    if target == "bot":
+        return await client.post("/api/bot/", json={"question": "How much water should I drink?", "emotion": "Neutral"})
+    if target == "agent":
+        return await client.post("/api/agent/", json=_profile_payload())
+    if target == "voice":
+        return await client.post("/api/voice/", files={"audio_file": ("question.mp3", FAKE_AUDIO, "audio/mpeg")})
+    if target == "workout_plan":
+        return await client.get(f"/api/workout/plan/{LOAD_TEST_USER_ID}")
+    if target == "workout_summary":
+        return await client.post("/api/workout/pose-summary", json={
+            "user_id": LOAD_TEST_USER_ID,
+            "exercise": "squat",
+            "reps": 12,
+            "accuracy": 87.5,
+            "timestamp": "2025-10-17T14:30:00.000Z",
+            "duration": 90,
+            "feedback_points": ["Keep knees aligned"],
+        })
+    raise ValueError(f"Unknown target: {target}")
+
+
+async def _worker(client, targets, stats, deadline: Optional[float], remaining: List[int], worker_index: int):
+    i = worker_index
+    while True:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return
+        if deadline is None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        target = targets[i % len(targets)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await _call(client, target)
+            # Drain streamed bodies (e.g. /voice/) so latency covers the full response.
+            await response.aread()
+            code = response.status_code
+        except httpx.HTTPError:
+            code = 0
+        elapsed = time.perf_counter() - started
+        target_stats = stats[target]
+        target_stats.latencies.append(elapsed)
+        target_stats.status_codes[code] = target_stats.status_codes.get(code, 0) + 1
+        if code == 0 or code >= 400:
+            target_stats.errors += 1
+
+
+def _report(stats: Dict[str, TargetStats], wall_seconds: float):
+    print(f"\n{'target':<16}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    total = 0
+    for target, target_stats in stats.items():
+        values = sorted(target_stats.latencies)
+        total += len(values)
+        print(
+            f"{target:<16}{len(values):>7}{target_stats.errors:>8}{len(values) / wall_seconds:>9.2f}"
+            f"{_percentile(values, 0.50) * 1000:>10.0f}{_percentile(values, 0.95) * 1000:>10.0f}"
+            f"{_percentile(values, 0.99) * 1000:>10.0f}{(values[-1] if values else 0) * 1000:>10.0f}"
+            f"   {dict(sorted(target_stats.status_codes.items()))}"
+        )
+    print(f"\nTotal: {total} requests in {wall_seconds:.1f}s ({total / wall_seconds:.2f} req/s)")
+
+
+async def run(base_url: str, targets: List[str], concurrency: int, duration: Optional[float], requests: int, setup: bool):
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        if setup:
+            print("Seeding load-test profile through /api/agent/ ...")
+            response = await _call(client, "agent")
+            print(f"  -> {response.status_code}")
+
+        stats = {target: TargetStats() for target in targets}
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [requests]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _worker(client, targets, stats, deadline, remaining, i) for i in range(concurrency)
+        ))
+        _report(stats, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    all_targets = ["bot", "agent", "voice", "workout_plan", "workout_summary"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--targets", nargs="+", choices=all_targets, default=all_targets)
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds")
+    parser.add_argument("--requests", type=int, default=100, help="Total requests when --duration is not set")
+    parser.add_argument("--skip-setup", action="store_true", help="Don't seed the profile via /agent/ first")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.base_url, args.targets, args.concurrency, args.duration, args.requests, not args.skip_setup))
@@ -0,0 +1,119 @@
+"""
+Routing over several Ollama stand-in servers with core.ollama_pool.
+
+    python -m benchmarks.ollama_pool
+    python -m benchmarks.ollama_pool --latencies-ms 300 300 2000 --requests 300 --hedge-after 0.5
+
+Starts one benchmarks.standin_server per entry of --latencies-ms (ports from
+--base-port on) and sends chat-sized /api/generate requests from --concurrency
+threads in three phases:
+
+  balanced  least-outstanding-requests routing, no hedging
+  hedged    the same load with hedging after --hedge-after seconds
+  outage    the first server is killed halfway through; shows failover and the
+            circuit breaker
+
+Per phase: latency percentiles, failed requests and how many requests each
+endpoint served.
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+import requests
+from benchmarks.load_test import _percentile
+from core.metrics import metrics
+from core.ollama_pool import OllamaPool
+
+PAYLOAD = {"model": "qwen3:8b", "prompt": "How much water should I drink?", "stream": False}
+
+
+def _start_servers(latencies_ms, base_port: int, jitter_ms: float):
+    servers, urls = [], []
+    for i, latency in enumerate(latencies_ms):
+        port = base_port + i
+        servers.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.standin_server", "--port", str(port),
+             "--latency-ms", str(latency), "--jitter-ms", str(jitter_ms)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+        urls.append(f"http://127.0.0.1:{port}")
+    deadline = time.time() + 30
+    for url in urls:
+        while True:
+            try:
+                requests.get(f"{url}/api/version", timeout=1).raise_for_status()
+                break
+            except requests.RequestException:
+                if time.time() > deadline:
+                    raise SystemExit(f"Stand-in server {url} did not start.")
+                time.sleep(0.2)
+    return servers, urls
+
+
+def _served(pool: OllamaPool) -> Counter:
+    counts = Counter()
+    for series in metrics.snapshot()["counters"].get("ollama.endpoint.requests", []):
+        if series["labels"]["result"] == "ok" and any(e.label == series["labels"]["endpoint"] for e in pool.endpoints):
+            counts[series["labels"]["endpoint"]] += series["value"]
+    return counts
+
+
+def _phase(name: str, pool: OllamaPool, args, hedge: bool, on_halfway=None):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    next_request = iter(range(args.requests))
+    served_before = _served(pool)
+
+    def worker():
+        for i in next_request:
+            if i == args.requests // 2 and on_halfway:
+                on_halfway()
+            started = time.perf_counter()
+            try:
+                pool.post("/api/generate", PAYLOAD, timeout=30, hedge=hedge).raise_for_status()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except requests.RequestException as e:
+                with lock:
+                    errors.append(type(e).__name__)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.shutdown(wait=True)  # losing hedges still count as load on their endpoint
+
+    latencies.sort()
+    served = _served(pool) - served_before
+    print(f"\n{name}:")
+    print(
+        f"  p50 {_percentile(latencies, 0.5) * 1000:7.0f}ms  p95 {_percentile(latencies, 0.95) * 1000:7.0f}ms  "
+        f"p99 {_percentile(latencies, 0.99) * 1000:7.0f}ms  failed {len(errors)} {dict(Counter(errors))}"
+    )
+    print("  served: " + ", ".join(f"{e.label} {int(served[e.label])}" for e in pool.endpoints))
+    print("  breakers: " + ", ".join(f"{e.label} {e.state}" for e in pool.endpoints))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencies-ms", type=float, nargs="+", default=[300, 300, 1500], help="One stand-in server each")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--base-port", type=int, default=11500)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per phase")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--hedge-after", type=float, default=0.6)
+    args = parser.parse_args()
+
+    servers, urls = _start_servers(args.latencies_ms, args.base_port, args.jitter_ms)
+    try:
+        _phase("balanced", OllamaPool(urls, health_interval=0), args, hedge=False)
+        _phase("hedged", OllamaPool(urls, health_interval=0, hedge_after=args.hedge_after), args, hedge=True)
+        _phase("outage", OllamaPool(urls, health_interval=0), args, hedge=False, on_halfway=servers[0].kill)
+    finally:
+        for server in servers:
+            server.kill()
+            server.wait()
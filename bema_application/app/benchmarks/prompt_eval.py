@@ -0,0 +1,69 @@
+"""
+Measures Ollama prompt-eval cost of the recommendation prompt with and without prefix reuse.
+
+    python -m benchmarks.prompt_eval --runs 5
+
+"cold" makes every system prompt unique (a nonce is prepended), which is what
+happens when the static instructions are not a stable prefix; "warm" sends the
+unchanged RECOMMENDATION_SYSTEM_PROMPT so Ollama can reuse its cached prefix.
+"""
+import argparse
+import statistics
+import uuid
+import requests
+from models.rag_state import RagState
+from models.suggestion import Suggestion
+from benchmarks.fixtures import SAMPLE_PROFILE
+from core.ollama_pool import OLLAMA_URLS, model_for
+from services.agent_service import OLLAMA_KEEP_ALIVE, RECOMMENDATION_SYSTEM_PROMPT, build_recommendation_prompt
+
+def _generate(system: str, prompt: str) -> dict:
+    # Always the first endpoint: the prefix cache being measured is per server.
+    res = requests.post(
+        f"{OLLAMA_URLS[0]}/api/generate",
+        json={
+            "model": model_for("recommendation"),
+            "system": system,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {"temperature": 0.2, "num_predict": 1},
+            "format": Suggestion.model_json_schema(),
+        },
+        timeout=300,
+    )
+    res.raise_for_status()
+    return res.json()
+
+
+def run(runs: int):
+    state = RagState(
+        health_profile=SAMPLE_PROFILE,
+        question="Provide health recommendations for a 45-year-old Male Software Developer.",
+        retries=0,
+        context="Blood pressure 145/90 mmHg, LDL cholesterol 160 mg/dL, sedentary desk job.",
+        web_context="The AHA recommends 150 minutes of moderate aerobic activity per week.",
+    )
+    prompt = build_recommendation_prompt(state)
+    print(f"System prefix: {len(RECOMMENDATION_SYSTEM_PROMPT)} chars, per-user prompt: {len(prompt)} chars")
+
+    for mode in ("cold", "warm"):
+        counts, durations = [], []
+        for _ in range(runs):
+            system = RECOMMENDATION_SYSTEM_PROMPT
+            if mode == "cold":
+                system = f"Request {uuid.uuid4()}\n{system}"
+            stats = _generate(system, prompt)
+            counts.append(stats.get("prompt_eval_count", 0))
+            durations.append(stats.get("prompt_eval_duration", 0) / 1e6)
+        print(
+            f"{mode:>5}: prompt_eval_count mean={statistics.mean(counts):.0f} "
+            f"prompt_eval_duration mean={statistics.mean(durations):.0f}ms "
+            f"median={statistics.median(durations):.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    run(parser.parse_args().runs)
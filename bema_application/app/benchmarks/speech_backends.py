@@ -0,0 +1,109 @@
+"""
+Compares the speech backends: real-time factor (RTF) per backend and end-to-end /voice/ latency.
+
+    python -m benchmarks.speech_backends --audio samples/*.wav --stt groq faster_whisper --tts gtts piper
+    python -m benchmarks.speech_backends --audio samples/q1.mp3 --voice-url http://localhost:8000 --requests 20
+
+RTF = processing time / audio duration (input audio for STT, generated audio
+for TTS). Below 1.0 means faster than real time. With --voice-url the sample
+audio is posted to a running API, and its p50/p95 latency and Server-Timing
+stages are reported. Run it once per server configured with a different
+VOICE_STT_BACKEND/VOICE_TTS_BACKEND to compare end to end.
+"""
+import argparse
+import statistics
+import time
+from typing import List
+import httpx
+from benchmarks.load_test import _percentile
+from services.speech_backends import (
+    STT_BACKENDS, TTS_BACKENDS, audio_duration_seconds, create_stt_backend, create_tts_backend
+)
+
+SAMPLE_SENTENCES = [
+    "Drink at least eight glasses of water a day.",
+    "A thirty minute walk after dinner helps keep your blood sugar steady.",
+    "Try to go to bed at the same time every night, even on weekends.",
+]
+
+
+def _bench_stt(name: str, clips: List[bytes], runs: int):
+    backend = create_stt_backend(name)
+    backend.warmup()
+    audio_seconds = sum(audio_duration_seconds(clip) for clip in clips) * runs
+    started = time.perf_counter()
+    for _ in range(runs):
+        for clip in clips:
+            text = backend.transcribe(clip)
+    elapsed = time.perf_counter() - started
+    print(f"  STT {name:<15} RTF {elapsed / audio_seconds:6.3f}   ({elapsed:.2f}s for {audio_seconds:.1f}s of audio)  last: '{text}'")
+
+
+def _bench_tts(name: str, runs: int):
+    backend = create_tts_backend(name)
+    backend.warmup()
+    audio_seconds = 0.0
+    started = time.perf_counter()
+    for _ in range(runs):
+        for sentence in SAMPLE_SENTENCES:
+            audio_seconds += audio_duration_seconds(backend.synthesize(sentence))
+    elapsed = time.perf_counter() - started
+    print(f"  TTS {name:<15} RTF {elapsed / audio_seconds:6.3f}   ({elapsed:.2f}s for {audio_seconds:.1f}s of audio)")
+
+
+def _bench_voice(base_url: str, clip: bytes, requests: int, pipelined: bool):
+    latencies, first_byte, stages = [], [], {}
+    with httpx.Client(base_url=base_url, timeout=300) as client:
+        for _ in range(requests):
+            started = time.perf_counter()
+            with client.stream(
+                "POST", "/api/voice/",
+                params={"pipelined": str(pipelined).lower()},
+                files={"audio_file": ("question.mp3", clip, "audio/mpeg")}
+            ) as response:
+                response.raise_for_status()
+                chunks = response.iter_bytes()
+                next(chunks, None)
+                first_byte.append(time.perf_counter() - started)
+                for _ in chunks:
+                    pass
+            latencies.append(time.perf_counter() - started)
+            for entry in response.headers.get("server-timing", "").split(","):
+                parts = dict(p.strip().split("=", 1) for p in entry.split(";")[1:] if "=" in p)
+                if "dur" in parts:
+                    stages.setdefault(entry.split(";")[0].strip(), []).append(float(parts["dur"]))
+
+    latencies.sort()
+    first_byte.sort()
+    mode = "pipelined" if pipelined else "buffered"
+    print(f"\n/voice/ ({mode}, {requests} requests against {base_url}):")
+    print(f"  total        p50 {_percentile(latencies, 0.5):6.2f}s   p95 {_percentile(latencies, 0.95):6.2f}s")
+    print(f"  first audio  p50 {_percentile(first_byte, 0.5):6.2f}s   p95 {_percentile(first_byte, 0.95):6.2f}s")
+    for stage, durations in stages.items():
+        print(f"  {stage:<12} mean {statistics.mean(durations):8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", nargs="+", required=True, help="Sample spoken questions (wav/mp3)")
+    parser.add_argument("--stt", nargs="*", choices=STT_BACKENDS, default=[])
+    parser.add_argument("--tts", nargs="*", choices=TTS_BACKENDS, default=[])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--voice-url", help="Base URL of a running API to measure /voice/ end to end")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--pipelined", action="store_true", help="Use the pipelined /voice/ mode")
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            clips.append(f.read())
+
+    if args.stt or args.tts:
+        print("Real-time factor (lower is better, < 1.0 is faster than real time):")
+    for name in args.stt:
+        _bench_stt(name, clips, args.runs)
+    for name in args.tts:
+        _bench_tts(name, args.runs)
+    if args.voice_url:
+        _bench_voice(args.voice_url, clips[0], args.requests, args.pipelined)
@@ -0,0 +1,226 @@
+"""
+Local stand-in for the external services the API depends on, for load and regression tests.
+
+Implements:
+  * Ollama   POST /api/generate (streaming and non-streaming), GET /api/tags, GET /api/version
+  * Brave    GET  /res/v1/web/search
+  * Groq STT POST /openai/v1/audio/transcriptions
+
+Responses to requests with a JSON-schema `format` are generated from that schema,
+so they validate against the same Pydantic models the services use.
+
+    python -m benchmarks.standin_server --port 11500 --latency-ms 800 --error-rate 0.01
+
+Then point the API at it (or at several, each on its own --port):
+
+    OLLAMA_URLS=http://localhost:11500,http://localhost:11501
+    BRAVE_SEARCH_URL=http://localhost:11500/res/v1/web/search
+    GROQ_BASE_URL=http://localhost:11500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STANDIN_LATENCY_MS = float(os.getenv("STANDIN_LATENCY_MS", "500"))
+STANDIN_JITTER_MS = float(os.getenv("STANDIN_JITTER_MS", "100"))
+STANDIN_TOKEN_DELAY_MS = float(os.getenv("STANDIN_TOKEN_DELAY_MS", "20"))
+STANDIN_ERROR_RATE = float(os.getenv("STANDIN_ERROR_RATE", "0"))
+# Models listed by /api/tags; /api/generate answers 404 for any other model, like Ollama.
+STANDIN_MODELS = os.getenv("STANDIN_MODELS", "qwen3:8b")
+
+CANNED_TEXT = (
+    "Great work today. Keep your movements controlled and breathe steadily. "
+    "Stay hydrated and aim for consistent sleep."
+)
+
+app = FastAPI(title="BeMA stand-in server")
+app.state.config = {
+    "latency_ms": STANDIN_LATENCY_MS,
+    "jitter_ms": STANDIN_JITTER_MS,
+    "token_delay_ms": STANDIN_TOKEN_DELAY_MS,
+    "error_rate": STANDIN_ERROR_RATE,
+    "models": STANDIN_MODELS.split(","),
+}
+app.state.requests_served = 0
+
+
+def _resolve_ref(schema: dict, root: dict) -> dict:
+    ref = schema.get("$ref")
+    if not ref:
+        return schema
+    node = root
+    for part in ref.lstrip("#/").split("/"):
+        node = node[part]
+    return node
+
+
+def instance_from_schema(schema: dict, root: dict = None, name: str = "value"):
+    """Builds a small instance that conforms to a (Pydantic-generated) JSON schema."""
+    root = root or schema
+    schema = _resolve_ref(schema, root)
+
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [s for s in schema[key] if _resolve_ref(s, root).get("type") != "null"] or schema[key]
+            return instance_from_schema(options[0], root, name)
+
+    schema_type = schema.get("type", "object")
+    if schema_type == "object":
+        properties = schema.get("properties", {})
+        return {key: instance_from_schema(value, root, key) for key, value in properties.items()}
+    if schema_type == "array":
+        return [instance_from_schema(schema.get("items", {}), root, name)]
+    if schema_type == "integer":
+        return max(int(schema.get("minimum", 1)), 1)
+    if schema_type == "number":
+        return float(schema.get("minimum", 1.0))
+    if schema_type == "boolean":
+        return True
+    if name in ("title", "type"):
+        return name.capitalize()
+    return f"{name.replace('_', ' ').capitalize()}: {CANNED_TEXT}"
+
+
+def _response_text(payload: dict) -> str:
+    output_format = payload.get("format")
+    if isinstance(output_format, dict):
+        return json.dumps(instance_from_schema(output_format))
+    if output_format == "json":
+        return json.dumps({"response": CANNED_TEXT})
+    return CANNED_TEXT
+
+
+async def _simulate_latency():
+    config = app.state.config
+    delay_ms = max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"]))
+    await asyncio.sleep(delay_ms / 1000)
+
+
+def _should_fail() -> bool:
+    return random.random() < app.state.config["error_rate"]
+
+
+def _ollama_stats(prompt: str, text: str, started: float) -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(text) // 4)
+    total_ns = int((time.perf_counter() - started) * 1e9)
+    return {
+        "total_duration": total_ns,
+        "load_duration": 0,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": total_ns // 3,
+        "eval_count": completion_tokens,
+        "eval_duration": total_ns - total_ns // 3,
+    }
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    started = time.perf_counter()
+    payload = await request.json()
+    app.state.requests_served += 1
+    model = payload.get("model", "qwen3:8b")
+    if model not in app.state.config["models"]:
+        return JSONResponse(status_code=404, content={"error": f"model '{model}' not found"})
+    prompt = (payload.get("system") or "") + (payload.get("prompt") or "")
+    text = _response_text(payload)
+
+    if _should_fail():
+        await _simulate_latency()
+        return JSONResponse(status_code=500, content={"error": "stand-in injected failure"})
+
+    if not payload.get("stream", True):
+        await _simulate_latency()
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": text,
+            "done": True,
+            "done_reason": "stop",
+            **_ollama_stats(prompt, text, started),
+        }
+
+    async def stream():
+        # Time to first token stands in for prompt evaluation.
+        await _simulate_latency()
+        pieces = [text[i:i + 8] for i in range(0, len(text), 8)]
+        for piece in pieces:
+            yield json.dumps({"model": model, "response": piece, "done": False}) + "\n"
+            await asyncio.sleep(app.state.config["token_delay_ms"] / 1000)
+        final = {"model": model, "response": "", "done": True, "done_reason": "stop"}
+        final.update(_ollama_stats(prompt, text, started))
+        yield json.dumps(final) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": name, "model": name} for name in app.state.config["models"]]}
+
+
+@app.get("/api/version")
+async def version():
+    return {"version": "stand-in"}
+
+
+@app.get("/res/v1/web/search")
+async def brave_search(q: str = ""):
+    await _simulate_latency()
+    if _should_fail():
+        return JSONResponse(status_code=503, content={"error": "stand-in injected failure"})
+    results = [
+        {
+            "title": f"Result {i + 1} for {q}",
+            "url": f"https://example.com/{i + 1}",
+            "description": f"Stand-in summary {i + 1}: {CANNED_TEXT}",
+        }
+        for i in range(5)
+    ]
+    return {"type": "search", "query": {"original": q}, "web": {"type": "search", "results": results}}
+
+
+@app.post("/openai/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    await request.body()
+    await _simulate_latency()
+    if _should_fail():
+        return JSONResponse(status_code=500, content={"error": {"message": "stand-in injected failure"}})
+    return {"text": "How much water should I drink every day?"}
+
+
+@app.get("/standin/stats")
+async def stats():
+    return {"requests_served": app.state.requests_served, "config": app.state.config}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the Ollama/Brave/Groq stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=STANDIN_LATENCY_MS, help="Mean simulated latency")
+    parser.add_argument("--jitter-ms", type=float, default=STANDIN_JITTER_MS, help="Std. deviation of the latency")
+    parser.add_argument("--token-delay-ms", type=float, default=STANDIN_TOKEN_DELAY_MS, help="Delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=STANDIN_ERROR_RATE, help="Fraction of requests that fail")
+    parser.add_argument("--models", default=STANDIN_MODELS, help="Comma-separated models the server has")
+    args = parser.parse_args()
+
+    app.state.config.update(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        token_delay_ms=args.token_delay_ms,
+        error_rate=args.error_rate,
+        models=args.models.split(","),
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
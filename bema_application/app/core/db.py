@@ -1,7 +1,10 @@
+import hashlib
 import mysql.connector
 from mysql.connector import errorcode
 from models.suggestion import Suggestion
 from models.user_health import UserHealthProfile
+from datetime import datetime
+from typing import Callable, Iterator, List, Tuple
 import os
 from dotenv import load_dotenv
 
@@ -63,7 +66,9 @@ TABLES['suggestion_items'] = (
     "  `title` VARCHAR(255) NOT NULL,"
     "  `detail` TEXT NOT NULL,"
     "  `total` INT NULL,"
-    "  PRIMARY KEY (`id`)"
+    "  `contentHash` CHAR(64) NOT NULL,"
+    "  PRIMARY KEY (`id`),"
+    "  UNIQUE KEY `uq_suggestion_items_contentHash` (`contentHash`)"
     ") ENGINE=InnoDB"
 )
 
@@ -74,6 +79,7 @@ TABLES['user_suggestions'] = (
     "  `suggestionItemId` INT NOT NULL,"
     "  `createdAt` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,"
     "  PRIMARY KEY (`id`),"
+    "  KEY `idx_user_suggestions_history` (`userId`, `createdAt`, `id`),"
     "  FOREIGN KEY (`userId`) REFERENCES `user_health_profiles`(`userId`) ON DELETE CASCADE,"
     "  FOREIGN KEY (`suggestionItemId`) REFERENCES `suggestion_items`(`id`) ON DELETE CASCADE"
     ") ENGINE=InnoDB"
@@ -91,45 +97,78 @@ TABLES['workout_sessions'] = (
     "  `feedback_points` TEXT NULL,"
     "  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,"
     "  PRIMARY KEY (`id`),"
+    "  KEY `idx_workout_sessions_history` (`user_id`, `created_at`, `id`),"
+    "  KEY `idx_workout_sessions_export` (`created_at`, `id`),"
     "  FOREIGN KEY (`user_id`) REFERENCES `user_health_profiles`(`userId`) ON DELETE CASCADE"
     ") ENGINE=InnoDB"
 )
 
 
+# Seek indexes for the history endpoints: newest-first pages within one user are index range scans.
+HISTORY_INDEXES = {
+    'user_suggestions': ('idx_user_suggestions_history', '`userId`, `createdAt`, `id`'),
+    'workout_sessions': ('idx_workout_sessions_history', '`user_id`, `created_at`, `id`'),
+}
+
+# The bulk export reads all users in (created_at, id) order, so it needs its own index to avoid a filesort.
+EXPORT_INDEXES = {
+    'workout_sessions': ('idx_workout_sessions_export', '`created_at`, `id`'),
+}
+
+# Called with the userId after a profile has been stored (e.g. to drop cached workout plans).
+_profile_stored_listeners: List[Callable[[str], None]] = []
+
+def on_profile_stored(listener: Callable[[str], None]):
+    """Registers a callback that runs after store_user_health_profile() commits a new or changed profile."""
+    _profile_stored_listeners.append(listener)
+
+def _notify_profile_stored(userId: str):
+    for listener in _profile_stored_listeners:
+        try:
+            listener(userId)
+        except Exception as e:
+            print(f"⚠️ Profile-stored listener failed for user {userId}: {e}")
+
+# Column order used when writing user_health_profiles (userId is the primary key).
+PROFILE_COLUMNS = (
+    "userId", "age", "gender", "height", "heightUnit", "weight", "weightUnit", "profession",
+    "smokes", "smokingFrequency", "drinks", "glassesPerWeek", "exercises", "favoriteExercise",
+    "hasDisabilitiesOrSpecialNeeds", "disabilityDiscription", "hasAllergies", "allergyType",
+    "hadSurgeries", "surgeryType", "surgeryYear", "hasHighBloodPressure", "highBloodPressureTreatmentYears",
+    "hasDiabetes", "diabetesTreatmentYears", "hasCholesterol", "cholesterolTreatmentYears",
+    "hasFamilyMedicalHistory", "familyMedicalHistoryDiscription",
+)
+
 def store_user_health_profile(profile: UserHealthProfile):
-    """Stores or updates a UserHealthProfile in the database."""
+    """
+    Stores or updates a UserHealthProfile in the database.
+
+    Uses INSERT ... ON DUPLICATE KEY UPDATE (not REPLACE INTO): an existing row is
+    updated in place, so the ON DELETE CASCADE rows in user_suggestions and
+    workout_sessions are left alone, and an unchanged profile writes nothing.
+    Requires MySQL 8.0.19+ for the `AS new` row alias.
+    """
     db_conn = get_db_connection(DB_CONFIG)
     if not db_conn:
         return False
 
     cursor = db_conn.cursor()
     add_profile = (
-        "REPLACE INTO user_health_profiles "
-        "(userId, age, gender, height, heightUnit, weight, weightUnit, profession, "
-        "smokes, smokingFrequency, drinks, glassesPerWeek, exercises, favoriteExercise, "
-        "hasDisabilitiesOrSpecialNeeds, disabilityDiscription, hasAllergies, allergyType, "
-        "hadSurgeries, surgeryType, surgeryYear, hasHighBloodPressure, highBloodPressureTreatmentYears, "
-        "hasDiabetes, diabetesTreatmentYears, hasCholesterol, cholesterolTreatmentYears, "
-        "hasFamilyMedicalHistory, familyMedicalHistoryDiscription) "
-        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-    )
-    
-    profile_data = (
-        profile.userId, profile.age, profile.gender, profile.height, profile.heightUnit,
-        profile.weight, profile.weightUnit, profile.profession, profile.smokes,
-        profile.smokingFrequency, profile.drinks, profile.glassesPerWeek, profile.exercises,
-        profile.favoriteExercise, profile.hasDisabilitiesOrSpecialNeeds, profile.disabilityDiscription,
-        profile.hasAllergies, profile.allergyType, profile.hadSurgeries, profile.surgeryType,
-        profile.surgeryYear, profile.hasHighBloodPressure, profile.highBloodPressureTreatmentYears,
-        profile.hasDiabetes, profile.diabetesTreatmentYears, profile.hasCholesterol,
-        profile.cholesterolTreatmentYears, profile.hasFamilyMedicalHistory,
-        profile.familyMedicalHistoryDiscription
+        f"INSERT INTO user_health_profiles ({', '.join(PROFILE_COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * len(PROFILE_COLUMNS))}) AS new "
+        "ON DUPLICATE KEY UPDATE " + ", ".join(f"{column} = new.{column}" for column in PROFILE_COLUMNS[1:])
     )
+    profile_data = tuple(getattr(profile, column) for column in PROFILE_COLUMNS)
 
     try:
         cursor.execute(add_profile, profile_data)
         db_conn.commit()
-        print(f"✅ Successfully stored/updated profile for user: {profile.userId}")
+        # Affected rows: 1 = inserted, 2 = updated, 0 = identical to the stored row.
+        if cursor.rowcount == 0:
+            print(f"✅ Profile for user {profile.userId} is unchanged.")
+        else:
+            print(f"✅ Successfully stored/updated profile for user: {profile.userId}")
+            _notify_profile_stored(profile.userId)
         return True
     except mysql.connector.Error as err:
         print(f"❌ Failed to store profile for user {profile.userId}: {err}")
@@ -139,6 +178,34 @@ def store_user_health_profile(profile: UserHealthProfile):
         cursor.close()
         db_conn.close()
 
+def suggestion_content_hash(suggestion_key: str, title: str, detail: str, total) -> str:
+    """
+    Identity of a suggestion_items row. Must match SUGGESTION_CONTENT_HASH_SQL, which
+    computes the same value inside MySQL for backfills.
+    """
+    content = "\x1f".join([suggestion_key, title, detail, "" if total is None else str(total)])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+SUGGESTION_CONTENT_HASH_SQL = "SHA2(CONCAT_WS(CHAR(31), suggestionKey, title, detail, COALESCE(total, '')), 256)"
+
+# Insert-or-reuse: an identical item already stored (for any user) is reused, and
+# LAST_INSERT_ID(id) makes cursor.lastrowid return its id instead of a new one.
+UPSERT_SUGGESTION_ITEM_QUERY = (
+    "INSERT INTO suggestion_items (suggestionKey, title, detail, total, contentHash) "
+    "VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)"
+)
+
+def _suggestion_item_id(cursor, suggestion_key: str, item_details: dict) -> int:
+    """Returns the id of the suggestion_items row with this content, inserting it if needed."""
+    cursor.execute(UPSERT_SUGGESTION_ITEM_QUERY, (
+        suggestion_key,
+        item_details['title'],
+        item_details['detail'],
+        item_details.get('total'), # Use .get() for optional fields
+        suggestion_content_hash(suggestion_key, item_details['title'], item_details['detail'], item_details.get('total'))
+    ))
+    return cursor.lastrowid
 
 def store_user_suggestions_with_suggestionItems(userId: str, suggestions: Suggestion):
     """
@@ -155,20 +222,8 @@ def store_user_suggestions_with_suggestionItems(userId: str, suggestions: Sugges
         suggestion_data = suggestions.model_dump()
 
         for suggestion_key, item_details in suggestion_data.items():
-            # 1. Insert the suggestion item's details into the 'suggestion_items' table
-            add_item_query = (
-                "INSERT INTO suggestion_items (suggestionKey, title, detail, total) "
-                "VALUES (%s, %s, %s, %s)"
-            )
-            cursor.execute(add_item_query, (
-                suggestion_key,
-                item_details['title'],
-                item_details['detail'],
-                item_details.get('total') # Use .get() for optional fields
-            ))
-            
-            # 2. Get the ID of the newly created suggestion item
-            suggestion_item_id = cursor.lastrowid
+            # 1.+2. Insert the suggestion item (or reuse an identical stored one) and get its ID
+            suggestion_item_id = _suggestion_item_id(cursor, suggestion_key, item_details)
             
             # 3. Link the user to this new suggestion item in the 'user_suggestions' table
             add_user_link_query = (
@@ -191,6 +246,52 @@ def store_user_suggestions_with_suggestionItems(userId: str, suggestions: Sugges
         db_conn.close()
 
 
+def store_suggestions_bulk(results: List[Tuple[str, Suggestion]]) -> bool:
+    """
+    Stores suggestions for many users in a single connection and transaction.
+
+    Item rows are inserted (or reused) one by one, since their ids are needed
+    for linking, and items repeated within the batch are looked up only once.
+    The user links are written with one multi-row insert.
+    """
+    if not results:
+        return True
+
+    db_conn = get_db_connection(DB_CONFIG)
+    if not db_conn:
+        return False
+
+    cursor = db_conn.cursor()
+    add_user_link_query = (
+        "INSERT INTO user_suggestions (userId, suggestionItemId) "
+        "VALUES (%s, %s)"
+    )
+
+    try:
+        links = []
+        item_ids = {}  # content hash -> id, for items repeated within this batch
+        for userId, suggestions in results:
+            for suggestion_key, item_details in suggestions.model_dump().items():
+                content_hash = suggestion_content_hash(
+                    suggestion_key, item_details['title'], item_details['detail'], item_details.get('total')
+                )
+                if content_hash not in item_ids:
+                    item_ids[content_hash] = _suggestion_item_id(cursor, suggestion_key, item_details)
+                links.append((userId, item_ids[content_hash]))
+
+        cursor.executemany(add_user_link_query, links)
+        db_conn.commit()
+        print(f"✅ Bulk stored {len(links)} suggestions ({len(item_ids)} distinct items) for {len(results)} user(s)")
+        return True
+    except mysql.connector.Error as err:
+        print(f"❌ Database error during bulk suggestion storage: {err}")
+        db_conn.rollback()
+        return False
+    finally:
+        cursor.close()
+        db_conn.close()
+
+
 def get_db_connection(config, with_database=True):
     """Establishes a connection to the MySQL server."""
     try:
@@ -243,6 +344,11 @@ def initialize_database():
             print(f"Checking/Creating table `{table_name}`...", end='')
             cursor.execute(table_description)
             print(" ✅")
+        migrate_suggestion_content_hash(cursor)
+        for indexes in (HISTORY_INDEXES, EXPORT_INDEXES):
+            for table_name, (index_name, columns) in indexes.items():
+                ensure_index(cursor, table_name, index_name, columns)
+        db_conn.commit()
     except mysql.connector.Error as err:
         print(f"\n❌ Failed creating tables: {err}")
     finally:
@@ -250,6 +356,61 @@ def initialize_database():
         cursor.close()
         db_conn.close()
 
+def column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (DB_NAME, table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+def index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (DB_NAME, table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+def ensure_index(cursor, table: str, index: str, columns: str):
+    """Adds a secondary index to a table created before the index was part of its definition."""
+    if index_exists(cursor, table, index):
+        return
+    print(f"Migrating `{table}`: adding index {index}...", end='')
+    cursor.execute(f"ALTER TABLE {table} ADD INDEX `{index}` ({columns})")
+    print(" ✅")
+
+def count_duplicate_suggestion_items(cursor) -> int:
+    """Number of suggestion_items rows that repeat content stored in another row."""
+    cursor.execute("SELECT COUNT(*) - COUNT(DISTINCT contentHash) FROM suggestion_items")
+    return int(cursor.fetchone()[0] or 0)
+
+def add_suggestion_content_hash_key(cursor):
+    """Makes contentHash NOT NULL and unique (one table rebuild). Duplicates must be merged first."""
+    cursor.execute(
+        "ALTER TABLE suggestion_items MODIFY `contentHash` CHAR(64) NOT NULL, "
+        "ADD UNIQUE KEY `uq_suggestion_items_contentHash` (`contentHash`)"
+    )
+
+def migrate_suggestion_content_hash(cursor):
+    """
+    Brings a suggestion_items table created before content hashing up to date:
+    adds and backfills `contentHash`, then adds the unique key if there are no
+    duplicates. Otherwise the key is left for the compaction job
+    (python -m services.suggestion_compaction), which merges them first.
+    """
+    if not column_exists(cursor, "suggestion_items", "contentHash"):
+        print("Migrating `suggestion_items`: adding contentHash...", end='')
+        cursor.execute("ALTER TABLE suggestion_items ADD COLUMN `contentHash` CHAR(64) NULL")
+        print(" ✅")
+    cursor.execute(f"UPDATE suggestion_items SET contentHash = {SUGGESTION_CONTENT_HASH_SQL} WHERE contentHash IS NULL")
+    if index_exists(cursor, "suggestion_items", "uq_suggestion_items_contentHash"):
+        return
+    duplicates = count_duplicate_suggestion_items(cursor)
+    if duplicates:
+        print(f"⚠️ {duplicates} duplicate suggestion item(s) found; run `python -m services.suggestion_compaction` to merge them.")
+        return
+    add_suggestion_content_hash_key(cursor)
+    print("✅ Added unique key on suggestion_items.contentHash")
+
 def get_user_health_profile(userId: str) -> UserHealthProfile | None:
     """Fetches a UserHealthProfile from the database by userId."""
     db_conn = get_db_connection(DB_CONFIG)
@@ -276,6 +437,190 @@ def get_user_health_profile(userId: str) -> UserHealthProfile | None:
         cursor.close()
         db_conn.close()
 
+def _user_health_profile_page(after_user_id: str, page_size: int) -> List[dict]:
+    db_conn = get_db_connection(DB_CONFIG)
+    if not db_conn:
+        raise ConnectionError("Database is not reachable")
+    cursor = db_conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT * FROM user_health_profiles WHERE userId > %s ORDER BY userId LIMIT %s",
+            (after_user_id, page_size)
+        )
+        return cursor.fetchall()
+    except mysql.connector.Error as err:
+        print(f"❌ Failed to page through user profiles after '{after_user_id}': {err}")
+        raise
+    finally:
+        cursor.close()
+        db_conn.close()
+
+
+def iter_user_health_profiles(page_size: int = 100, after_user_id: str | None = None) -> Iterator[List[UserHealthProfile]]:
+    """
+    Streams all user health profiles in pages ordered by userId.
+
+    Uses keyset pagination (`userId > last seen`) so every page is an index range
+    scan, and `after_user_id` can be used to resume from a checkpoint. Every page
+    uses its own connection: callers spend minutes between pages, longer than an
+    idle connection may survive (wait_timeout). Raises ConnectionError if the
+    database is not reachable.
+    """
+    last_user_id = after_user_id or ""
+    while True:
+        rows = _user_health_profile_page(last_user_id, page_size)
+        if not rows:
+            return
+        yield [UserHealthProfile(**row) for row in rows]
+        last_user_id = rows[-1]['userId']
+        if len(rows) < page_size:
+            return
+
+# Columns the history endpoints may project; id and the timestamp are always returned (they form the cursor).
+SUGGESTION_HISTORY_FIELDS = {
+    "suggestionKey": "si.suggestionKey", "title": "si.title", "detail": "si.detail", "total": "si.total",
+}
+WORKOUT_HISTORY_FIELDS = {
+    "exercise": "exercise", "reps": "reps", "accuracy": "accuracy", "timestamp": "timestamp",
+    "duration": "duration", "feedback_points": "feedback_points",
+}
+
+def _history_page(query: str, params: tuple, limit: int) -> Tuple[List[dict], bool]:
+    db_conn = get_db_connection(DB_CONFIG)
+    if not db_conn:
+        raise ConnectionError("Database is not reachable")
+    cursor = db_conn.cursor(dictionary=True)
+    try:
+        # One extra row tells whether there is a next page without a COUNT(*).
+        cursor.execute(query, params + (limit + 1,))
+        rows = cursor.fetchall()
+        return rows[:limit], len(rows) > limit
+    finally:
+        cursor.close()
+        db_conn.close()
+
+def _seek_params(position: Tuple[datetime, int] | None) -> tuple:
+    """Parameters for an expanded (created_at, id) seek: created_at, created_at, id."""
+    if not position:
+        return ()
+    created_at, row_id = position
+    return (created_at, created_at, row_id)
+
+def get_suggestion_history(
+    userId: str,
+    limit: int = 20,
+    before: Tuple[datetime, int] | None = None,
+    fields: List[str] | None = None
+) -> Tuple[List[dict], bool]:
+    """
+    One page of a user's stored suggestions, newest first, and whether more pages follow.
+
+    Keyset pagination on (userId, createdAt, id): `before` is the (createdAt, id) of the
+    last row of the previous page, so every page is a range scan on
+    idx_user_suggestions_history no matter how deep it is (unlike OFFSET).
+    The seek is spelled out with OR: MySQL doesn't turn a row-constructor comparison
+    like (createdAt, id) < (x, y) into a range on the index, only the userId prefix.
+    """
+    columns = [SUGGESTION_HISTORY_FIELDS[f] for f in (fields or SUGGESTION_HISTORY_FIELDS)]
+    seek = "AND (us.createdAt < %s OR (us.createdAt = %s AND us.id < %s)) " if before else ""
+    query = (
+        f"SELECT us.id, us.createdAt, {', '.join(columns)} FROM user_suggestions us "
+        "JOIN suggestion_items si ON si.id = us.suggestionItemId "
+        f"WHERE us.userId = %s {seek}"
+        "ORDER BY us.createdAt DESC, us.id DESC LIMIT %s"
+    )
+    return _history_page(query, (userId,) + _seek_params(before), limit)
+
+def get_workout_history(
+    user_id: str,
+    limit: int = 20,
+    before: Tuple[datetime, int] | None = None,
+    fields: List[str] | None = None
+) -> Tuple[List[dict], bool]:
+    """Like get_suggestion_history, for workout_sessions on (user_id, created_at, id)."""
+    columns = [WORKOUT_HISTORY_FIELDS[f] for f in (fields or WORKOUT_HISTORY_FIELDS)]
+    seek = "AND (created_at < %s OR (created_at = %s AND id < %s)) " if before else ""
+    query = (
+        f"SELECT id, created_at, {', '.join(columns)} FROM workout_sessions "
+        f"WHERE user_id = %s {seek}"
+        "ORDER BY created_at DESC, id DESC LIMIT %s"
+    )
+    return _history_page(query, (user_id,) + _seek_params(before), limit)
+
+WORKOUT_EXPORT_COLUMNS = (
+    "id", "user_id", "exercise", "reps", "accuracy", "timestamp", "duration", "feedback_points", "created_at",
+)
+
+def get_workout_export_watermark(settle_seconds: int = 0) -> Tuple[datetime, int] | None:
+    """
+    (created_at, id) of the newest workout session at least `settle_seconds` old, or None if there is none.
+
+    Exports stop at this row, so the next incremental export starts right after it.
+    Leaving the newest rows for the next run means a transaction that commits
+    late with an older created_at isn't skipped.
+    """
+    db_conn = get_db_connection(DB_CONFIG)
+    if not db_conn:
+        raise ConnectionError("Database is not reachable")
+    cursor = db_conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT created_at, id FROM workout_sessions WHERE created_at <= NOW() - INTERVAL %s SECOND "
+            "ORDER BY created_at DESC, id DESC LIMIT 1",
+            (settle_seconds,)
+        )
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+    finally:
+        cursor.close()
+        db_conn.close()
+
+def iter_workout_sessions(
+    after: Tuple[datetime, int] | None,
+    until: Tuple[datetime, int],
+    batch_size: int = 1000
+) -> Iterator[List[dict]]:
+    """
+    Streams the workout sessions after `after` up to and including `until`, ordered by
+    (created_at, id) and `batch_size` rows at a time. Both bounds are (created_at, id) watermarks.
+
+    The query runs once on a dedicated connection with an unbuffered cursor, so
+    rows are pulled from the server as batches are consumed and memory stays flat
+    however large the table is. The range is an index range scan on
+    idx_workout_sessions_export, already in output order (the bounds are spelled
+    out with OR for the same reason as in get_suggestion_history).
+    """
+    db_conn = get_db_connection(DB_CONFIG)
+    if not db_conn:
+        raise ConnectionError("Database is not reachable")
+
+    seek = "(created_at > %s OR (created_at = %s AND id > %s)) AND " if after else ""
+    query = (
+        f"SELECT {', '.join(WORKOUT_EXPORT_COLUMNS)} FROM workout_sessions "
+        f"WHERE {seek}(created_at < %s OR (created_at = %s AND id <= %s)) ORDER BY created_at, id"
+    )
+    params = _seek_params(after) + _seek_params(until)
+    cursor = db_conn.cursor(dictionary=True, buffered=False)
+    try:
+        # The server waits on us while the consumer (e.g. a slow HTTP client) writes each batch out.
+        cursor.execute("SET SESSION net_write_timeout = 600")
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    except mysql.connector.Error as err:
+        print(f"❌ Failed to export workout sessions after {after}: {err}")
+        raise
+    finally:
+        if db_conn.unread_result:
+            # Stopped early (e.g. the client went away): drop the socket instead of reading the rest of the table.
+            db_conn.shutdown()
+        else:
+            cursor.close()
+            db_conn.close()
+
 # To run this script directly for setup:
 if __name__ == "__main__":
     initialize_database()
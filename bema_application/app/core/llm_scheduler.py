@@ -0,0 +1,228 @@
+"""
+Priority scheduler for the calls to the shared Ollama backend.
+
+Every LLM call asks for a slot before sending its request:
+
+    with llm_scheduler.slot(INTERACTIVE, user_id=user_id):
+        ollama_pool.post("/api/generate", ...)
+
+Slots are handed out in priority order: interactive calls (/bot/, /voice/) are
+served before bulk ones (/agent/, /workout/*). On top of the overall limit
+(LLM_CONCURRENCY: the sum of OLLAMA_NUM_PARALLEL over OLLAMA_URLS) each class has
+its own cap, so bulk generations can never hold every slot and a chat turn
+only waits for a running generation to finish when chat alone fills the
+backend. Within a class, users are served round-robin, so one user's burst of
+requests queues behind itself rather than in front of everyone else.
+
+Waiting for a slot blocks a thread, so blocking work that makes LLM calls is
+run with llm_scheduler.run_in_threadpool(priority, fn, ...) rather than
+fastapi's run_in_threadpool. Each class gets its own thread limit
+(LLM_INTERACTIVE_THREADS, LLM_BULK_THREADS), separate from the shared 40-thread
+pool: a burst of /agent/ requests queued for two bulk slots then waits without a
+thread instead of holding the whole pool, and /bot/ and /voice/ still get a
+thread to reach the scheduler with.
+
+Every call has a deadline (by default now + the class's max wait). A call that
+is still queued at its deadline is dropped without reaching Ollama and its
+caller gets LlmDeadlineExceeded, instead of holding a slot for an answer
+nobody is waiting for any more.
+
+Metrics, labeled by priority: llm.queue_wait.seconds, llm.queued, llm.in_flight
+and llm.dropped.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional, TypeVar
+import anyio
+from anyio.lowlevel import RunVar
+from dotenv import load_dotenv
+from core.metrics import metrics
+
+load_dotenv()
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Dispatch order: a free slot goes to the first class with a waiting call.
+PRIORITIES = (INTERACTIVE, BULK)
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_CLASS_CONCURRENCY = {
+    INTERACTIVE: int(os.getenv("LLM_INTERACTIVE_CONCURRENCY", "4")),
+    BULK: int(os.getenv("LLM_BULK_CONCURRENCY", "2")),
+}
+# Seconds a call may wait for a slot before it is dropped (unless it passes its own deadline).
+LLM_CLASS_MAX_WAIT = {
+    INTERACTIVE: float(os.getenv("LLM_INTERACTIVE_MAX_WAIT", "20")),
+    BULK: float(os.getenv("LLM_BULK_MAX_WAIT", "300")),
+}
+# Worker threads per class for blocking work that waits for LLM slots (see run_in_threadpool).
+LLM_CLASS_THREADS = {
+    INTERACTIVE: int(os.getenv("LLM_INTERACTIVE_THREADS", "16")),
+    BULK: int(os.getenv("LLM_BULK_THREADS", "8")),
+}
+
+# Queue key for calls that don't name a user; they share one round-robin turn.
+ANONYMOUS_USER = "anonymous"
+
+T = TypeVar("T")
+
+
+class LlmDeadlineExceeded(TimeoutError):
+    """Raised when a call could not get an LLM slot before its deadline. The request was never sent."""
+
+
+class _Waiter:
+    __slots__ = ("priority", "user_id", "deadline", "enqueued", "granted", "event")
+
+    def __init__(self, priority: str, user_id: str, deadline: float, enqueued: float):
+        self.priority = priority
+        self.user_id = user_id
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.granted = False
+        self.event = threading.Event()
+
+
+class LlmScheduler:
+    """Hands out LLM slots by priority class, round-robin per user, dropping calls past their deadline."""
+
+    def __init__(
+        self,
+        concurrency: int = LLM_CONCURRENCY,
+        class_concurrency: Optional[Dict[str, int]] = None,
+        max_wait: Optional[Dict[str, float]] = None,
+        threads: Optional[Dict[str, int]] = None,
+    ):
+        self.concurrency = concurrency
+        self.class_concurrency = dict(class_concurrency or LLM_CLASS_CONCURRENCY)
+        self.max_wait = dict(max_wait or LLM_CLASS_MAX_WAIT)
+        self.threads = dict(threads or LLM_CLASS_THREADS)
+        # Capacity limiters are bound to an event loop, so they are created per loop on first use.
+        self._thread_limiters: RunVar[Dict[str, anyio.CapacityLimiter]] = RunVar(f"llm_thread_limiters_{id(self)}")
+        self._lock = threading.Lock()
+        # priority -> user id -> that user's waiting calls, oldest first. The user at the
+        # front of the OrderedDict is served next and then moved to the back.
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._queued = {p: 0 for p in PRIORITIES}
+        self._running = {p: 0 for p in PRIORITIES}
+
+    @contextmanager
+    def slot(self, priority: str, user_id: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        Holds one LLM slot for the duration of the block (a whole stream, for streaming calls).
+
+        `deadline` is a time.monotonic() value; the default is now + the class's max wait.
+        Raises LlmDeadlineExceeded if no slot was free before the deadline.
+        """
+        self._acquire(priority, user_id or ANONYMOUS_USER, deadline)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    async def run_in_threadpool(self, priority: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs blocking `func` (which asks for `priority` slots) on a worker thread from
+        the class's own thread limit instead of the shared pool. A call over the limit
+        waits on the event loop, without a thread.
+        """
+        return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=self._thread_limiter(priority))
+
+    def _thread_limiter(self, priority: str) -> anyio.CapacityLimiter:
+        if priority not in self.threads:
+            raise ValueError(f"Unknown LLM priority '{priority}', expected one of {PRIORITIES}.")
+        try:
+            limiters = self._thread_limiters.get()
+        except LookupError:
+            limiters = {p: anyio.CapacityLimiter(self.threads[p]) for p in PRIORITIES}
+            self._thread_limiters.set(limiters)
+        return limiters[priority]
+
+    def _acquire(self, priority: str, user_id: str, deadline: Optional[float]):
+        if priority not in self._queues:
+            raise ValueError(f"Unknown LLM priority '{priority}', expected one of {PRIORITIES}.")
+        now = time.monotonic()
+        waiter = _Waiter(priority, user_id, deadline if deadline is not None else now + self.max_wait[priority], now)
+        with self._lock:
+            self._queues[priority].setdefault(user_id, deque()).append(waiter)
+            self._queued[priority] += 1
+            self._dispatch()
+
+        waiter.event.wait(max(0.0, waiter.deadline - time.monotonic()))
+        with self._lock:
+            if waiter.granted:
+                return
+            if not waiter.event.is_set():  # timed out while still queued
+                self._unqueue(waiter)
+                self._drop(waiter)
+        raise LlmDeadlineExceeded(
+            f"No {priority} LLM slot became free within {waiter.deadline - waiter.enqueued:.1f}s."
+        )
+
+    def _release(self, priority: str):
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grants free slots to waiting calls. Called with the lock held."""
+        now = time.monotonic()
+        in_flight = sum(self._running.values())
+        for priority in PRIORITIES:
+            users = self._queues[priority]
+            while users and in_flight < self.concurrency and self._running[priority] < self.class_concurrency[priority]:
+                user_id, waiters = next(iter(users.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                self._queued[priority] -= 1
+                if waiter.deadline <= now:
+                    self._drop(waiter)
+                    waiter.event.set()
+                    continue
+                waiter.granted = True
+                self._running[priority] += 1
+                in_flight += 1
+                metrics.observe("llm.queue_wait.seconds", now - waiter.enqueued, labels={"priority": priority})
+                waiter.event.set()
+        for priority in PRIORITIES:
+            metrics.set_gauge("llm.queued", self._queued[priority], labels={"priority": priority})
+            metrics.set_gauge("llm.in_flight", self._running[priority], labels={"priority": priority})
+
+    def _unqueue(self, waiter: _Waiter):
+        users = self._queues[waiter.priority]
+        waiters = users.get(waiter.user_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.user_id]
+        self._queued[waiter.priority] -= 1
+        metrics.set_gauge("llm.queued", self._queued[waiter.priority], labels={"priority": waiter.priority})
+
+    @staticmethod
+    def _drop(waiter: _Waiter):
+        metrics.increment("llm.dropped", labels={"priority": waiter.priority})
+        print(f"⏳ Dropped {waiter.priority} LLM call for {waiter.user_id}: no slot within its deadline")
+
+    def status(self) -> dict:
+        """Queued and running calls per priority class."""
+        with self._lock:
+            return {
+                p: {
+                    "queued": self._queued[p],
+                    "running": self._running[p],
+                    "limit": self.class_concurrency[p],
+                    "users_waiting": len(self._queues[p]),
+                }
+                for p in PRIORITIES
+            }
+
+
+llm_scheduler = LlmScheduler()
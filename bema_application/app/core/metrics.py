@@ -0,0 +1,181 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional, Tuple
+
+# OpenTelemetry is optional: when the API package is installed (and an SDK/exporter
+# is configured by the deployment) every span() also becomes an OTel span.
+try:
+    from opentelemetry import trace as otel_trace
+    _tracer = otel_trace.get_tracer("bema")
+except ImportError:
+    otel_trace = None
+    _tracer = None
+
+# Number of most recent samples kept per histogram series for percentile estimates.
+HISTOGRAM_WINDOW = 2048
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window = deque(maxlen=HISTOGRAM_WINDOW)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.window.append(value)
+
+    def summary(self) -> dict:
+        values = sorted(self.window)
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters, gauges and windowed histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+
+    def increment(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """Returns every metric as plain JSON-serializable data."""
+        def series_list(series, render):
+            return [{"labels": dict(key), **render(value)} for key, value in series.items()]
+
+        with self._lock:
+            return {
+                "counters": {n: series_list(s, lambda v: {"value": v}) for n, s in self._counters.items()},
+                "gauges": {n: series_list(s, lambda v: {"value": v}) for n, s in self._gauges.items()},
+                "histograms": {n: series_list(s, lambda h: h.summary()) for n, s in self._histograms.items()},
+            }
+
+    def prometheus_text(self) -> str:
+        """Renders the registry in the Prometheus text exposition format (histograms as summaries)."""
+        def metric_name(name):
+            return "bema_" + name.replace(".", "_").replace("-", "_")
+
+        def render_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None):
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        snapshot = self.snapshot()
+        for kind, prom_type in (("counters", "counter"), ("gauges", "gauge")):
+            for name, series in snapshot[kind].items():
+                lines.append(f"# TYPE {metric_name(name)} {prom_type}")
+                for item in series:
+                    lines.append(f"{metric_name(name)}{render_labels(_label_key(item['labels']))} {item['value']}")
+        for name, series in snapshot["histograms"].items():
+            prom_name = metric_name(name)
+            lines.append(f"# TYPE {prom_name} summary")
+            for item in series:
+                key = _label_key(item["labels"])
+                for quantile in ("p50", "p95", "p99"):
+                    q = str(int(quantile[1:]) / 100)
+                    lines.append(f"{prom_name}{render_labels(key, ('quantile', q))} {item[quantile]}")
+                lines.append(f"{prom_name}_sum{render_labels(key)} {item['sum']}")
+                lines.append(f"{prom_name}_count{render_labels(key)} {item['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class Span:
+    """Attributes collected while a span() block runs; mirrored onto the OTel span if there is one."""
+
+    def __init__(self, name: str, otel_span=None):
+        self.name = name
+        self.attributes: Dict[str, object] = {}
+        self._otel_span = otel_span
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+        if self._otel_span is not None and value is not None:
+            self._otel_span.set_attribute(key, value)
+
+
+@contextmanager
+def span(name: str, labels: Optional[Dict[str, str]] = None):
+    """
+    Times a block of work and records it as the `<name>.seconds` histogram.
+
+    Errors are counted in `<name>.errors` and re-raised.
+    """
+    started = time.perf_counter()
+    otel_context = _tracer.start_as_current_span(name, attributes=dict(labels or {})) if _tracer else nullcontext()
+    with otel_context as otel_span:
+        current = Span(name, otel_span)
+        try:
+            yield current
+        except Exception:
+            metrics.increment(f"{name}.errors", labels=labels)
+            raise
+        finally:
+            metrics.observe(f"{name}.seconds", time.perf_counter() - started, labels=labels)
+
+
+def observe_ollama_response(response_json: dict, labels: Optional[Dict[str, str]] = None, current: Optional[Span] = None):
+    """Records the token counts and durations (reported in nanoseconds) from an Ollama /api/generate response."""
+    stats = {
+        "prompt_tokens": response_json.get("prompt_eval_count", 0),
+        "completion_tokens": response_json.get("eval_count", 0),
+        "prompt_eval_seconds": response_json.get("prompt_eval_duration", 0) / 1e9,
+        "eval_seconds": response_json.get("eval_duration", 0) / 1e9,
+        "load_seconds": response_json.get("load_duration", 0) / 1e9,
+        "total_seconds": response_json.get("total_duration", 0) / 1e9,
+    }
+    for stat, value in stats.items():
+        metrics.observe(f"ollama.{stat}", value, labels=labels)
+        if current is not None:
+            current.set(f"ollama.{stat}", value)
+    return stats
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from core.metrics import metrics
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class _ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]]):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.lock = threading.Lock()
+        self.instance: Any = None
+        self.state = NOT_LOADED
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class ModelRegistry:
+    """
+    Loads heavy models and clients on demand instead of at import time.
+
+    Each module registers a loader (and optionally a warmup that runs one
+    throwaway inference) under a name. get() loads the model the first time it
+    is needed; load_all() is called from main.lifespan to load and warm every
+    model before the API starts serving. Load and warmup times are kept per
+    model for the /health endpoint.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _ModelEntry] = {}
+        # Set by main.lifespan once startup (including any eager loading) has finished.
+        self.startup_complete = False
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+        self._entries[name] = _ModelEntry(name, loader, warmup)
+
+    def get(self, name: str) -> Any:
+        """Returns the loaded model, loading (and warming) it first if needed. Thread-safe."""
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.instance
+        with entry.lock:
+            if entry.state != READY:
+                self._load(entry)
+            return entry.instance
+
+    def _load(self, entry: _ModelEntry):
+        entry.state = LOADING
+        entry.error = None
+        print(f"--- Loading model '{entry.name}' ---")
+        try:
+            started = time.perf_counter()
+            instance = entry.loader()
+            entry.load_seconds = time.perf_counter() - started
+            if entry.warmup:
+                started = time.perf_counter()
+                entry.warmup(instance)
+                entry.warmup_seconds = time.perf_counter() - started
+        except Exception as e:
+            entry.state = FAILED
+            entry.error = str(e)
+            metrics.increment("models.load_failures", labels={"model": entry.name})
+            print(f"❌ Failed to load model '{entry.name}': {e}")
+            raise
+        entry.instance = instance
+        entry.state = READY
+        metrics.set_gauge("models.load.seconds", entry.load_seconds, labels={"model": entry.name})
+        if entry.warmup_seconds is not None:
+            metrics.set_gauge("models.warmup.seconds", entry.warmup_seconds, labels={"model": entry.name})
+        warmup_note = f", warmup {entry.warmup_seconds:.2f}s" if entry.warmup_seconds is not None else ""
+        print(f"  ✅ '{entry.name}' loaded in {entry.load_seconds:.2f}s{warmup_note}")
+
+    def load_all(self, names: Optional[Iterable[str]] = None) -> bool:
+        """
+        Loads and warms the given models (default: all registered), one after the other.
+        A failing model is reported but does not stop the others. Returns True if all loaded.
+        """
+        ok = True
+        for name in names if names is not None else list(self._entries):
+            try:
+                self.get(name)
+            except Exception:
+                ok = False
+        return ok
+
+    def is_ready(self) -> bool:
+        """Ready to serve: startup finished and no model failed to load (lazy models may still be unloaded)."""
+        return self.startup_complete and all(entry.state != FAILED for entry in self._entries.values())
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": round(entry.load_seconds, 3) if entry.load_seconds is not None else None,
+                "warmup_seconds": round(entry.warmup_seconds, 3) if entry.warmup_seconds is not None else None,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,321 @@
+"""
+Pool of Ollama endpoints shared by every LLM call.
+
+    OLLAMA_URLS=http://gpu-1:11434,http://gpu-2:11434   (falls back to NGROK_URL)
+
+Each request goes to the endpoint with the fewest outstanding requests among
+those that are usable:
+
+  * Health checks: a background thread (started from main.lifespan) polls
+    GET /api/tags on every endpoint every OLLAMA_HEALTH_INTERVAL seconds. Failing
+    endpoints are skipped, and so are endpoints whose model list lacks the
+    requested model (unless no endpoint has it).
+  * Circuit breaker: OLLAMA_BREAKER_FAILURES consecutive failures (connection
+    errors, timeouts, 5xx) open an endpoint's breaker for OLLAMA_BREAKER_COOLDOWN
+    seconds. After that, one trial request is let through (half-open): success
+    closes the breaker, failure opens it again.
+  * Failover: a request whose connection fails never reached a model, so it is
+    sent to the next endpoint. Read timeouts and HTTP errors are not retried.
+  * Hedging (chat only, OLLAMA_HEDGE_AFTER > 0): when a chat answer has not
+    arrived after OLLAMA_HEDGE_AFTER seconds, the same request is also sent to an
+    idle endpoint and the first successful answer wins. Only idle endpoints are
+    used, so a hedge never queues in front of other work; the losing request
+    still runs to completion on its endpoint.
+
+The model is chosen per task: OLLAMA_MODEL by default, overridden by
+OLLAMA_TASK_MODELS, e.g. "workout_motivation=qwen3:1.7b,workout_reasons=qwen3:4b".
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+import requests
+from dotenv import load_dotenv
+from core.metrics import metrics
+
+load_dotenv()
+
+OLLAMA_URLS = [
+    url.strip().rstrip("/") for url in (os.getenv("OLLAMA_URLS") or os.getenv("NGROK_URL") or "").split(",") if url.strip()
+]
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen3:8b")
+OLLAMA_TASK_MODELS = dict(
+    pair.split("=", 1) for pair in os.getenv("OLLAMA_TASK_MODELS", "").replace(" ", "").split(",") if "=" in pair
+)
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_BREAKER_FAILURES = int(os.getenv("OLLAMA_BREAKER_FAILURES", "3"))
+OLLAMA_BREAKER_COOLDOWN = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "30"))
+# Seconds to wait for a chat answer before hedging it on an idle endpoint; 0 disables hedging.
+OLLAMA_HEDGE_AFTER = float(os.getenv("OLLAMA_HEDGE_AFTER", "0"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def model_for(task: str) -> str:
+    """The model for a task ("chat", "recommendation", "workout_reasons", "workout_motivation")."""
+    return OLLAMA_TASK_MODELS.get(task, OLLAMA_MODEL)
+
+
+class NoEndpointAvailableError(requests.ConnectionError):
+    """Raised when every Ollama endpoint is unhealthy or has an open circuit breaker."""
+
+
+class OllamaEndpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.label = urlparse(url).netloc or url
+        self.outstanding = 0
+        self.healthy = True  # until a health check says otherwise
+        self.models: Optional[set] = None  # from /api/tags, None until checked
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False  # a half-open trial request is in flight
+
+    def has_model(self, model: Optional[str]) -> bool:
+        if self.models is None or not model:
+            return True
+        return model in self.models or f"{model}:latest" in self.models
+
+
+class OllamaPool:
+    """Least-outstanding-requests balancing over Ollama endpoints, with health checks and circuit breakers."""
+
+    def __init__(
+        self,
+        urls: Sequence[str] = tuple(OLLAMA_URLS),
+        breaker_failures: int = OLLAMA_BREAKER_FAILURES,
+        breaker_cooldown: float = OLLAMA_BREAKER_COOLDOWN,
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        hedge_after: float = OLLAMA_HEDGE_AFTER,
+    ):
+        self.endpoints = [OllamaEndpoint(url) for url in urls]
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.health_interval = health_interval
+        self.hedge_after = hedge_after
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        self._hedges: Optional[ThreadPoolExecutor] = None
+
+    # --- Endpoint selection and circuit breakers ---
+
+    def _allows(self, endpoint: OllamaEndpoint, now: float) -> bool:
+        """Whether the breaker lets a request through. Called with the lock held."""
+        if endpoint.state == OPEN and now - endpoint.opened_at >= self.breaker_cooldown:
+            endpoint.state = HALF_OPEN
+        if endpoint.state == HALF_OPEN:
+            return not endpoint.probing
+        return endpoint.state == CLOSED
+
+    def _pick(
+        self, model: Optional[str], exclude: Sequence[OllamaEndpoint] = (), idle_only: bool = False
+    ) -> Tuple[OllamaEndpoint, bool]:
+        """The endpoint for a request, and whether the request is its half-open trial."""
+        with self._lock:
+            now = time.monotonic()
+            usable = [
+                e for e in self.endpoints
+                if e not in exclude and e.healthy and self._allows(e, now) and (e.outstanding == 0 or not idle_only)
+            ]
+            usable = [e for e in usable if e.has_model(model)] or usable
+            if not usable:
+                raise NoEndpointAvailableError(
+                    f"No usable Ollama endpoint ({len(self.endpoints)} configured, all unhealthy, busy or open)."
+                )
+            fewest = min(e.outstanding for e in usable)
+            endpoint = random.choice([e for e in usable if e.outstanding == fewest])
+            probe = endpoint.state == HALF_OPEN
+            if probe:
+                endpoint.probing = True
+            endpoint.outstanding += 1
+            metrics.set_gauge("ollama.endpoint.outstanding", endpoint.outstanding, labels={"endpoint": endpoint.label})
+            return endpoint, probe
+
+    def _finish(self, endpoint: OllamaEndpoint, ok: bool, probe: bool):
+        with self._lock:
+            endpoint.outstanding -= 1
+            # Only the trial itself frees the way for the next one: a request sent before the
+            # breaker opened can finish mid-trial.
+            if probe:
+                endpoint.probing = False
+            if ok:
+                endpoint.failures = 0
+                if endpoint.state != CLOSED:
+                    endpoint.state = CLOSED
+                    print(f"✅ Ollama endpoint {endpoint.label}: circuit closed")
+            else:
+                endpoint.failures += 1
+                if endpoint.state == HALF_OPEN or (endpoint.state == CLOSED and endpoint.failures >= self.breaker_failures):
+                    endpoint.state = OPEN
+                    endpoint.opened_at = time.monotonic()
+                    metrics.increment("ollama.breaker.opened", labels={"endpoint": endpoint.label})
+                    print(f"🔌 Ollama endpoint {endpoint.label}: circuit open for {self.breaker_cooldown:.0f}s")
+            metrics.set_gauge("ollama.endpoint.outstanding", endpoint.outstanding, labels={"endpoint": endpoint.label})
+        metrics.increment(
+            "ollama.endpoint.requests", labels={"endpoint": endpoint.label, "result": "ok" if ok else "error"}
+        )
+
+    # --- Requests ---
+
+    def _open(
+        self, path: str, payload: dict, timeout: float, stream: bool = False, idle_only: bool = False
+    ) -> Tuple[OllamaEndpoint, bool, requests.Response]:
+        """
+        Sends the request to the best endpoint, moving on to the next one while connections fail.
+        Returns the endpoint, whether the request is its half-open trial, and the response.
+        """
+        tried: List[OllamaEndpoint] = []
+        last_error = None
+        while True:
+            try:
+                endpoint, probe = self._pick(payload.get("model"), tried, idle_only)
+            except NoEndpointAvailableError:
+                if last_error is not None:
+                    raise last_error
+                raise
+            tried.append(endpoint)
+            try:
+                res = requests.post(f"{endpoint.url}{path}", headers=JSON_HEADERS, json=payload, timeout=timeout, stream=stream)
+                return endpoint, probe, res
+            except requests.ConnectionError as e:
+                self._finish(endpoint, False, probe)
+                last_error = e
+                print(f"⚠️ Ollama endpoint {endpoint.label} unreachable, trying another: {e}")
+            except requests.RequestException:
+                self._finish(endpoint, False, probe)
+                raise
+
+    def _post_once(self, path: str, payload: dict, timeout: float, idle_only: bool = False) -> requests.Response:
+        endpoint, probe, res = self._open(path, payload, timeout, idle_only=idle_only)
+        self._finish(endpoint, res.status_code < 500, probe)
+        return res
+
+    def post(self, path: str, payload: dict, timeout: float, hedge: bool = False) -> requests.Response:
+        """
+        POSTs a JSON payload (e.g. to /api/generate) and returns the response. Callers
+        check the status with raise_for_status() as with requests.post().
+
+        `hedge=True` (latency-sensitive calls) hedges the request on an idle endpoint
+        when OLLAMA_HEDGE_AFTER is set.
+        """
+        if not (hedge and self.hedge_after > 0 and len(self.endpoints) > 1):
+            return self._post_once(path, payload, timeout)
+        return self._hedged(path, payload, timeout)
+
+    def _has_idle(self, model: Optional[str]) -> bool:
+        with self._lock:
+            return any(
+                e.outstanding == 0 and e.healthy and e.state == CLOSED and e.has_model(model) for e in self.endpoints
+            )
+
+    def _hedged(self, path: str, payload: dict, timeout: float) -> requests.Response:
+        with self._lock:
+            if self._hedges is None:
+                self._hedges = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ollama-hedge")
+        primary = self._hedges.submit(self._post_once, path, payload, timeout)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        # Only worth it (and only free) when another endpoint has nothing to do.
+        if done or not self._has_idle(payload.get("model")):
+            return primary.result()
+        hedge = self._hedges.submit(self._post_once, path, payload, timeout, True)
+        names = {primary: "primary", hedge: "hedge"}
+        pending = set(names)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result().status_code < 500:
+                    metrics.increment("ollama.hedge", labels={"winner": names[future]})
+                    return future.result()
+        return primary.result()  # both failed: surface the primary's error
+
+    @contextmanager
+    def stream(self, path: str, payload: dict, timeout: float) -> Iterator[requests.Response]:
+        """
+        Streaming POST; the endpoint counts as busy until the block exits. As in post(),
+        only connection errors, timeouts and 5xx count against its breaker: a caller's
+        raise_for_status() on a 4xx (unknown model, bad payload) leaves it healthy.
+        """
+        endpoint, probe, res = self._open(path, payload, timeout, stream=True)
+        ok = res.status_code < 500
+        try:
+            yield res
+        except requests.HTTPError:
+            raise  # `ok` already reflects the status code
+        except requests.RequestException:
+            ok = False
+            raise
+        finally:
+            res.close()
+            self._finish(endpoint, ok, probe)
+
+    # --- Health checks ---
+
+    def check_health(self):
+        """Polls /api/tags on every endpoint and records whether it answers and which models it has."""
+        for endpoint in self.endpoints:
+            try:
+                res = requests.get(f"{endpoint.url}/api/tags", timeout=5)
+                res.raise_for_status()
+                models = {name for m in res.json().get("models", []) for name in (m.get("name"), m.get("model")) if name}
+                healthy = True
+            except (requests.RequestException, ValueError) as e:
+                models, healthy = endpoint.models, False
+                error = e
+            if healthy != endpoint.healthy:
+                print(f"{'✅' if healthy else '❌'} Ollama endpoint {endpoint.label} is {'healthy' if healthy else f'unhealthy: {error}'}")
+            endpoint.healthy, endpoint.models = healthy, models
+            metrics.set_gauge("ollama.endpoint.healthy", int(healthy), labels={"endpoint": endpoint.label})
+
+    def _health_loop(self):
+        self.check_health()
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def start(self):
+        """
+        Starts the background health checks (main.lifespan). The first one runs right
+        away on that thread, so startup doesn't block the event loop on slow endpoints.
+        """
+        if self._health_thread or not self.endpoints or self.health_interval <= 0:
+            return
+        print(f"--- Ollama pool: {', '.join(e.label for e in self.endpoints)} ---")
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def shutdown(self, wait: bool = False):
+        """Stops the health checks. With `wait`, also waits for the losing hedged requests."""
+        self._stop.set()
+        if self._health_thread:
+            self._health_thread.join(timeout=5)
+            self._health_thread = None
+        if self._hedges:
+            self._hedges.shutdown(wait=wait)
+            self._hedges = None
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "endpoint": e.label,
+                    "healthy": e.healthy,
+                    "breaker": e.state,
+                    "outstanding": e.outstanding,
+                    "consecutive_failures": e.failures,
+                    "models": sorted(e.models) if e.models is not None else None,
+                }
+                for e in self.endpoints
+            ]
+
+
+ollama_pool = OllamaPool()
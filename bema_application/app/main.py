@@ -1,12 +1,26 @@
+import os
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from routes.chat_routes import router as chat_router
-from routes.agent_routes import router as agent_router
+from routes.agent_routes import router as agent_router, recommendation_jobs
 from routes.voice_routes import router as voice_router
-from routes.emotion_route import router as emotion_router
+from routes.emotion_route import router as emotion_router, emotion_worker, artifact_writer
 from routes.workout_routes import router as workout_router
+from routes.metrics_routes import router as metrics_router
+from routes.health_routes import router as health_router
+from routes.history_routes import router as history_router
+from routes.admin_routes import router as admin_router
+from core.model_registry import model_registry
+from core.ollama_pool import ollama_pool
 from core.db import initialize_database
-from utils.retriever import check_and_create_vector_store
+from services.rag_index_service import check_and_create_vector_store
 from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "eager" (default): load and warm up every model before serving. "lazy": load each on first use.
+MODEL_LOADING = os.getenv("MODEL_LOADING", "eager")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -18,10 +32,22 @@ async def lifespan(app: FastAPI):
     print("\n--- 🚀 KICKING OFF STARTUP PROCEDURES ---")
     initialize_database()
     check_and_create_vector_store()
+    if MODEL_LOADING == "eager":
+        print("\n--- Loading and warming up models ---")
+        await run_in_threadpool(model_registry.load_all)
+    model_registry.startup_complete = True
+    ollama_pool.start()
+    recommendation_jobs.start()
+    artifact_writer.start()
+    emotion_worker.start()
     print("\n--- ✅ STARTUP COMPLETE. API IS READY TO SERVE. ---")
     yield
     # --- Shutdown ---
     print("\n--- 🌙 SHUTTING DOWN ---")
+    recommendation_jobs.shutdown()
+    ollama_pool.shutdown()
+    emotion_worker.shutdown()
+    artifact_writer.shutdown()
 
 
 # Create the FastAPI app instance with the lifespan event handler
@@ -32,11 +58,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
+app.include_router(health_router, tags=["Health"])
 app.include_router(chat_router, prefix="/api", tags=["Chat"])
 app.include_router(agent_router, prefix="/api", tags=["RAG Agent"])
 app.include_router(voice_router, prefix="/api", tags=["Voice"])
 app.include_router(emotion_router, prefix="/api", tags=["Emotion"])
 app.include_router(workout_router, prefix="/api", tags=["Workout"])
+app.include_router(metrics_router, prefix="/api", tags=["Metrics"])
+app.include_router(history_router, prefix="/api", tags=["History"])
+app.include_router(admin_router, prefix="/api", tags=["Admin"])
 
 @app.get("/", tags=["Root"])
 async def root():
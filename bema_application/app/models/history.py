@@ -0,0 +1,8 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class HistoryPage(BaseModel):
+    """One page of history, newest first. Pass `next_cursor` back as `cursor` for the next page."""
+    items: List[dict]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class RagIndexBuild(BaseModel):
+    version: str
+    state: str  # running | succeeded | failed
+    stage: str  # queued, loading, deduplicating, embedding, validating, collecting, done
+    done: int = 0
+    total: int = 0
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    removed_versions: List[str] = []
+    # From create_vector_store: chunks, duplicates_removed, embedding_seconds(_saved), index_bytes, ...
+    stats: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class RagIndexStatus(BaseModel):
+    active_version: Optional[str] = None
+    versions: List[str] = []
+    build: Optional[RagIndexBuild] = None
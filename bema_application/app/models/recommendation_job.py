@@ -0,0 +1,35 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+from pydantic import BaseModel
+from models.suggestion import Suggestion
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class StageTiming(BaseModel):
+    stage: str
+    seconds: float
+
+
+class RecommendationJob(BaseModel):
+    job_id: str
+    user_id: str
+    status: JobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stage_timings: List[StageTiming] = []
+    result: Optional[Suggestion] = None
+    error: Optional[str] = None
+
+
+class RecommendationJobAccepted(BaseModel):
+    job_id: str
+    status: JobStatus
+    deduplicated: bool
@@ -8,4 +8,10 @@ class WorkoutPerDay(BaseModel):
 class WorkoutSummary(BaseModel):
     squats : WorkoutPerDay
     pushups : WorkoutPerDay
-    plank : WorkoutPerDay
\ No newline at end of file
+    plank : WorkoutPerDay
+
+class WorkoutReasons(BaseModel):
+    """LLM-written explanations for a workout plan whose frequencies were already decided."""
+    squats: str
+    pushups: str
+    plank: str
@@ -0,0 +1,41 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from models.rag_index import RagIndexBuild, RagIndexStatus
+from services.rag_index_service import RebuildInProgressError, rag_index
+
+load_dotenv()
+
+# Admin endpoints require it in the X-Admin-Token header. While it is unset they are disabled (404).
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/admin/rag-index", response_model=RagIndexStatus)
+async def rag_index_status():
+    """Active RAG index version, the versions on disk, and the progress of the last rebuild in this worker."""
+    return await run_in_threadpool(rag_index.status)
+
+
+@router.post("/admin/rag-index/rebuild", response_model=RagIndexBuild, status_code=202)
+async def rebuild_rag_index():
+    """
+    Builds a new RAG index version in the background and swaps it in when it is ready.
+    Poll GET /api/admin/rag-index for progress. 409 while a rebuild is already running.
+    """
+    try:
+        return rag_index.start_rebuild()
+    except RebuildInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -1,22 +1,37 @@
 # app/routes/agent.py
 from core.db import store_user_suggestions_with_suggestionItems, store_user_health_profile
 from fastapi import APIRouter, HTTPException
+from core.llm_scheduler import BULK, llm_scheduler
+from fastapi.responses import StreamingResponse
 from models.user_health import UserHealthProfile
-from services.agent_service import create_recommendation_workflow
-from models.rag_state import RagState
+from services.agent_service import create_recommendation_workflow, run_recommendation_workflow
+from services.recommendation_job_service import JobQueueFullError, RecommendationJobQueue
+from models.recommendation_job import JobStatus, RecommendationJob, RecommendationJobAccepted
 from models.suggestion import Suggestion
-from utils.retriever import get_retriever
+from services.rag_index_service import get_retriever
+from typing import Callable, Optional
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_response(user_health_profile: UserHealthProfile) -> Suggestion:
+AGENT_JOB_WORKERS = int(os.getenv("AGENT_JOB_WORKERS", "2"))
+AGENT_JOB_QUEUE_SIZE = int(os.getenv("AGENT_JOB_QUEUE_SIZE", "32"))
+AGENT_JOB_RETENTION = int(os.getenv("AGENT_JOB_RETENTION", "1000"))
+
+def get_response(
+    user_health_profile: UserHealthProfile,
+    on_stage: Optional[Callable[[str, float], None]] = None
+) -> Suggestion:
     """
     Initializes and runs the RAG agent workflow to get health recommendations.
     
     Args:
         user_health_profile (UserHealthProfile): The health profile of the user.
+        on_stage (Callable, optional): Called with (stage_name, seconds) after every
+            workflow node and after the results are stored.
         
     Returns:
         Suggestion: A Pydantic object containing the personalized health suggestions.
@@ -24,41 +39,22 @@ def get_response(user_health_profile: UserHealthProfile) -> Suggestion:
     Raises:
         Exception: If the vector store is not found or the agent fails to generate a valid response.
     """
-    # Path is relative to the root of the project where the main app is run
-    PERSIST_DIRECTORY = os.getenv("PERSIST_DIRECTORY", "core/chroma_db")
-    
-    retriever = get_retriever(persist_directory=PERSIST_DIRECTORY)
+    # Active RAG index version (loaded and warmed by main.lifespan, swapped by rebuilds)
+    retriever = get_retriever()
     if not retriever:
         raise Exception("Vector store not found. Please ensure it has been created.")
 
     app = create_recommendation_workflow(retriever)
-    
-    # Dynamically create the question from the user profile for better context
-    question = (
-        f"Provide health recommendations for a {user_health_profile.age}-year-old "
-        f"{user_health_profile.gender} {user_health_profile.profession}"
-    )
-    if user_health_profile.hasDisabilitiesOrSpecialNeeds:
-        question += f" with {user_health_profile.disabilityDiscription}"
-    if user_health_profile.hasFamilyMedicalHistory:
-        question += f" and a family history of {user_health_profile.familyMedicalHistoryDiscription}"
-    question += "."
-
-    initial_state = RagState(
-        health_profile=user_health_profile,
-        question=question,
-        retries=0
-    )
-    
-    print("\n--- Running RAG Agent Workflow ---")
-    final_state_data = app.invoke(initial_state.model_dump())
-    final_state = RagState(**final_state_data)
+    final_state = run_recommendation_workflow(app, user_health_profile, on_stage=on_stage)
 
     if isinstance(final_state.generation, Suggestion):
         print("\n--- Workflow Complete: Final Recommendations ---")
         # Store user profile and suggestions in the database
+        store_started = time.perf_counter()
         store_user_health_profile(user_health_profile)
         store_user_suggestions_with_suggestionItems(final_state.health_profile.userId, final_state.generation)
+        if on_stage:
+            on_stage("store_results", time.perf_counter() - store_started)
         return final_state.generation
     else:
         error_message = f"Workflow finished with an error or no valid generation. Final state: {final_state.generation}"
@@ -66,7 +62,6 @@ def get_response(user_health_profile: UserHealthProfile) -> Suggestion:
         raise Exception(error_message)
 
 
-
 router = APIRouter()
 
 
@@ -76,8 +71,67 @@ async def rag_agent(user_health_profile: UserHealthProfile):
     API endpoint to get personalized health recommendations from the RAG agent.
     """
     try:
-        response = get_response(user_health_profile)
+        # Run the blocking workflow on the bulk threads so it neither stalls the event loop
+        # nor takes the shared pool from chat while it waits for an LLM slot
+        response = await llm_scheduler.run_in_threadpool(BULK, get_response, user_health_profile)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+# --- Asynchronous recommendation jobs ---
+# Started and stopped from main.lifespan.
+recommendation_jobs = RecommendationJobQueue(
+    runner=get_response,
+    max_workers=AGENT_JOB_WORKERS,
+    max_queue_size=AGENT_JOB_QUEUE_SIZE,
+    max_retained=AGENT_JOB_RETENTION
+)
+
+TERMINAL_JOB_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+@router.post("/agent/jobs", response_model=RecommendationJobAccepted, status_code=202)
+async def submit_recommendation_job(user_health_profile: UserHealthProfile):
+    """
+    Queues a recommendation job and returns its id immediately.
+    Poll `GET /agent/jobs/{job_id}` or subscribe to `/agent/jobs/{job_id}/events` for the result.
+    """
+    try:
+        job, deduplicated = recommendation_jobs.submit(user_health_profile)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return RecommendationJobAccepted(job_id=job.job_id, status=job.status, deduplicated=deduplicated)
+
+
+@router.get("/agent/jobs/{job_id}", response_model=RecommendationJob)
+async def get_recommendation_job(job_id: str):
+    """Returns the current status, stage timings and (when finished) the result of a job."""
+    job = recommendation_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/agent/jobs/{job_id}/events")
+async def stream_recommendation_job(job_id: str):
+    """Server-Sent Events stream that pushes the job every time it changes, until it finishes."""
+    if not recommendation_jobs.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last_version = -1
+        while True:
+            version = recommendation_jobs.version(job_id)
+            job = recommendation_jobs.get(job_id)
+            if not job:
+                yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+                return
+            if version != last_version:
+                last_version = version
+                yield f"data: {job.model_dump_json()}\n\n"
+            if job.status in TERMINAL_JOB_STATUSES:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -3,6 +3,7 @@ from typing import Optional
 
 from requests import request
 from fastapi import APIRouter, HTTPException
+from core.llm_scheduler import INTERACTIVE, llm_scheduler
 from services.chat_service import answer_question_with_memory
 from pydantic import BaseModel
 from models.answer_with_justification import AnswerWithJustification
@@ -12,13 +13,19 @@ router = APIRouter()
 class QuestionRequest(BaseModel):
     question: str
     emotion: Optional[str] = None
+    # Optional: LLM calls are queued fairly per user (see core.llm_scheduler)
+    user_id: Optional[str] = None
 
 @router.post("/bot/")
 async def query_agent(request: QuestionRequest):
     try:
-        response = answer_question_with_memory(
+        # Blocking (and possibly queued for an LLM slot): interactive threads, off the event loop
+        response = await llm_scheduler.run_in_threadpool(
+            INTERACTIVE,
+            answer_question_with_memory,
             question=request.question,
-            emotion=request.emotion if request.emotion is not None else ""
+            emotion=request.emotion if request.emotion is not None else "",
+            user_id=request.user_id
         )
         return response
     except Exception as e:
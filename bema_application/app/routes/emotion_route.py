@@ -1,7 +1,12 @@
 import io
-from fastapi import APIRouter, HTTPException, UploadFile, File
+import asyncio
+from fastapi import APIRouter, HTTPException, UploadFile, File, WebSocket
 from PIL import Image
 from services.emotion_service import EmotionService
+from services.artifact_writer import ArtifactWriter
+from services.emotion_inference_worker import EmotionInferenceWorker, InferenceQueueFullError
+from services.emotion_stream_service import EmotionStreamSession
+from core.model_registry import model_registry
 from dotenv import load_dotenv
 import os
 import uuid
@@ -13,8 +18,55 @@ router = APIRouter()
 YOLO_PATH = os.getenv("YOLO_PATH", "resources/yolo11n.pt")
 EMOTION_PATH = os.getenv("EMOTION_PATH", "resources/best.pt")
 IMAGES_OUTPUT_FOLDER = os.getenv("IMAGES_OUTPUT_FOLDER", "resources/images")
+# CPU inference backend: "torch" (default), "onnx" or "openvino"; EMOTION_INT8=true quantizes the export.
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "torch")
+EMOTION_INT8 = os.getenv("EMOTION_INT8", "false").lower() == "true"
+# Fast path: downscale on decode to EMOTION_INPUT_SIZE and skip the person pass when the
+# face box already covers EMOTION_TIGHT_CROP_RATIO of the image.
+EMOTION_FAST_PATH = os.getenv("EMOTION_FAST_PATH", "false").lower() == "true"
+EMOTION_INPUT_SIZE = int(os.getenv("EMOTION_INPUT_SIZE", "640"))
+EMOTION_TIGHT_CROP_RATIO = float(os.getenv("EMOTION_TIGHT_CROP_RATIO", "0.3"))
+# Streaming: run the person detector every N frames and smooth labels over a window of frames.
+EMOTION_STREAM_PERSON_EVERY_N = int(os.getenv("EMOTION_STREAM_PERSON_EVERY_N", "5"))
+EMOTION_STREAM_SMOOTHING_WINDOW = int(os.getenv("EMOTION_STREAM_SMOOTHING_WINDOW", "8"))
+EMOTION_MAX_BATCH_SIZE = int(os.getenv("EMOTION_MAX_BATCH_SIZE", "8"))
+EMOTION_BATCH_WINDOW_MS = float(os.getenv("EMOTION_BATCH_WINDOW_MS", "10"))
+EMOTION_QUEUE_SIZE = int(os.getenv("EMOTION_QUEUE_SIZE", "64"))
+# Debug images: "off" (default), "sample" (EMOTION_ARTIFACT_SAMPLE_RATE of requests) or "all".
+EMOTION_ARTIFACTS = os.getenv("EMOTION_ARTIFACTS", "off")
+EMOTION_ARTIFACT_SAMPLE_RATE = float(os.getenv("EMOTION_ARTIFACT_SAMPLE_RATE", "0.05"))
+EMOTION_ARTIFACT_MAX_FILES = int(os.getenv("EMOTION_ARTIFACT_MAX_FILES", "2000"))
+EMOTION_ARTIFACT_MAX_AGE_HOURS = float(os.getenv("EMOTION_ARTIFACT_MAX_AGE_HOURS", "72"))
 
-emotion_service = EmotionService(YOLO_PATH, EMOTION_PATH, IMAGES_OUTPUT_FOLDER)
+# Started and stopped from main.lifespan.
+artifact_writer = ArtifactWriter(
+    IMAGES_OUTPUT_FOLDER,
+    mode=EMOTION_ARTIFACTS,
+    sample_rate=EMOTION_ARTIFACT_SAMPLE_RATE,
+    max_files=EMOTION_ARTIFACT_MAX_FILES,
+    max_age_hours=EMOTION_ARTIFACT_MAX_AGE_HOURS
+)
+
+def _load_emotion_service() -> EmotionService:
+    return EmotionService(
+        YOLO_PATH,
+        EMOTION_PATH,
+        artifact_writer,
+        backend=EMOTION_BACKEND,
+        int8=EMOTION_INT8,
+        fast_path=EMOTION_FAST_PATH,
+        input_size=EMOTION_INPUT_SIZE,
+        tight_crop_ratio=EMOTION_TIGHT_CROP_RATIO
+    )
+
+# The YOLO models are loaded by the registry (at startup, see main.lifespan, or on first use).
+model_registry.register("emotion", _load_emotion_service, warmup=lambda service: service.warmup())
+emotion_worker = EmotionInferenceWorker(
+    lambda: model_registry.get("emotion"),
+    max_batch_size=EMOTION_MAX_BATCH_SIZE,
+    max_wait_ms=EMOTION_BATCH_WINDOW_MS,
+    max_queue_size=EMOTION_QUEUE_SIZE
+)
 
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png"}
 MAX_FILE_SIZE = 2 * 1024 * 1024 
@@ -32,7 +84,70 @@ async def detect_emotion(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File size exceeds the maximum limit of 2 MB.")
 
     try:
-        result = emotion_service.detect_emotion(contents, file_extension)
+        result = await emotion_worker.detect(contents, file_extension)
         return {"result": result}
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error processing the image.")
+
+
+@router.websocket("/detect_emotion/stream")
+async def stream_emotion(websocket: WebSocket):
+    """
+    Streams emotion labels for a live video feed.
+
+    The client sends JPEG/PNG frames as binary messages; the server answers each
+    processed frame with a JSON message containing the smoothed `label`. When
+    inference falls behind, only the newest frame is kept and the others are
+    skipped (reported as `skipped_frames`).
+    """
+    await websocket.accept()
+    session = EmotionStreamSession(
+        await emotion_worker.run(model_registry.get, "emotion"),
+        person_every_n=EMOTION_STREAM_PERSON_EVERY_N,
+        smoothing_window=EMOTION_STREAM_SMOOTHING_WINDOW
+    )
+    latest = {"frame": None, "skipped": 0}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes")
+            if not frame:
+                continue  # text messages are ignored
+            if latest["frame"] is not None:
+                latest["skipped"] += 1
+            latest["frame"] = frame
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            waiter = asyncio.create_task(frame_ready.wait())
+            done, _ = await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                waiter.cancel()
+                break
+            frame_ready.clear()
+            frame, skipped = latest["frame"], latest["skipped"]
+            latest["frame"], latest["skipped"] = None, 0
+
+            if len(frame) > MAX_FILE_SIZE:
+                await websocket.send_json({"error": "Frame size exceeds the maximum limit of 2 MB."})
+                continue
+            try:
+                result = await emotion_worker.run(session.process, frame)
+            except InferenceQueueFullError as e:
+                result = {"error": str(e)}
+            except Exception:
+                result = {"error": "Error processing the frame."}
+            result["skipped_frames"] = skipped
+            await websocket.send_json(result)
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Error processing the image.")
\ No newline at end of file
+        print(f"⚠️ Emotion stream closed: {e}")
+    finally:
+        receiver.cancel()
@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from core.llm_scheduler import llm_scheduler
+from core.model_registry import model_registry
+from core.ollama_pool import ollama_pool
+
+router = APIRouter()
+
+
+@router.get("/health")
+async def health():
+    """Liveness check (used by the Docker healthcheck), with per-model load and warmup times, LLM queues and endpoints."""
+    return {
+        "status": "ok",
+        "ready": model_registry.is_ready(),
+        "models": model_registry.status(),
+        "llm": llm_scheduler.status(),
+        "ollama": ollama_pool.status(),
+    }
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness check: 503 until startup finished and while any model has failed to load."""
+    is_ready = model_registry.is_ready()
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "models": model_registry.status()}
+    )
@@ -0,0 +1,79 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from core.db import (
+    SUGGESTION_HISTORY_FIELDS, WORKOUT_HISTORY_FIELDS, get_suggestion_history, get_workout_history
+)
+from models.history import HistoryPage
+from utils.pagination import decode_cursor, encode_cursor
+
+router = APIRouter()
+
+MAX_PAGE_SIZE = 100
+
+
+def _parse_fields(fields: Optional[str], allowed: dict) -> Optional[list]:
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s) {unknown}. Allowed: {sorted(allowed)}")
+    return requested
+
+
+def _parse_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _page(fetch, user_id: str, limit: int, cursor: Optional[str], fields: Optional[list], timestamp_key: str) -> HistoryPage:
+    try:
+        rows, has_more = await run_in_threadpool(fetch, user_id, limit, _parse_cursor(cursor), fields)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Failed to read history for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read history")
+    next_cursor = encode_cursor(rows[-1][timestamp_key], rows[-1]["id"]) if has_more else None
+    # Compact items: drop null columns
+    items = [{key: value for key, value in row.items() if value is not None} for row in rows]
+    return HistoryPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/history/suggestions/{user_id}", response_model=HistoryPage, response_model_exclude_none=True)
+async def suggestion_history(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated subset of: suggestionKey, title, detail, total")
+):
+    """
+    Stored suggestions for a user, newest first.
+    Uses keyset pagination: pass the returned `next_cursor` as `cursor` to get the next page.
+    """
+    return await _page(
+        get_suggestion_history, user_id, limit, cursor, _parse_fields(fields, SUGGESTION_HISTORY_FIELDS), "createdAt"
+    )
+
+
+@router.get("/history/workouts/{user_id}", response_model=HistoryPage, response_model_exclude_none=True)
+async def workout_history(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated subset of: exercise, reps, accuracy, timestamp, duration, feedback_points"
+    )
+):
+    """
+    Recorded workout sessions for a user, newest first.
+    Uses keyset pagination: pass the returned `next_cursor` as `cursor` to get the next page.
+    """
+    return await _page(
+        get_workout_history, user_id, limit, cursor, _parse_fields(fields, WORKOUT_HISTORY_FIELDS), "created_at"
+    )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics(format: str = "json"):
+    """
+    Returns in-process timing and counter metrics (p50/p95/p99 per stage).
+    Use `?format=prometheus` for the Prometheus text exposition format.
+    """
+    if format == "prometheus":
+        return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+    return metrics.snapshot()
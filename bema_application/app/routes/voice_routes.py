@@ -1,29 +1,51 @@
 import io
 import json
+import os
+import time
+from typing import Optional
+from dotenv import load_dotenv
 from fastapi import APIRouter, HTTPException, UploadFile, File
 from fastapi.responses import StreamingResponse
-from services.voice_service import transcribe_audio_data,text_to_speech
-from services.chat_service import answer_question_with_memory
+from services.voice_service import (
+    transcribe_audio_data, text_to_speech, answer_question, stream_spoken_answer, server_timing_header, tts_media_type
+)
+
+load_dotenv()
 
 router = APIRouter()
 
+# Default for the `pipelined` query parameter of /voice/.
+VOICE_PIPELINED = os.getenv("VOICE_PIPELINED", "false").lower() == "true"
+
 
 @router.post("/voice/")
-async def query_voice(audio_file: UploadFile = File(...)):
+async def query_voice(audio_file: UploadFile = File(...), pipelined: Optional[bool] = None, user_id: Optional[str] = None):
+    """
+    Speech in, speech out: STT -> LLM -> TTS. Every stage runs off the event loop with
+    bounded concurrency; per-stage timings are returned in the Server-Timing header.
+
+    With `pipelined=true` the answer is synthesized sentence by sentence while the LLM
+    is still generating, and the MP3 chunks are streamed as they become ready.
+    `user_id` (optional) is used for fair queuing of the LLM call.
+    """
+    timings = {}
     try:
         # Read the uploaded audio file
         audio_data = await audio_file.read()
         print(f"📥 Received audio file, size: {len(audio_data)} bytes")
         
         # Transcribe the audio data
-        text = await transcribe_audio_data(audio_data)
+        text = await transcribe_audio_data(audio_data, timings)
         if not text:
             raise HTTPException(status_code=400, detail="Failed to transcribe audio")
         print(f"📝 Transcribed text: '{text}'")
+
+        if pipelined if pipelined is not None else VOICE_PIPELINED:
+            return await _stream_pipelined(text, timings, user_id)
         
         # Generate a response
         print("🤖 Generating LLM response...")
-        response = answer_question_with_memory(question=text)
+        response = await answer_question(text, timings, user_id)
         print(f"✅ LLM Response type: {type(response)}")
         print(f"✅ LLM Response: {response}")
         
@@ -47,7 +69,7 @@ async def query_voice(audio_file: UploadFile = File(...)):
         
         # Convert only the answer text to speech
         print(f"🔊 Converting to speech: '{answer_text}'")
-        audio_response = await text_to_speech(answer_text)
+        audio_response = await text_to_speech(answer_text, timings)
         if not audio_response:
             raise HTTPException(status_code=500, detail="Failed to generate audio response")
         
@@ -56,7 +78,11 @@ async def query_voice(audio_file: UploadFile = File(...)):
         # Create a StreamingResponse with the audio data
         audio_stream = io.BytesIO(audio_response)
         
-        return StreamingResponse(audio_stream, media_type="audio/mpeg")
+        return StreamingResponse(
+            audio_stream,
+            media_type=tts_media_type(),
+            headers={"Server-Timing": server_timing_header(timings)}
+        )
 
     except HTTPException:
         raise
@@ -65,3 +91,29 @@ async def query_voice(audio_file: UploadFile = File(...)):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _stream_pipelined(text: str, timings: dict, user_id: Optional[str] = None) -> StreamingResponse:
+    print("🤖 Streaming LLM response sentence by sentence...")
+    started = time.perf_counter()
+    audio_chunks = stream_spoken_answer(text, timings, user_id)
+    # Wait for the first chunk so failures can still be reported with a proper status code.
+    try:
+        first_chunk = await audio_chunks.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="No answer found in response")
+    timings["first_audio"] = {"dur": (time.perf_counter() - started) * 1000, "wait": 0.0}
+
+    async def body():
+        try:
+            yield first_chunk
+            async for chunk in audio_chunks:
+                yield chunk
+        finally:
+            await audio_chunks.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type=tts_media_type(),
+        headers={"Server-Timing": server_timing_header(timings)}
+    )
@@ -1,6 +1,9 @@
 import json
 from models.user_health import UserHealthProfile
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from models.pose_session import PoseSessionRequest, PoseSessionResponse
 from core.db import get_db_connection, DB_CONFIG, get_user_health_profile
 from datetime import datetime
@@ -8,7 +11,10 @@ import logging
 import requests
 import os
 from dotenv import load_dotenv
-from services.workout_service import generate_workout_motivation, generate_workout_times_per_day
+from services.workout_service import generate_workout_motivation, get_workout_plan_cached
+from services.workout_export import EXPORT_FORMATS, MEDIA_TYPES, check_format, export_watermark, export_workout_sessions
+from utils.pagination import decode_cursor, encode_cursor
+from routes.admin_routes import require_admin
 
 load_dotenv()
 
@@ -72,16 +78,50 @@ async def save_pose_session(session: PoseSessionRequest):
 @router.get("/workout/plan/{user_id}", response_model=dict)
 async def get_workout_plan(user_id: str):
     """
-    Get personalized workout plan for the user
+    Get personalized workout plan for the user.
+    times_per_day comes from deterministic safety rules; the LLM only explains it.
     """
     try:
         user_health_profile =  get_user_health_profile(user_id)
         if not user_health_profile:
             raise HTTPException(status_code=404, detail="User health profile not found")
 
-        workout_plan = await generate_workout_times_per_day(user_id, user_health_profile)
+        # Rule-based frequencies, cached per profile version (invalidated when the profile is stored)
+        workout_plan = await get_workout_plan_cached(user_id, user_health_profile)
         return {"user_id": user_id, "workout_plan": workout_plan}
 
     except Exception as e:
         logger.error(f"Error fetching workout plan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch workout plan: {str(e)}")
+
+
+@router.get("/workout/export", dependencies=[Depends(require_admin)])
+async def export_workout_sessions_route(
+    format: str = Query("ndjson", description=f"One of: {', '.join(EXPORT_FORMATS)}"),
+    since: Optional[str] = Query(None, description="X-Export-Watermark of a previous export, to get only newer sessions")
+):
+    """
+    Streams all workout sessions (every user) for analytics, oldest first.
+    Admin only (X-Admin-Token, see routes.admin_routes).
+
+    The body is sent in chunks straight from an unbuffered database cursor. The
+    X-Export-Watermark header marks where this export ends; pass it as `since`
+    next time for an incremental export.
+    """
+    try:
+        check_format(format)
+        after = decode_cursor(since) if since else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        until = await run_in_threadpool(export_watermark, after)
+    except Exception as e:
+        logger.error(f"Error starting workout export: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to export workout sessions: {str(e)}")
+
+    headers = {"Content-Disposition": f'attachment; filename="workout_sessions.{format}"'}
+    if until:
+        headers["X-Export-Watermark"] = encode_cursor(*until)
+    # A sync iterator: Starlette pulls each chunk in the threadpool, so the blocking cursor stays off the event loop.
+    return StreamingResponse(export_workout_sessions(format, after, until), media_type=MEDIA_TYPES[format], headers=headers)
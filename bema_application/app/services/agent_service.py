@@ -1,175 +1,125 @@
 import os
+import functools
 import json
 import re
+import time
+from typing import Callable, Optional
 from pydantic import BaseModel
 import requests
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain_community.tools import BraveSearch
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
+from core.llm_scheduler import BULK, llm_scheduler
+from core.metrics import metrics, observe_ollama_response, span
+from core.ollama_pool import model_for, ollama_pool
 from models.rag_state import RagState
 from models.suggestion import Suggestion
+from models.user_health import UserHealthProfile
 
 load_dotenv()
 
-NGROK_URL = os.getenv("NGROK_URL")
 BRAVE_API_KEY = os.getenv("BRAVE_API_KEY")
+BRAVE_SEARCH_URL = os.getenv("BRAVE_SEARCH_URL", "https://api.search.brave.com/res/v1/web/search")
+# How long Ollama keeps the model (and its prompt cache) resident after a call.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Upper bounds on the retrieved text interpolated into the per-user prompt.
+MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "4000"))
+MAX_WEB_CONTEXT_CHARS = int(os.getenv("MAX_WEB_CONTEXT_CHARS", "2000"))
+
+# Static part of the recommendation prompt. It must stay byte-for-byte identical
+# between calls so that Ollama can reuse its evaluated prefix; everything that
+# depends on the user goes into build_recommendation_prompt().
+RECOMMENDATION_SYSTEM_PROMPT = """You are an AI assistant doctor. Using the user's health profile and the provided context, generate exactly 11 personalized health recommendations.
+Respond with only a single valid JSON object: no surrounding text, markdown or explanations.
+Required keys: water_intake, walking_duration, stretching_time, stretching_duration, mindfulness_exercise, nutrition_tip, sleep_reminder, screen_time_break, special_task, social_interaction, posture_reminder.
+Each value is an object with "title", "detail" (1-2 sentences tied to the user's conditions), "type" (diet, exercise, wellness, monitoring or social) and "total" (an integer daily target: glasses, minutes, mg, hours, count).
+Prefer facts from the context over general knowledge, and never recommend anything the profile makes unsafe.
+
+Example for a 45-year-old male software developer with high blood pressure and cholesterol, a sedentary job and a father who had a heart attack:
+{"water_intake":{"title":"Stay Hydrated for Heart Health","detail":"Drink at least 8 glasses of water daily to support circulation and blood pressure control.","type":"diet","total":8},"walking_duration":{"title":"Brisk Walking","detail":"Walk briskly for 30 minutes to lower blood pressure and counter your sedentary job.","type":"exercise","total":30},"stretching_time":{"title":"Morning Stretch","detail":"Stretch your back, neck and legs for 10 minutes after waking.","type":"exercise","total":10},"stretching_duration":{"title":"Desk De-Stressing","detail":"Take a 5-minute stretch break every hour at your desk.","type":"exercise","total":5},"mindfulness_exercise":{"title":"Mindful Breathing","detail":"Practice 5 minutes of slow breathing (in 4s, hold 4s, out 6s) to reduce stress-related blood pressure spikes.","type":"wellness","total":5},"nutrition_tip":{"title":"Reduce Sodium Intake","detail":"Keep sodium under 1,500 mg per day by avoiding processed foods and cooking with herbs.","type":"diet","total":1500},"sleep_reminder":{"title":"Prioritize Sleep","detail":"Sleep at least 7 hours to support blood pressure regulation.","type":"wellness","total":7},"screen_time_break":{"title":"20-20-20 Rule","detail":"Every 20 minutes, look 20 feet away for 20 seconds to reduce eye strain.","type":"wellness","total":20},"special_task":{"title":"Monitor Blood Pressure","detail":"Measure and log your blood pressure at home twice a week.","type":"monitoring","total":2},"social_interaction":{"title":"Connect with Family","detail":"Talk with your family about your shared heart-disease risk and support each other's healthy habits.","type":"social","total":1},"posture_reminder":{"title":"Ergonomic Check","detail":"Check once today that your monitor is at eye level and your chair supports your lower back.","type":"wellness","total":1}}"""
 
 
 class RagAgent:
     """Encapsulates the logic for the RAG recommendation agent with a self-correction loop."""
 
     def __init__(self, retriever: VectorStoreRetriever):
-        if not NGROK_URL or not BRAVE_API_KEY:
-            raise ValueError("NGROK_URL and BRAVE_API_KEY must be set in your .env file.")
+        if not ollama_pool.endpoints or not BRAVE_API_KEY:
+            raise ValueError("OLLAMA_URLS (or NGROK_URL) and BRAVE_API_KEY must be set in your .env file.")
         self.retriever = retriever
         self.web_search_tool = BraveSearch(api_key=BRAVE_API_KEY)
         self.max_retries = 3
 
-    def _call_ollama_llm(self, prompt: str, format: type[BaseModel] = Suggestion) -> str:
-        """Helper function to call the Ollama model via ngrok."""
+    def _call_ollama_llm(
+        self, prompt: str, format: type[BaseModel] = Suggestion, system: Optional[str] = None, user_id: Optional[str] = None
+    ) -> str:
+        """
+        Helper function to call the Ollama model through the endpoint pool (core.ollama_pool).
+
+        Static instructions should be passed as `system`: Ollama places it before the
+        prompt, so an unchanged system text forms a common prefix whose KV cache is
+        reused across calls while `keep_alive` keeps the model loaded.
+
+        The call waits for a bulk slot (core.llm_scheduler); LlmDeadlineExceeded is
+        raised rather than retried, since the backend is already saturated.
+        """
         payload = {
-            "model": "qwen3:8b",
+            "model": model_for("recommendation"),
             "prompt": prompt,
             "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
             "options": {"temperature": 0.2},
             "format": format.model_json_schema()
         }
+        if system:
+            payload["system"] = system
         
-        try:
-            res = requests.post(
-                f"{NGROK_URL}/api/generate",
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=90 # Increased timeout slightly for complex generation
-            )
-            print(f"❇️ Ollama API response status: {res}")
-            res.raise_for_status()
-            
-            raw_response = res.json().get('response', '')
-            print(f"--- Raw LLM Response ---\n{raw_response}\n--------------------")
-            # remove think tags 
-            cleaned_response = re.sub(r'<think>.*?</think>', '', raw_response, flags=re.DOTALL).strip()
-            return cleaned_response
-        except requests.RequestException as e:
-            print(f"❌ Error calling Ollama API: {e}")
-            return f'{{"error": "Could not get a response from the LLM: {e}"}}'
+        labels = {"task": "recommendation"}
+        with span("ollama.generate", labels) as current:
+            try:
+                with llm_scheduler.slot(BULK, user_id=user_id):
+                    res = ollama_pool.post(
+                        "/api/generate",
+                        payload,
+                        timeout=90 # Increased timeout slightly for complex generation
+                    )
+                print(f"❇️ Ollama API response status: {res}")
+                res.raise_for_status()
+
+                response_json = res.json()
+                raw_response = response_json.get('response', '')
+                stats = observe_ollama_response(response_json, labels, current)
+                print(
+                    f"⏱️ Ollama prompt eval: {stats['prompt_tokens']} tokens in {stats['prompt_eval_seconds']:.2f}s, "
+                    f"completion: {stats['completion_tokens']} tokens in {stats['eval_seconds']:.2f}s"
+                )
+                print(f"--- Raw LLM Response ---\n{raw_response}\n--------------------")
+                # remove think tags 
+                cleaned_response = re.sub(r'<think>.*?</think>', '', raw_response, flags=re.DOTALL).strip()
+                return cleaned_response
+            except requests.RequestException as e:
+                print(f"❌ Error calling Ollama API: {e}")
+                metrics.increment("ollama.generate.errors", labels=labels)
+                current.set("error", str(e))
+                return f'{{"error": "Could not get a response from the LLM: {e}"}}'
 
     def retrieve_context(self, state: RagState) -> dict:
         print("--- Node: Retrieve Context ---")
         question = state.question
         documents = self.retriever.invoke(question)
+        metrics.observe("agent.retrieved_chunks", len(documents))
         context = "\n\n".join([doc.page_content for doc in documents])
         state.context = context
         return {"context": context, "web_context": ""} # Initialize web_context as empty
 
     def generate(self, state: RagState) -> dict:
         print("--- Node: Generate Recommendations ---")
-        prompt = f'''You are an AI assistant doctor. Based on the user's health profile and the provided context, you must generate exactly 11 personalized health recommendations. Your response must be **only** a single, valid JSON object. 
-        Do not include any surrounding text, markdown, or explanations. The `total` key within each suggestion must be an **integer**.
-            **--- EXAMPLE ---**
-            **INPUT:**
-            * **User Health Profile:**
-                {{
-                    "age": 45,
-                    "gender": "Male",
-                    "weight": 85,
-                    "weightUnit": "kg",
-                    "height": 175,
-                    "heightUnit": "cm",
-                    "profession": "Software Developer",
-                    "hasHighBloodPressure": true,
-                    "highBloodPressureTreatmentYears": 5,
-                    "hasCholesterol": true,
-                    "cholesterolTreatmentYears": 3,
-                    "exercises": false,
-                    "smokes": false,
-                    "drinks": true,
-                    "glassesPerWeek": "3-5",
-                    "hasDiabetes": false,
-                    "hasAllergies": false,
-                    "hasDisabilitiesOrSpecialNeeds": false,
-                    "hadSurgeries": false,
-                    "hasFamilyMedicalHistory": true,
-                    "familyMedicalHistoryDiscription": "Father had a heart attack at age 55."
-                }}
-                
-            * **Context:**
-                * **Internal Documents:** "The user's recent check-up indicates a blood pressure of 145/90 mmHg and an LDL cholesterol level of 160 mg/dL. The user reports a sedentary lifestyle due to their desk job and seeks actionable advice to improve cardiovascular health."
-                * **Web Search:** "The American Heart Association recommends at least 150 minutes of moderate-intensity aerobic activity per week and limiting sodium intake to less than 1500 mg per day for individuals with hypertension."
-
-            **REQUIRED JSON OUTPUT:**
-            {{
-            "water_intake": {{
-                "title": "Stay Hydrated for Heart Health",
-                "detail": "Drink at least 8 glasses (around 2 liters) of water daily. Proper hydration supports blood circulation and cardiovascular function, which is crucial given your high blood pressure.",
-                "type": "diet",
-                "total": 8
-            }},
-            "walking_duration": {{
-                "title": "Brisk Walking",
-                "detail": "Aim for a 30-minute brisk walk. This helps lower blood pressure, manage cholesterol, and counteracts the effects of your sedentary job. Consistency is key to improving heart health.",
-                "type": "exercise",
-                "total": 30
-            }},
-            "stretching_time": {{
-                "title": "Morning Stretch",
-                "detail": "Start your day with a 10-minute stretching routine focusing on your back, neck, and legs to improve flexibility and reduce stiffness from sitting.",
-                "type": "exercise",
-                "total": 10
-            }},
-            "stretching_duration": {{
-                "title": "Desk De-Stressing",
-                "detail": "Take a 5-minute break every hour to stretch your neck, shoulders, and wrists at your desk. This helps prevent repetitive strain and improves blood flow.",
-                "type": "exercise",
-                "total": 5
-            }},
-            "mindfulness_exercise": {{
-                "title": "Mindful Breathing",
-                "detail": "Practice 5 minutes of deep, mindful breathing. This can help lower stress levels, which is a known contributor to high blood pressure. Inhale for 4 seconds, hold for 4, and exhale for 6.",
-                "type": "wellness",
-                "total": 5
-            }},
-            "nutrition_tip": {{
-                "title": "Reduce Sodium Intake",
-                "detail": "To manage your hypertension, limit sodium to under 1,500 mg per day. Check food labels, avoid processed foods, and cook with herbs and spices instead of salt.",
-                "type": "diet",
-                "total": 1500
-            }},
-            "sleep_reminder": {{
-                "title": "Prioritize Sleep",
-                "detail": "Aim for 7-8 hours of quality sleep per night. Consistent sleep is vital for blood pressure regulation and overall cardiovascular recovery. The minimum target is 7 hours.",
-                "type": "wellness",
-                "total": 7
-            }},
-            "screen_time_break": {{
-                "title": "20-20-20 Rule",
-                "detail": "As a Software Developer, it's important to protect your eyes. Every 20 minutes, look at something 20 feet away for at least 20 seconds to reduce eye strain.",
-                "type": "wellness",
-                "total": 20
-            }},
-            "special_task": {{
-                "title": "Monitor Blood Pressure",
-                "detail": "Check and log your blood pressure at home at least twice a week. This data is valuable for you and your doctor to track your progress and adjust treatment if needed.",
-                "type": "monitoring",
-                "total": 2
-            }},
-            "social_interaction": {{
-                "title": "Connect with Family",
-                "detail": "Given your family history of heart disease, have an open conversation with your family about shared health risks and support each other in making healthier lifestyle choices.",
-                "type": "social",
-                "total": 1
-            }},
-            "posture_reminder": {{
-                "title": "Ergonomic Check",
-                "detail": "Ensure your desk setup is ergonomic. Your monitor should be at eye level and your chair should support your lower back to prevent posture-related issues. Perform one thorough check today.",
-                "type": "wellness",
-                "total": 1
-            }}
-            }}
-            **--- END EXAMPLE ---**
-        '''
-        generation = self._call_ollama_llm(prompt)
+        if state.retries > 0:
+            metrics.increment("agent.generate.retries")
+        prompt = build_recommendation_prompt(state)
+        generation = self._call_ollama_llm(
+            prompt, system=RECOMMENDATION_SYSTEM_PROMPT, user_id=state.health_profile.userId
+        )
         state.generation = generation
         return {"generation": generation, "retries": state.retries + 1}
 
@@ -178,14 +128,17 @@ class RagAgent:
         generation_str = state.generation
         if state.retries >= self.max_retries:
             print("Validation Error: Max retries reached.")
+            metrics.increment("agent.validation", labels={"result": "max_retries"})
             return "end_error"
         try:
             parsed_json = json.loads(generation_str)
             Suggestion(**parsed_json) # Validate against the Pydantic model
             print("Validation Success: JSON structure is valid.")
+            metrics.increment("agent.validation", labels={"result": "valid"})
             return "parse_generation" # Proceed to parse the content
         except (json.JSONDecodeError, ValueError) as e:
             print(f"Validation Error: {e}. Retrying generation...")
+            metrics.increment("agent.validation", labels={"result": "invalid"})
             error_message = f"You previously failed to generate a valid JSON. Error: {e}. Please correct the output and ensure it is a single, complete JSON object with all 11 required keys."
             # Note: The state update happens in the graph, we just provide the error message
             return "retry"
@@ -237,7 +190,7 @@ class RagAgent:
         question = state.question
         print(f"Performing web search for: {question}")
         
-        search_url = "https://api.search.brave.com/res/v1/web/search"
+        search_url = BRAVE_SEARCH_URL
         headers = {
             "Accept": "application/json",
             "X-Subscription-Token": BRAVE_API_KEY
@@ -251,6 +204,7 @@ class RagAgent:
             
             data = response.json()
             results = data.get("web", {}).get("results", [])
+            metrics.observe("agent.web_results", len(results))
             
             if not results:
                 print("⚠️ Web search returned no results.")
@@ -282,17 +236,26 @@ class RagAgent:
         return {"generation": suggestion_obj}
 
 
+def _traced_node(node_name: str, node_fn: Callable[[RagState], object]) -> Callable[[RagState], object]:
+    """Wraps a graph node (or router) so every invocation is recorded as an `agent.node` span."""
+    @functools.wraps(node_fn)
+    def traced(state: RagState):
+        with span("agent.node", {"node": node_name}):
+            return node_fn(state)
+    return traced
+
+
 def create_recommendation_workflow(retriever: VectorStoreRetriever):
     """Builds and compiles the LangGraph workflow for the RAG agent."""
     agent = RagAgent(retriever)
     
     workflow = StateGraph(RagState)
     
-    # Add nodes to the graph
-    workflow.add_node("retrieve_context", agent.retrieve_context)
-    workflow.add_node("generate", agent.generate)
-    workflow.add_node("web_search", agent.web_search)
-    workflow.add_node("parse_generation", agent.parse_generation)
+    # Add nodes to the graph (each one timed as an `agent.node` span)
+    workflow.add_node("retrieve_context", _traced_node("retrieve_context", agent.retrieve_context))
+    workflow.add_node("generate", _traced_node("generate", agent.generate))
+    workflow.add_node("web_search", _traced_node("web_search", agent.web_search))
+    workflow.add_node("parse_generation", _traced_node("parse_generation", agent.parse_generation))
 
     # Set the entry point
     workflow.set_entry_point("retrieve_context")
@@ -304,7 +267,7 @@ def create_recommendation_workflow(retriever: VectorStoreRetriever):
     # Conditional edge for JSON validation after generation
     workflow.add_conditional_edges(
         "generate",
-        agent.validate_json,
+        _traced_node("validate_json", agent.validate_json),
         {
             "retry": "generate",
             "parse_generation": "parse_generation",
@@ -313,4 +276,63 @@ def create_recommendation_workflow(retriever: VectorStoreRetriever):
     )
     workflow.add_edge("parse_generation", END)
     
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()
+
+
+def build_recommendation_question(user_health_profile: UserHealthProfile) -> str:
+    """Builds the retrieval/search question from the user's health profile."""
+    question = (
+        f"Provide health recommendations for a {user_health_profile.age}-year-old "
+        f"{user_health_profile.gender} {user_health_profile.profession}"
+    )
+    if user_health_profile.hasDisabilitiesOrSpecialNeeds:
+        question += f" with {user_health_profile.disabilityDiscription}"
+    if user_health_profile.hasFamilyMedicalHistory:
+        question += f" and a family history of {user_health_profile.familyMedicalHistoryDiscription}"
+    question += "."
+    return question
+
+
+def run_recommendation_workflow(
+    app,
+    user_health_profile: UserHealthProfile,
+    on_stage: Optional[Callable[[str, float], None]] = None
+) -> RagState:
+    """
+    Runs a compiled recommendation workflow for one profile and returns the final state.
+
+    The graph is streamed rather than invoked so that `on_stage(node_name, seconds)`
+    can be reported after every node, e.g. to record per-job stage timings.
+    """
+    initial_state = RagState(
+        health_profile=user_health_profile,
+        question=build_recommendation_question(user_health_profile),
+        retries=0
+    )
+
+    print("\n--- Running RAG Agent Workflow ---")
+    final_state_data = initial_state.model_dump()
+    with span("agent.workflow"):
+        stage_started = time.perf_counter()
+        for mode, chunk in app.stream(final_state_data, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final_state_data = chunk
+            elif on_stage:
+                now = time.perf_counter()
+                for node_name in chunk:
+                    on_stage(node_name, now - stage_started)
+                stage_started = now
+    return RagState(**final_state_data)
+
+
+def build_recommendation_prompt(state: RagState) -> str:
+    """Builds the compact, per-user part of the recommendation prompt."""
+    profile_json = state.health_profile.model_dump_json(exclude={"userId"}, exclude_none=True)
+    context = (state.context or "").strip()[:MAX_CONTEXT_CHARS] or "None"
+    web_context = (state.web_context or "").strip()[:MAX_WEB_CONTEXT_CHARS] or "None"
+    return (
+        f"User Health Profile: {profile_json}\n\n"
+        f"Internal Documents:\n{context}\n\n"
+        f"Web Search:\n{web_context}\n\n"
+        "Generate the JSON object for this user now."
+    )
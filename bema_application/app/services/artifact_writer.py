@@ -0,0 +1,135 @@
+import os
+import queue
+import random
+import threading
+import time
+from typing import Callable, Optional
+from core.metrics import metrics, span
+
+ARTIFACT_MODES = ("off", "sample", "all")
+
+
+class ArtifactWriter:
+    """
+    Persists debug artifacts (e.g. annotated images) from a background thread.
+
+    `mode` decides which requests keep artifacts: "off" (none), "sample"
+    (a `sample_rate` fraction) or "all". Writes go through a bounded queue and
+    are dropped, not waited for, when it is full. The output folder is pruned
+    periodically to at most `max_files` files no older than `max_age_hours`.
+    """
+
+    def __init__(
+        self,
+        output_folder: str,
+        mode: str = "off",
+        sample_rate: float = 0.05,
+        max_queue_size: int = 32,
+        max_files: int = 2000,
+        max_age_hours: float = 72,
+        prune_interval_seconds: float = 300
+    ):
+        if mode not in ARTIFACT_MODES:
+            raise ValueError(f"Unknown artifact mode '{mode}'. Expected one of {ARTIFACT_MODES}.")
+        self.output_folder = output_folder
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_age_seconds = max_age_hours * 3600
+        self.prune_interval_seconds = prune_interval_seconds
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        if mode != "off":
+            os.makedirs(output_folder, exist_ok=True)
+
+    def should_persist(self) -> bool:
+        if self.mode == "all":
+            return True
+        if self.mode == "sample":
+            return random.random() < self.sample_rate
+        return False
+
+    def start(self):
+        if self._thread or self.mode == "off":
+            return
+        print(f"--- Starting artifact writer (mode={self.mode}, folder={self.output_folder}) ---")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._work, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Writes what is queued, waiting at most `timeout` seconds; whatever is left is dropped."""
+        if not self._thread:
+            return
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass  # the worker exits once it finds the queue empty
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def submit(self, file_name: str, write: Callable[[str], None]):
+        """Queues `write(path)` for `file_name` inside the output folder. Never blocks."""
+        if not self._thread:
+            return
+        try:
+            self._queue.put_nowait((os.path.join(self.output_folder, file_name), write))
+        except queue.Full:
+            metrics.increment("artifacts.dropped")
+
+    def _work(self):
+        last_prune = 0.0
+        while True:
+            if time.monotonic() - last_prune >= self.prune_interval_seconds:
+                self.prune()
+                last_prune = time.monotonic()
+            try:
+                # Once shutdown has begun, exit as soon as the queue is empty.
+                item = self._queue.get(timeout=0.05 if self._stop.is_set() else min(self.prune_interval_seconds, 1.0))
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is None:
+                return
+            path, write = item
+            try:
+                # The time spent here is what used to sit on the request path.
+                with span("artifacts.write"):
+                    write(path)
+                metrics.increment("artifacts.written")
+            except Exception as e:
+                print(f"❌ Failed to write artifact {path}: {e}")
+
+    def prune(self):
+        """Applies the retention policy: drop files past the max age, then the oldest beyond max_files."""
+        try:
+            entries = [entry for entry in os.scandir(self.output_folder) if entry.is_file()]
+        except FileNotFoundError:
+            return
+        now = time.time()
+        kept = []
+        removed = 0
+        for entry in entries:
+            mtime = entry.stat().st_mtime
+            if now - mtime > self.max_age_seconds:
+                removed += self._remove(entry.path)
+            else:
+                kept.append((mtime, entry.path))
+        if len(kept) > self.max_files:
+            kept.sort()
+            for _, path in kept[:len(kept) - self.max_files]:
+                removed += self._remove(path)
+        if removed:
+            metrics.increment("artifacts.pruned", removed)
+            print(f"🧹 Pruned {removed} artifact(s) from {self.output_folder}")
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
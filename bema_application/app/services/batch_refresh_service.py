@@ -0,0 +1,168 @@
+"""
+Nightly batch refresh of health recommendations for every stored user.
+
+Run from the app directory, e.g.:
+
+    python -m services.batch_refresh_service --concurrency 2 --page-size 50
+    python -m services.batch_refresh_service --resume   # continue an interrupted run
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from core.db import iter_user_health_profiles, store_suggestions_bulk
+from models.suggestion import Suggestion
+from models.user_health import UserHealthProfile
+from services.agent_service import create_recommendation_workflow, run_recommendation_workflow
+from services.rag_index_service import get_retriever
+
+load_dotenv()
+
+BATCH_CHECKPOINT_PATH = os.getenv("BATCH_CHECKPOINT_PATH", "batch_refresh_checkpoint.json")
+# Keep this low: every worker holds one generation open against the shared Ollama backend.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+BATCH_PAGE_SIZE = int(os.getenv("BATCH_PAGE_SIZE", "50"))
+
+
+def _load_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    """Writes the checkpoint atomically so an interrupted run never leaves a torn file."""
+    checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _generate_for_user(app, profile: UserHealthProfile) -> Tuple[UserHealthProfile, Optional[Suggestion], Optional[str]]:
+    try:
+        final_state = run_recommendation_workflow(app, profile)
+        if isinstance(final_state.generation, Suggestion):
+            return profile, final_state.generation, None
+        return profile, None, f"no valid generation: {final_state.generation}"
+    except Exception as e:
+        return profile, None, str(e)
+
+
+def run_batch_refresh(
+    concurrency: int = BATCH_CONCURRENCY,
+    page_size: int = BATCH_PAGE_SIZE,
+    checkpoint_path: str = BATCH_CHECKPOINT_PATH,
+    resume: bool = False,
+    limit: Optional[int] = None
+) -> dict:
+    """
+    Regenerates suggestions for all users, one page of profiles at a time.
+
+    Each page is generated with up to `concurrency` workflows in parallel, stored
+    with a single bulk write, and then checkpointed (last userId of the page), so
+    a resumed run restarts at the first page that was not fully stored.
+
+    Returns the final checkpoint, including throughput in users per minute.
+    """
+    checkpoint = _load_checkpoint(checkpoint_path) if resume else None
+    if checkpoint and checkpoint.get("completed"):
+        print("Previous batch run already completed. Starting a fresh run.")
+        checkpoint = None
+    if checkpoint:
+        print(f"Resuming batch refresh after user '{checkpoint['last_user_id']}'")
+    else:
+        checkpoint = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "last_user_id": None,
+            "processed": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "failed_user_ids": [],
+            "completed": False,
+        }
+
+    retriever = get_retriever()
+    if not retriever:
+        raise Exception("Vector store not found. Please ensure it has been created.")
+    # One compiled graph is shared by all workers; the nodes keep no per-call state.
+    app = create_recommendation_workflow(retriever)
+
+    run_started = time.perf_counter()
+    run_processed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-refresh") as executor:
+        for page in iter_user_health_profiles(page_size=page_size, after_user_id=checkpoint["last_user_id"]):
+            if limit is not None and run_processed >= limit:
+                break
+            remaining = None if limit is None else limit - run_processed
+            truncated = remaining is not None and len(page) > remaining
+            if truncated:
+                page = page[:remaining]
+
+            page_started = time.perf_counter()
+            results = list(executor.map(lambda profile: _generate_for_user(app, profile), page))
+
+            to_store: List[Tuple[str, Suggestion]] = []
+            for profile, suggestion, error in results:
+                if suggestion is not None:
+                    to_store.append((profile.userId, suggestion))
+                else:
+                    print(f"❌ Batch refresh failed for user {profile.userId}: {error}")
+                    checkpoint["failed_user_ids"].append(profile.userId)
+
+            if not store_suggestions_bulk(to_store):
+                # Leave the checkpoint on the previous page so a resumed run retries this one.
+                raise Exception(f"Bulk write failed for page ending at user '{page[-1].userId}'")
+
+            run_processed += len(page)
+            checkpoint["last_user_id"] = page[-1].userId
+            checkpoint["processed"] += len(page)
+            checkpoint["succeeded"] += len(to_store)
+            checkpoint["failed"] += len(page) - len(to_store)
+            elapsed = time.perf_counter() - run_started
+            checkpoint["users_per_minute"] = round(run_processed / elapsed * 60, 2) if elapsed else 0.0
+            _save_checkpoint(checkpoint_path, checkpoint)
+
+            print(
+                f"📦 Page of {len(page)} done in {time.perf_counter() - page_started:.1f}s "
+                f"(total {checkpoint['processed']}, {checkpoint['users_per_minute']} users/min)"
+            )
+            if truncated:
+                break
+        else:
+            # Every profile after the checkpoint has been processed, whatever the limit.
+            checkpoint["completed"] = True
+
+    elapsed = time.perf_counter() - run_started
+    checkpoint["users_per_minute"] = round(run_processed / elapsed * 60, 2) if elapsed else 0.0
+    _save_checkpoint(checkpoint_path, checkpoint)
+
+    print(
+        f"\n--- ✅ Batch refresh finished: {checkpoint['succeeded']} succeeded, {checkpoint['failed']} failed, "
+        f"{run_processed} users this run in {elapsed / 60:.1f} min ({checkpoint['users_per_minute']} users/min) ---"
+    )
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate health recommendations for all users.")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Parallel workflows against Ollama")
+    parser.add_argument("--page-size", type=int, default=BATCH_PAGE_SIZE, help="Profiles fetched and stored per page")
+    parser.add_argument("--checkpoint", default=BATCH_CHECKPOINT_PATH, help="Path of the checkpoint file")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many users")
+    args = parser.parse_args()
+
+    run_batch_refresh(
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        limit=args.limit
+    )
@@ -4,19 +4,26 @@ import os
 import json
 import requests
 import uuid
-from langchain_huggingface import HuggingFaceEmbeddings
+from typing import Iterator, Optional
 import chromadb
 from chromadb.api.types import EmbeddingFunction, Documents
+from core.llm_scheduler import INTERACTIVE, llm_scheduler
+from core.ollama_pool import model_for, ollama_pool
+from core.model_registry import model_registry
+from utils.compact_index import CompactCollection
+from utils.retriever import CHROMA_MODE, get_chroma_client, get_embeddings
 
 
 load_dotenv()
-NGROK_URL = os.getenv("NGROK_URL")
 
 PERSIST_DIRECTORY = os.getenv("PERSIST_DIRECTORY", "chroma_db")
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 RAG_COLLECTION_NAME = "rag-chroma"
 CHAT_HISTORY_COLLECTION_NAME = "chat-history"
+# "chroma" (default) or "compact": int8 codes in a memory-mapped array under
+# PERSIST_DIRECTORY/chat-history-compact, re-scored with float vectors (utils/compact_index.py).
+# The compact files are written by one process, so use it with a single worker.
+CHAT_MEMORY_INDEX = os.getenv("CHAT_MEMORY_INDEX", "chroma")
 
 # --- Custom Adapter Class ---
 class LangChainEmbeddingAdapter(EmbeddingFunction[Documents]):
@@ -27,30 +34,38 @@ class LangChainEmbeddingAdapter(EmbeddingFunction[Documents]):
     def __call__(self, input: Documents):
         return self.langchain_embeddings.embed_documents(input)
 
-# --- Step 1: Initialize Embeddings and Chroma Client ---
-print("Initializing embedding model...")
-langchain_embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-
-# Wrap with adapter
-print("Creating ChromaDB-compatible embedding function...")
-chroma_embedding_function = LangChainEmbeddingAdapter(langchain_embeddings)
-
-# 2. Create the native ChromaDB client
-print(f"Initializing ChromaDB client for directory: {PERSIST_DIRECTORY}")
-client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+def _load_chat_history_collection():
+    """Opens the chat history collection. Loaded through the model registry (see main.lifespan)."""
+    if CHAT_MEMORY_INDEX == "compact":
+        directory = os.path.join(PERSIST_DIRECTORY, "chat-history-compact")
+        print(f"Opening compact chat history index in: {directory}")
+        return CompactCollection(directory, get_embeddings().embed_documents)
+
+    # 1. Wrap the shared MiniLM embeddings with the adapter
+    print("Creating ChromaDB-compatible embedding function...")
+    chroma_embedding_function = LangChainEmbeddingAdapter(get_embeddings())
+
+    # 2. Create the native ChromaDB client (or reuse the shared server client, see CHROMA_MODE)
+    if CHROMA_MODE == "http":
+        client = get_chroma_client()
+    else:
+        print(f"Initializing ChromaDB client for directory: {PERSIST_DIRECTORY}")
+        client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+
+    # 3. Get or create collection with adapted embedding function
+    print(f"Getting or creating collection: '{CHAT_HISTORY_COLLECTION_NAME}'")
+    return client.get_or_create_collection(
+        name=CHAT_HISTORY_COLLECTION_NAME,
+        embedding_function=chroma_embedding_function
+    )
 
-# 3. Get or create collection with adapted embedding function
-print(f"Getting or creating collection: '{CHAT_HISTORY_COLLECTION_NAME}'")
-chat_history_collection = client.get_or_create_collection(
-    name=CHAT_HISTORY_COLLECTION_NAME,
-    embedding_function=chroma_embedding_function
-)
+model_registry.register("chat_memory", _load_chat_history_collection, warmup=lambda collection: collection.count())
 
 
 def add_to_memory(text: str):
     """Adds a text entry (user query or AI response) to the chat history collection."""
     entry_id = str(uuid.uuid4())
-    chat_history_collection.add(
+    model_registry.get("chat_memory").add(
         ids=[entry_id],
         documents=[text]
     )
@@ -59,6 +74,7 @@ def add_to_memory(text: str):
 
 def get_relevant_history(question: str, k: int = 3) -> str:
     """Retrieves the k most relevant conversation snippets from memory."""
+    chat_history_collection = model_registry.get("chat_memory")
     if chat_history_collection.count() == 0:
         return ""
 
@@ -77,26 +93,10 @@ def get_relevant_history(question: str, k: int = 3) -> str:
     return formatted_history
 
 
-def answer_question_with_memory(question: str, emotion: str = None) -> dict:
-    """
-    Answers a question by first retrieving relevant context from chat history,
-    then calling the LLM, and finally saving the new exchange to memory.
-    
-    Args:
-        question: The user's question
-        emotion: Optional emotion context from the user (default: None)
-    
-    Returns:
-        dict: Response with 'answer' and 'justification' keys
-    """
-    
-    # 1. Retrieve relevant chat history
-    history = get_relevant_history(question)
-
-    # 2. Create a new prompt with the retrieved history
+def _build_chat_prompt(question: str, history: str, emotion: str = None) -> str:
     emotion_context = f"\n\nUser Emotion: {emotion}" if emotion else ""
     
-    prompt = f"""You are an AI assistant doctor named BEMA who specializes in all kinds of health-related problems.
+    return f"""You are an AI assistant doctor named BEMA who specializes in all kinds of health-related problems.
     Answer the following question based on the provided conversation history and your best knowledge. Be specific and accurate.
     Your response should be in JSON format with 'answer' and 'justification' as the main keys.
 
@@ -112,36 +112,63 @@ def answer_question_with_memory(question: str, emotion: str = None) -> dict:
     }}
     """
 
+
+def _remember_exchange(question: str, llm_response_json_str: str):
+    """Adds the question and the LLM's answer to the chat history collection."""
+    try:
+        llm_response_data = json.loads(llm_response_json_str)
+        ai_answer = llm_response_data.get("answer", "No answer found.")
+        
+        add_to_memory(f"User asked: {question}")
+        add_to_memory(f"BEMA answered: {ai_answer}")
+
+    except json.JSONDecodeError:
+        print("Warning: LLM response was not valid JSON. Storing raw response.")
+        add_to_memory(f"User asked: {question}")
+        add_to_memory(f"BEMA's raw response: {llm_response_json_str}")
+
+
+def answer_question_with_memory(question: str, emotion: str = None, user_id: Optional[str] = None) -> dict:
+    """
+    Answers a question by first retrieving relevant context from chat history,
+    then calling the LLM, and finally saving the new exchange to memory.
+    
+    Args:
+        question: The user's question
+        emotion: Optional emotion context from the user (default: None)
+        user_id: Optional user, for fair queuing of the LLM call (see core.llm_scheduler)
+    
+    Returns:
+        dict: Response with 'answer' and 'justification' keys
+    """
+    
+    # 1. Retrieve relevant chat history
+    history = get_relevant_history(question)
+
+    # 2. Create a new prompt with the retrieved history
+    prompt = _build_chat_prompt(question, history, emotion)
+
     # 3. Call the LLM with the new prompt
     print("\n💬 Sending prompt to LLM...")
     try:
-        res = requests.post(
-            f"{NGROK_URL}/api/generate",
-            headers={"Content-Type": "application/json"},
-            json={
-                "model": "qwen3:8b",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0.2},
-                "format": AnswerWithJustification.model_json_schema()
-            },
-            timeout=60
-        )
+        with llm_scheduler.slot(INTERACTIVE, user_id=user_id):
+            res = ollama_pool.post(
+                "/api/generate",
+                {
+                    "model": model_for("chat"),
+                    "prompt": prompt,
+                    "stream": False,
+                    "options": {"temperature": 0.2},
+                    "format": AnswerWithJustification.model_json_schema()
+                },
+                timeout=60,
+                hedge=True  # latency-sensitive: may be hedged on an idle endpoint (OLLAMA_HEDGE_AFTER)
+            )
         res.raise_for_status()
         llm_response_json_str = res.json().get('response', '{}')
         
         # 4. Add the new exchange to memory
-        try:
-            llm_response_data = json.loads(llm_response_json_str)
-            ai_answer = llm_response_data.get("answer", "No answer found.")
-            
-            add_to_memory(f"User asked: {question}")
-            add_to_memory(f"BEMA answered: {ai_answer}")
-
-        except json.JSONDecodeError:
-            print("Warning: LLM response was not valid JSON. Storing raw response.")
-            add_to_memory(f"User asked: {question}")
-            add_to_memory(f"BEMA's raw response: {llm_response_json_str}")
+        _remember_exchange(question, llm_response_json_str)
 
         return json.loads(llm_response_json_str)
         
@@ -161,3 +188,42 @@ def answer_question_with_memory(question: str, emotion: str = None) -> dict:
             "answer": "I'm sorry, but I encountered an unexpected error.",
             "justification": "An unexpected error occurred while processing your question."
         }
+
+
+def stream_answer_with_memory(question: str, emotion: str = None, user_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Streaming variant of answer_question_with_memory: yields the raw JSON response
+    text fragment by fragment as Ollama generates it. The exchange is saved to
+    memory once the response is complete. Errors are raised to the caller.
+    The LLM slot is held until the stream ends.
+    """
+    history = get_relevant_history(question)
+    prompt = _build_chat_prompt(question, history, emotion)
+
+    print("\n💬 Streaming prompt to LLM...")
+    fragments = []
+    with llm_scheduler.slot(INTERACTIVE, user_id=user_id), ollama_pool.stream(
+        "/api/generate",
+        {
+            "model": model_for("chat"),
+            "prompt": prompt,
+            "stream": True,
+            "options": {"temperature": 0.2},
+            "format": AnswerWithJustification.model_json_schema()
+        },
+        timeout=60
+    ) as res:
+        res.raise_for_status()
+        for line in res.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            fragment = chunk.get("response", "")
+            if fragment:
+                fragments.append(fragment)
+                yield fragment
+            if chunk.get("done"):
+                break
+
+    _remember_exchange(question, "".join(fragments))
+
@@ -0,0 +1,185 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+from core.metrics import metrics, span
+from services.emotion_service import EmotionService
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference queue cannot accept another image."""
+
+
+class _InferenceRequest:
+    __slots__ = ("file_content", "file_extension", "future", "loop", "enqueued_at")
+
+    def __init__(self, file_content: bytes, file_extension: str, future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.file_content = file_content
+        self.file_extension = file_extension
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.perf_counter()
+
+
+class _CallRequest:
+    """Arbitrary work (e.g. one streaming frame) that must run on the inference thread."""
+    __slots__ = ("fn", "args", "future", "loop", "enqueued_at")
+
+    def __init__(self, fn: Callable, args: tuple, future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.perf_counter()
+
+
+def _resolve(future: asyncio.Future, result=None, error: Optional[BaseException] = None):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class EmotionInferenceWorker:
+    """
+    Runs EmotionService inference on a dedicated thread, off the event loop.
+
+    Requests that arrive within `max_wait_ms` of each other are micro-batched
+    (up to `max_batch_size`) into a single batched call per model. Other model
+    work can be scheduled with run(); ultralytics models are not thread-safe, so
+    everything that touches them goes through this one thread.
+
+    `load_service` returns the EmotionService; it is only called on the
+    inference thread, so the models can be loaded lazily on first use.
+    """
+
+    def __init__(self, load_service: Callable[[], EmotionService], max_batch_size: int = 8, max_wait_ms: float = 10, max_queue_size: int = 64):
+        self.load_service = load_service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[_InferenceRequest]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        # A _CallRequest (or the shutdown marker) pulled from the queue while a batch was being collected.
+        self._pending: "deque[Optional[_CallRequest]]" = deque()
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread:
+            return
+        print(f"--- Starting emotion inference worker (batch <= {self.max_batch_size}, window {self.max_wait * 1000:.0f}ms) ---")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._work, name="emotion-inference", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Lets the worker finish what is queued, waiting at most `timeout` seconds."""
+        if not self._thread:
+            return
+        self._stop.set()
+        try:
+            # Wakes the worker once the queue ahead of it is done; when the queue is full, it
+            # exits as soon as it finds the queue empty instead.
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def detect(self, file_content: bytes, file_extension: str) -> str:
+        """Queues one image and waits for its emotion label without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait(_InferenceRequest(file_content, file_extension, future, loop))
+        except queue.Full:
+            metrics.increment("emotion.rejected")
+            raise InferenceQueueFullError("Emotion inference queue is full. Please retry later.")
+        metrics.set_gauge("emotion.queue_depth", self._queue.qsize())
+        return await future
+
+    async def run(self, fn: Callable, *args):
+        """Runs `fn(*args)` on the inference thread and returns its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait(_CallRequest(fn, args, future, loop))
+        except queue.Full:
+            metrics.increment("emotion.rejected")
+            raise InferenceQueueFullError("Emotion inference queue is full. Please retry later.")
+        return await future
+
+    def _next_batch(self):
+        """Returns a list of _InferenceRequest to batch, a single _CallRequest, or None on shutdown."""
+        if self._pending:
+            first = self._pending.popleft()
+        else:
+            while True:
+                try:
+                    first = self._queue.get(timeout=0.5)
+                    break
+                except queue.Empty:
+                    if self._stop.is_set():
+                        return None
+        if first is None or isinstance(first, _CallRequest):
+            return first
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Keep the shutdown marker so the loop exits after this batch.
+                self._pending.append(None)
+                break
+            if isinstance(request, _CallRequest):
+                self._pending.append(request)
+                break
+            batch.append(request)
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if isinstance(batch, _CallRequest):
+                self._run_call(batch)
+                continue
+
+            started = time.perf_counter()
+            metrics.set_gauge("emotion.queue_depth", self._queue.qsize())
+            metrics.observe("emotion.batch_size", len(batch))
+            for request in batch:
+                metrics.observe("emotion.queue_wait.seconds", started - request.enqueued_at)
+
+            try:
+                with span("emotion.batch"):
+                    labels = self.load_service().detect_emotion_batch(
+                        [(request.file_content, request.file_extension) for request in batch]
+                    )
+                for request, label in zip(batch, labels):
+                    request.loop.call_soon_threadsafe(_resolve, request.future, label)
+            except Exception as e:
+                print(f"❌ Emotion inference batch of {len(batch)} failed: {e}")
+                for request in batch:
+                    request.loop.call_soon_threadsafe(_resolve, request.future, None, e)
+
+    def _run_call(self, call: _CallRequest):
+        metrics.observe("emotion.queue_wait.seconds", time.perf_counter() - call.enqueued_at)
+        try:
+            result = call.fn(*call.args)
+            call.loop.call_soon_threadsafe(_resolve, call.future, result)
+        except Exception as e:
+            call.loop.call_soon_threadsafe(_resolve, call.future, None, e)
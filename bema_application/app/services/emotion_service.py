@@ -1,57 +1,165 @@
 import io
-from ultralytics import YOLO
+from typing import List, Optional, Tuple
+import numpy as np
 from PIL import Image
-import os
+from core.metrics import metrics
+from services.artifact_writer import ArtifactWriter
+from services.yolo_backends import load_yolo_model
 import uuid
-        
+
+EMOTION_LABELS = ['Anger', 'Contempt', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
+
 class EmotionService:
-    def __init__(self, person_model_path, emotion_model_path, output_folder):
-        self.person_model = YOLO(person_model_path)
-        self.emotion_model = YOLO(emotion_model_path)
-        self.output_folder = output_folder
-        os.makedirs(output_folder, exist_ok=True)
+    def __init__(
+        self,
+        person_model_path,
+        emotion_model_path,
+        artifact_writer: Optional[ArtifactWriter] = None,
+        backend: str = "torch",
+        int8: bool = False,
+        fast_path: bool = False,
+        input_size: int = 640,
+        tight_crop_ratio: float = 0.3
+    ):
+        # "onnx"/"openvino" transparently use cached exports of the .pt models (see yolo_backends).
+        self.person_model = load_yolo_model(person_model_path, backend=backend, int8=int8)
+        self.emotion_model = load_yolo_model(emotion_model_path, backend=backend, int8=int8)
+        # Cropped/annotated images are only kept when a writer is given and it samples the request.
+        self.artifact_writer = artifact_writer
         self.allowed_extensions = {"jpg", "jpeg", "png"}
+        # Fast path: decode straight to the model input size and try the emotion model on the
+        # whole frame first, skipping the person pass for images that are already tight crops.
+        self.fast_path = fast_path
+        self.input_size = input_size
+        self.tight_crop_ratio = tight_crop_ratio
+
+    def warmup(self):
+        """Runs both models once on a blank frame so the first request doesn't pay for lazy initialisation."""
+        frame = np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8)
+        self.person_model(frame, verbose=False)
+        self.emotion_model(frame, verbose=False)
 
     def detect_emotion(self, file_content: bytes, file_extension: str):
-        if file_extension.lower() not in self.allowed_extensions:
-            return "Invalid file type. Allowed types are jpg, jpeg, and png."
-
-        try:
-            image = Image.open(io.BytesIO(file_content))
-        except Exception:
-            return "Invalid image file."
-
-        # Generate a unique image name
-        image_name = f"image_{uuid.uuid4()}.{file_extension}"
-        
-        # Detect person using YOLOv8n
-        person_results = self.person_model(image)
-        
-        if person_results and len(person_results) > 0 and len(person_results[0].boxes) > 0:
+        return self.detect_emotion_batch([(file_content, file_extension)])[0]
+
+    def decode(self, file_content: bytes) -> np.ndarray:
+        """Decodes an upload into the BGR array both models consume (the ultralytics convention)."""
+        image = Image.open(io.BytesIO(file_content))
+        if self.fast_path:
+            # For JPEGs this makes the decoder itself scale down by 1/2, 1/4 or 1/8.
+            image.draft("RGB", (self.input_size, self.input_size))
+        image = image.convert("RGB")
+        if self.fast_path:
+            image.thumbnail((self.input_size, self.input_size))
+        return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+    def _save_crop(self, image_name: str, crop: np.ndarray):
+        def write(path):
+            Image.fromarray(crop[:, :, ::-1]).save(path)
+        self.artifact_writer.submit(f"{image_name}_person.png", write)
+
+    def detect_emotion_batch(self, images: List[Tuple[bytes, str]]) -> List[str]:
+        """
+        Detects the emotion for several uploaded images at once.
+
+        Each model runs a single batched forward pass over all valid images
+        instead of one pass per image. Results are returned in input order.
+        """
+        results: List[str] = [""] * len(images)
+        decoded = []  # (index, frame, image_name or None when artifacts are not kept)
+
+        for index, (file_content, file_extension) in enumerate(images):
+            if file_extension.lower() not in self.allowed_extensions:
+                results[index] = "Invalid file type. Allowed types are jpg, jpeg, and png."
+                continue
+            try:
+                frame = self.decode(file_content)
+            except Exception:
+                results[index] = "Invalid image file."
+                continue
+            image_name = None
+            if self.artifact_writer and self.artifact_writer.should_persist():
+                # Generate a unique image name
+                image_name = f"image_{uuid.uuid4()}.{file_extension}"
+            decoded.append((index, frame, image_name))
+
+        if self.fast_path and decoded:
+            decoded = self._early_exit(decoded, results)
+
+        if not decoded:
+            return results
+
+        # Detect persons using YOLO, one batched call for all images
+        person_results = self.person_model([frame for _, frame, _ in decoded])
+
+        crops = []  # (index, cropped_frame, image_name)
+        for (index, frame, image_name), person_result in zip(decoded, person_results):
+            if len(person_result.boxes) == 0:
+                results[index] = "No person detected"
+                continue
             # Get the bounding box of the first detected person
-            box = person_results[0].boxes[0].xyxy[0].cpu().numpy()
-            
-            # Crop the image to the person's bounding box
-            cropped_image = image.crop((box[0], box[1], box[2], box[3]))
-            
-            # Save the cropped person image
-            person_image_path = os.path.join(self.output_folder, f"{image_name}_person.png")
-            cropped_image.save(person_image_path)
-            
-            # Predict emotion on the cropped image
-            emotion_results = self.emotion_model(cropped_image)
-            
-            if emotion_results and len(emotion_results) > 0 and len(emotion_results[0].boxes) > 0:
-                emotion = emotion_results[0].boxes.cls[0].item()
-                emotion_labels = ['Anger', 'Contempt', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
-                emotion_label = emotion_labels[int(emotion)]
-                
-                # Save the annotated emotion image
-                emotion_image_path = os.path.join(self.output_folder, f"{image_name}_emotion.png")
-                emotion_results[0].save(emotion_image_path)
-                
-                return emotion_label
-            else:
-                return "No emotion detected"
-        else:
-            return "No person detected"
\ No newline at end of file
+            x1, y1, x2, y2 = person_result.boxes[0].xyxy[0].cpu().numpy().astype(int)
+
+            # Crop the person's bounding box as a view of the decoded frame (no copy)
+            cropped_frame = frame[max(y1, 0):y2, max(x1, 0):x2]
+
+            # Save the cropped person image in the background
+            if image_name:
+                self._save_crop(image_name, cropped_frame)
+            crops.append((index, cropped_frame, image_name))
+
+        if not crops:
+            return results
+
+        # Predict emotions on the cropped images, again in one batched call
+        emotion_results = self.emotion_model([cropped for _, cropped, _ in crops])
+
+        for (index, _, image_name), emotion_result in zip(crops, emotion_results):
+            if len(emotion_result.boxes) == 0:
+                results[index] = "No emotion detected"
+                continue
+            self._set_label(results, index, emotion_result, image_name)
+
+        return results
+
+    def detect_person_box(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Returns the (x1, y1, x2, y2) box of the first detected person in a decoded frame, if any."""
+        person_result = self.person_model(frame)[0]
+        if len(person_result.boxes) == 0:
+            return None
+        return person_result.boxes[0].xyxy[0].cpu().numpy()
+
+    def classify_emotion(self, crop: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Returns (label, confidence) of the first emotion detection in a person crop, if any."""
+        emotion_result = self.emotion_model(crop)[0]
+        if len(emotion_result.boxes) == 0:
+            return None
+        return EMOTION_LABELS[int(emotion_result.boxes.cls[0].item())], float(emotion_result.boxes.conf[0].item())
+
+    def _set_label(self, results: List[str], index: int, emotion_result, image_name: Optional[str]):
+        emotion = emotion_result.boxes.cls[0].item()
+        results[index] = EMOTION_LABELS[int(emotion)]
+
+        # Save the annotated emotion image in the background
+        if image_name:
+            self.artifact_writer.submit(f"{image_name}_emotion.png", emotion_result.save)
+
+    def _early_exit(self, decoded, results: List[str]):
+        """
+        Runs the emotion model on the whole frames and resolves every image whose top
+        detection covers at least `tight_crop_ratio` of the frame, i.e. the upload is
+        already a face/upper-body crop. Returns the images that still need the person pass.
+        """
+        emotion_results = self.emotion_model([frame for _, frame, _ in decoded])
+        remaining = []
+        for (index, frame, image_name), emotion_result in zip(decoded, emotion_results):
+            if len(emotion_result.boxes) > 0:
+                x1, y1, x2, y2 = emotion_result.boxes[0].xyxy[0].cpu().numpy()
+                box_ratio = ((x2 - x1) * (y2 - y1)) / (frame.shape[0] * frame.shape[1])
+                if box_ratio >= self.tight_crop_ratio:
+                    self._set_label(results, index, emotion_result, image_name)
+                    metrics.increment("emotion.fast_path", labels={"result": "early_exit"})
+                    continue
+            metrics.increment("emotion.fast_path", labels={"result": "person_pass"})
+            remaining.append((index, frame, image_name))
+        return remaining
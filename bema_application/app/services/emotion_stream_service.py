@@ -0,0 +1,75 @@
+import time
+from collections import Counter, deque
+from typing import Optional
+import numpy as np
+from services.emotion_service import EmotionService
+
+
+class EmotionStreamSession:
+    """
+    Per-connection state for streaming emotion detection over a video feed.
+
+    The person detector only runs every `person_every_n` frames (or when the
+    track is lost); in between, the last person box, padded by `box_margin`,
+    is reused to crop the frame. Labels are smoothed with a confidence-weighted
+    vote over the last `smoothing_window` frames so a single misclassified
+    frame doesn't flip the label pushed to the client.
+
+    process() runs the models and must be called on the inference thread.
+    """
+
+    def __init__(self, emotion_service: EmotionService, person_every_n: int = 5, smoothing_window: int = 8, box_margin: float = 0.1):
+        self.emotion_service = emotion_service
+        self.person_every_n = max(1, person_every_n)
+        self.box_margin = box_margin
+        self.history: "deque[tuple[str, float]]" = deque(maxlen=smoothing_window)
+        self.person_box: Optional[np.ndarray] = None
+        self.frames_since_detection = 0
+        self.frame_count = 0
+
+    def _padded_box(self, frame: np.ndarray):
+        x1, y1, x2, y2 = self.person_box
+        pad_x, pad_y = (x2 - x1) * self.box_margin, (y2 - y1) * self.box_margin
+        height, width = frame.shape[:2]
+        return (
+            int(max(0, x1 - pad_x)), int(max(0, y1 - pad_y)),
+            int(min(width, x2 + pad_x)), int(min(height, y2 + pad_y))
+        )
+
+    def _smoothed_label(self) -> Optional[str]:
+        if not self.history:
+            return None
+        votes = Counter()
+        for label, confidence in self.history:
+            votes[label] += confidence
+        return votes.most_common(1)[0][0]
+
+    def process(self, frame_bytes: bytes) -> dict:
+        started = time.perf_counter()
+        self.frame_count += 1
+        frame = self.emotion_service.decode(frame_bytes)
+
+        person_detected_now = False
+        if self.person_box is None or self.frames_since_detection >= self.person_every_n:
+            self.person_box = self.emotion_service.detect_person_box(frame)
+            self.frames_since_detection = 0
+            person_detected_now = True
+        self.frames_since_detection += 1
+
+        result = {"frame": self.frame_count, "person_detector_ran": person_detected_now}
+        if self.person_box is None:
+            result.update(raw_label=None, confidence=None, label=self._smoothed_label(), status="No person detected")
+        else:
+            x1, y1, x2, y2 = self._padded_box(frame)
+            emotion = self.emotion_service.classify_emotion(frame[y1:y2, x1:x2])
+            if emotion is None:
+                # The tracked box may have drifted off the face; re-detect on the next frame.
+                self.person_box = None
+                result.update(raw_label=None, confidence=None, label=self._smoothed_label(), status="No emotion detected")
+            else:
+                raw_label, confidence = emotion
+                self.history.append((raw_label, confidence))
+                result.update(raw_label=raw_label, confidence=round(confidence, 3), label=self._smoothed_label(), status="ok")
+
+        result["inference_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
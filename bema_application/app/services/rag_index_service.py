@@ -0,0 +1,312 @@
+"""
+Versioned RAG index with rebuilds in the background and an atomic retriever swap.
+
+Every build goes into its own directory, PERSIST_DIRECTORY/versions/<version>,
+and the CURRENT file next to it names the active one:
+
+    PERSIST_DIRECTORY/
+        CURRENT               "20251019T101500Z"
+        versions/20251019T101500Z/
+        versions/20251012T083000Z/
+
+A rebuild never touches the active version. Once the new one is built and
+answers a test query, CURRENT is replaced atomically and the retriever
+reference is swapped; requests that already hold the old retriever finish on
+it. Other workers notice the new CURRENT on their next retrieval (checked at
+most every RAG_INDEX_POLL_SECONDS). The newest RAG_INDEX_KEEP_VERSIONS versions
+are kept, so the previous one is still on disk while stragglers finish, and
+older ones are deleted.
+
+A store from before versioning (chroma.sqlite3 directly in PERSIST_DIRECTORY)
+is served as version "legacy" until the first rebuild.
+
+With CHROMA_MODE=http a version is the collection rag-chroma-<version> on the
+Chroma server instead of a directory (legacy: the plain rag-chroma collection).
+CURRENT and the build lock stay in PERSIST_DIRECTORY, shared by the workers.
+"""
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from langchain_core.vectorstores import VectorStoreRetriever
+from core.metrics import metrics
+from core.model_registry import model_registry
+from models.rag_index import RagIndexBuild, RagIndexStatus
+from utils.retriever import (
+    CHROMA_MODE, PERSIST_DIRECTORY, RAG_COLLECTION_NAME, create_vector_store, default_sources, get_chroma_client,
+    load_retriever
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: rebuilds are only serialized within one process
+    fcntl = None
+
+load_dotenv()
+
+RAG_INDEX_KEEP_VERSIONS = max(2, int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "2")))
+RAG_INDEX_POLL_SECONDS = float(os.getenv("RAG_INDEX_POLL_SECONDS", "5"))
+
+LEGACY_VERSION = "legacy"
+
+
+class RebuildInProgressError(Exception):
+    """Raised when a rebuild is requested while another one (in any worker) is still running."""
+
+
+class RagIndexManager:
+    """Owns the active RAG retriever and the on-disk index versions."""
+
+    def __init__(self, root: str = PERSIST_DIRECTORY):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer_path = os.path.join(root, "CURRENT")
+        self._lock = threading.Lock()
+        self._active: Optional[Tuple[str, VectorStoreRetriever]] = None
+        self._checked_at = 0.0
+        self._build: Optional[RagIndexBuild] = None
+        self._build_thread: Optional[threading.Thread] = None
+
+    # --- Versions on disk ---
+
+    def _read_pointer(self) -> Optional[str]:
+        try:
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            version = None
+        if version and version in self.versions():
+            return version
+        if self._legacy_exists():
+            return LEGACY_VERSION
+        return None
+
+    def _write_pointer(self, version: str):
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.pointer_path)
+
+    def _version_path(self, version: str) -> str:
+        return self.root if version == LEGACY_VERSION else os.path.join(self.versions_dir, version)
+
+    @staticmethod
+    def _collection_name(version: str) -> str:
+        if CHROMA_MODE != "http" or version == LEGACY_VERSION:
+            return RAG_COLLECTION_NAME
+        return f"{RAG_COLLECTION_NAME}-{version}"
+
+    @staticmethod
+    def _server_collections() -> List[str]:
+        # chromadb < 0.6 returns Collection objects, 0.6 returns names, 1.x objects again.
+        return [getattr(c, "name", c) for c in get_chroma_client().list_collections()]
+
+    def _legacy_exists(self) -> bool:
+        if CHROMA_MODE == "http":
+            return RAG_COLLECTION_NAME in self._server_collections()
+        return os.path.exists(os.path.join(self.root, "chroma.sqlite3"))
+
+    def versions(self) -> List[str]:
+        """Built versions, oldest first (names are UTC timestamps, so they sort by age)."""
+        if CHROMA_MODE == "http":
+            prefix = f"{RAG_COLLECTION_NAME}-"
+            return sorted(name[len(prefix):] for name in self._server_collections() if name.startswith(prefix))
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if not name.startswith(".") and os.path.isdir(os.path.join(self.versions_dir, name))
+        )
+
+    def _delete_version(self, version: str):
+        if CHROMA_MODE == "http":
+            try:
+                get_chroma_client().delete_collection(self._collection_name(version))
+            except Exception as e:
+                print(f"⚠️ Could not delete collection {self._collection_name(version)}: {e}")
+        else:
+            shutil.rmtree(self._version_path(version), ignore_errors=True)
+
+    def exists(self) -> bool:
+        return self._read_pointer() is not None
+
+    # --- Active retriever ---
+
+    def retriever(self) -> VectorStoreRetriever:
+        """The retriever of the active version. Loads it, or a newer one named by CURRENT, when needed."""
+        active = self._active
+        now = time.monotonic()
+        if active and now - self._checked_at < RAG_INDEX_POLL_SECONDS:
+            return active[1]
+        with self._lock:
+            self._checked_at = now
+            version = self._read_pointer()
+            if version is None:
+                raise RuntimeError(f"Vector store not found in '{self.root}'.")
+            if self._active is None or self._active[0] != version:
+                self._activate(version, self._load(version))
+            return self._active[1]
+
+    def _load(self, version: str) -> VectorStoreRetriever:
+        return load_retriever(persist_directory=self._version_path(version), collection_name=self._collection_name(version))
+
+    def active_version(self) -> Optional[str]:
+        return self._active[0] if self._active else None
+
+    def _activate(self, version: str, retriever: VectorStoreRetriever):
+        previous = self._active[0] if self._active else None
+        # A single reference assignment: callers that already got the old retriever keep using it.
+        self._active = (version, retriever)
+        if previous:
+            metrics.increment("rag_index.swaps")
+            print(f"🔁 RAG index swapped: {previous} -> {version}")
+
+    # --- Rebuilds ---
+
+    def build_status(self) -> Optional[RagIndexBuild]:
+        return self._build.model_copy() if self._build else None
+
+    def status(self) -> RagIndexStatus:
+        return RagIndexStatus(
+            active_version=self.active_version() or self._read_pointer(),
+            versions=self.versions(),
+            build=self.build_status(),
+        )
+
+    def start_rebuild(self) -> RagIndexBuild:
+        """Starts a rebuild on a background thread. Raises RebuildInProgressError if one is running."""
+        with self._lock:
+            if self._build_thread and self._build_thread.is_alive():
+                raise RebuildInProgressError(f"Rebuild of version {self._build.version} is still running.")
+            self._build = RagIndexBuild(
+                version=self._new_version_name(),
+                state="running",
+                stage="queued",
+                started_at=datetime.now(timezone.utc),
+            )
+            self._build_thread = threading.Thread(target=self._run_rebuild, name="rag-index-rebuild", daemon=True)
+            self._build_thread.start()
+            return self._build.model_copy()
+
+    def _new_version_name(self) -> str:
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        existing = set(self.versions())
+        suffix = 1
+        while (f"{version}-{suffix}" if suffix > 1 else version) in existing:
+            suffix += 1
+        return f"{version}-{suffix}" if suffix > 1 else version
+
+    def rebuild(self) -> RagIndexBuild:
+        """Builds a new version and activates it, blocking until done (startup and scripts)."""
+        self.start_rebuild()
+        self._build_thread.join()
+        return self.build_status()
+
+    def _progress(self, stage: str, done: int, total: int):
+        self._build = self._build.model_copy(update={"stage": stage, "done": done, "total": total})
+
+    def _run_rebuild(self):
+        build = self._build
+        started = time.perf_counter()
+        lock_file = None
+        try:
+            os.makedirs(self.versions_dir, exist_ok=True)
+            lock_file = self._acquire_build_lock()
+            print(f"--- Building RAG index version {build.version} ---")
+            urls, pdf_paths = default_sources()
+            stats = create_vector_store(
+                urls=urls, pdf_paths=pdf_paths, persist_directory=self._version_path(build.version),
+                collection_name=self._collection_name(build.version), on_progress=self._progress
+            )
+            if not stats:
+                raise RuntimeError("No documents were loaded.")
+            self._build = self._build.model_copy(update={"stats": stats})
+            metrics.set_gauge("rag_index.chunks", stats["embedded_chunks"])
+            metrics.set_gauge("rag_index.duplicates_removed", stats["duplicates_removed"])
+            if stats["index_bytes"] is not None:
+                metrics.set_gauge("rag_index.bytes", stats["index_bytes"])
+
+            self._progress("validating", 0, 1)
+            retriever = self._load(build.version)
+            if not retriever.invoke("healthy daily routine"):
+                raise RuntimeError("The new index returned no documents for a test query.")
+
+            with self._lock:
+                self._write_pointer(build.version)
+                self._activate(build.version, retriever)
+                self._checked_at = time.monotonic()
+            self._progress("collecting", 0, 1)
+            removed = self.collect_garbage()
+            seconds = time.perf_counter() - started
+            metrics.set_gauge("rag_index.build.seconds", seconds)
+            self._build = self._build.model_copy(update={
+                "state": "succeeded", "stage": "done", "done": 1, "total": 1, "removed_versions": removed,
+                "finished_at": datetime.now(timezone.utc),
+            })
+            print(f"✅ RAG index version {build.version} is active ({seconds:.1f}s)")
+        except Exception as e:
+            metrics.increment("rag_index.build_failures")
+            self._build = self._build.model_copy(update={
+                "state": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc),
+            })
+            print(f"❌ RAG index rebuild {build.version} failed: {e}")
+            if not isinstance(e, RebuildInProgressError):
+                self._delete_version(build.version)
+        finally:
+            if lock_file:
+                lock_file.close()
+
+    def _acquire_build_lock(self):
+        """Cross-process lock so two workers never build at the same time. Released if the process dies."""
+        lock_file = open(os.path.join(self.versions_dir, ".build.lock"), "w")
+        if fcntl:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise RebuildInProgressError("Another worker is rebuilding the RAG index.")
+        return lock_file
+
+    def collect_garbage(self) -> List[str]:
+        """Deletes all but the newest RAG_INDEX_KEEP_VERSIONS versions. Never the active one."""
+        active = self._read_pointer()
+        versions = self.versions()
+        removed = []
+        for version in versions[:-RAG_INDEX_KEEP_VERSIONS]:
+            if version in (active, self.active_version()):
+                continue
+            self._delete_version(version)
+            removed.append(version)
+        if removed:
+            print(f"🧹 Removed old RAG index version(s): {', '.join(removed)}")
+        return removed
+
+
+rag_index = RagIndexManager()
+
+
+def get_retriever() -> VectorStoreRetriever:
+    """The retriever of the active RAG index version. Cheap to call per request."""
+    return rag_index.retriever()
+
+
+def check_and_create_vector_store():
+    """Checks if the vector store exists, builds the first version if not."""
+    print("\n---  Checking for Vector Store (ChromaDB) ---")
+    if rag_index.exists():
+        print(" ✅ Vector store already exists. Skipping creation.")
+        return
+    print(f"Vector store not found in '{PERSIST_DIRECTORY}'. Creating a new one.")
+    build = rag_index.rebuild()
+    if build.state != "succeeded":
+        print(f"❌ Could not create the vector store: {build.error}")
+
+
+# Loaded and warmed at startup (see main.lifespan). The warmup query also pulls the
+# Chroma index into memory so the first real retrieval isn't the slow one.
+model_registry.register("rag_retriever", get_retriever, warmup=lambda retriever: retriever.invoke("warmup"))
@@ -0,0 +1,184 @@
+import hashlib
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+from models.recommendation_job import JobStatus, RecommendationJob, StageTiming
+from models.suggestion import Suggestion
+from models.user_health import UserHealthProfile
+
+# A runner takes a profile plus an `on_stage(stage_name, seconds)` callback and
+# returns the final Suggestion (or raises).
+JobRunner = Callable[[UserHealthProfile, Callable[[str, float], None]], Suggestion]
+
+
+class JobQueueFullError(Exception):
+    """Raised when the bounded job queue cannot accept another job."""
+
+
+class RecommendationJobQueue:
+    """
+    Runs recommendation workflows on a fixed pool of worker threads fed by a bounded queue.
+
+    Identical profiles submitted while a job for them is still queued or running are
+    deduplicated onto the existing job. Finished jobs are kept (up to `max_retained`)
+    so that clients can poll for their result.
+    """
+
+    def __init__(self, runner: JobRunner, max_workers: int = 2, max_queue_size: int = 32, max_retained: int = 1000):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_retained = max_retained
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, RecommendationJob]" = OrderedDict()
+        self._profiles: Dict[str, UserHealthProfile] = {}
+        self._in_flight: Dict[str, str] = {}  # profile key -> job id
+        self._job_keys: Dict[str, str] = {}  # job id -> profile key
+        self._versions: Dict[str, int] = {}
+        self._workers = []
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _profile_key(profile: UserHealthProfile) -> str:
+        return hashlib.sha256(profile.model_dump_json().encode("utf-8")).hexdigest()
+
+    def start(self):
+        if self._workers:
+            return
+        print(f"--- Starting {self.max_workers} recommendation job worker(s) ---")
+        self._stop.clear()
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._work, name=f"recommendation-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stops the workers after their current job; jobs still queued are not started."""
+        self._stop.set()
+        # Wake idle workers right away; busy ones check the stop flag before their next job.
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def submit(self, profile: UserHealthProfile) -> Tuple[RecommendationJob, bool]:
+        """
+        Queues a job for the profile.
+
+        Returns the job and whether it was deduplicated onto an in-flight job.
+        Raises JobQueueFullError if the queue is at capacity.
+        """
+        key = self._profile_key(profile)
+        with self._lock:
+            existing_id = self._in_flight.get(key)
+            if existing_id:
+                return self._jobs[existing_id].model_copy(deep=True), True
+
+            job = RecommendationJob(
+                job_id=str(uuid.uuid4()),
+                user_id=profile.userId,
+                status=JobStatus.QUEUED,
+                created_at=datetime.now(timezone.utc),
+            )
+            try:
+                self._queue.put_nowait(job.job_id)
+            except queue.Full:
+                raise JobQueueFullError("Recommendation job queue is full. Please retry later.")
+
+            self._jobs[job.job_id] = job
+            self._profiles[job.job_id] = profile
+            self._in_flight[key] = job.job_id
+            self._job_keys[job.job_id] = key
+            self._versions[job.job_id] = 0
+            self._prune()
+            return job.model_copy(deep=True), False
+
+    def get(self, job_id: str) -> Optional[RecommendationJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+
+    def version(self, job_id: str) -> int:
+        """Returns a counter that increases every time the job changes."""
+        with self._lock:
+            return self._versions.get(job_id, -1)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            for field, value in changes.items():
+                setattr(job, field, value)
+            self._versions[job_id] += 1
+
+    def _record_stage(self, job_id: str, stage: str, seconds: float):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            job.stage_timings.append(StageTiming(stage=stage, seconds=round(seconds, 3)))
+            self._versions[job_id] += 1
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if job_id is None or self._stop.is_set():
+                self._queue.task_done()
+                return
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str):
+        with self._lock:
+            profile = self._profiles.get(job_id)
+        if profile is None:
+            return
+
+        print(f"--- Job {job_id}: running recommendation workflow for user {profile.userId} ---")
+        self._update(job_id, status=JobStatus.RUNNING, started_at=datetime.now(timezone.utc))
+        started = time.perf_counter()
+        try:
+            result = self.runner(profile, lambda stage, seconds: self._record_stage(job_id, stage, seconds))
+            self._finish(job_id, status=JobStatus.SUCCEEDED, result=result)
+            print(f"✅ Job {job_id} finished in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            self._finish(job_id, status=JobStatus.FAILED, error=str(e))
+            print(f"❌ Job {job_id} failed after {time.perf_counter() - started:.2f}s: {e}")
+
+    def _finish(self, job_id: str, **changes):
+        self._update(job_id, finished_at=datetime.now(timezone.utc), **changes)
+        with self._lock:
+            self._profiles.pop(job_id, None)
+            key = self._job_keys.pop(job_id, None)
+            if key and self._in_flight.get(key) == job_id:
+                del self._in_flight[key]
+
+    def _prune(self):
+        """Drops the oldest finished jobs once more than `max_retained` are stored. Caller holds the lock."""
+        excess = len(self._jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+                del self._jobs[job_id]
+                self._versions.pop(job_id, None)
+                excess -= 1
@@ -0,0 +1,175 @@
+import io
+import os
+import struct
+import wave
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STT_BACKENDS = ("groq", "faster_whisper")
+TTS_BACKENDS = ("gtts", "piper")
+
+# Local faster-whisper (CTranslate2) settings; int8 keeps a small model fast on CPU.
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base.en")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))
+# Local Piper voice (.onnx with its .onnx.json config next to it).
+PIPER_VOICE_PATH = os.getenv("PIPER_VOICE_PATH", "resources/piper/en_US-lessac-medium.onnx")
+
+
+class SpeechToText(ABC):
+    """Turns an uploaded audio clip into text. Implementations may block; callers run them off the event loop."""
+    name = ""
+
+    @abstractmethod
+    def transcribe(self, audio_data: bytes) -> str:
+        ...
+
+    def warmup(self):
+        pass
+
+
+class TextToSpeech(ABC):
+    """
+    Turns text into audio bytes of `media_type`.
+
+    synthesize_chunk() is used by the pipelined /voice/ mode: the chunks of one
+    answer are concatenated into a single stream, so formats that can't simply be
+    concatenated (WAV) only put a header on the first chunk.
+    """
+    name = ""
+    media_type = "audio/mpeg"
+
+    @abstractmethod
+    def synthesize(self, text: str) -> bytes:
+        ...
+
+    def synthesize_chunk(self, text: str, first: bool) -> bytes:
+        return self.synthesize(text)
+
+    def warmup(self):
+        pass
+
+
+class GroqSpeechToText(SpeechToText):
+    """Cloud Whisper (whisper-large-v3-turbo) through the Groq API."""
+    name = "groq"
+
+    def __init__(self):
+        from groq import Groq
+        self.client = Groq()
+
+    def transcribe(self, audio_data: bytes) -> str:
+        transcription = self.client.audio.transcriptions.create(
+            file=("audio.mp3", io.BytesIO(audio_data)),
+            model="whisper-large-v3-turbo",
+            prompt="Specify context or spelling",
+            response_format="json",
+            language="en",
+            temperature=0.0
+        )
+        return transcription.text
+
+
+class FasterWhisperSpeechToText(SpeechToText):
+    """Local Whisper on CPU via faster-whisper (CTranslate2), quantized to WHISPER_COMPUTE_TYPE."""
+    name = "faster_whisper"
+
+    def __init__(self, model: str = WHISPER_MODEL, compute_type: str = WHISPER_COMPUTE_TYPE, cpu_threads: int = WHISPER_CPU_THREADS):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def transcribe(self, audio_data: bytes) -> str:
+        # Greedy decoding and VAD: short voice questions don't benefit from beam search.
+        segments, _ = self.model.transcribe(io.BytesIO(audio_data), language="en", beam_size=1, vad_filter=True)
+        return "".join(segment.text for segment in segments).strip()
+
+    def warmup(self):
+        import numpy as np
+        segments, _ = self.model.transcribe(np.zeros(16000, dtype=np.float32), language="en", beam_size=1)
+        list(segments)
+
+
+class GTTSTextToSpeech(TextToSpeech):
+    """Google Translate TTS (network)."""
+    name = "gtts"
+    media_type = "audio/mpeg"
+
+    def synthesize(self, text: str) -> bytes:
+        from gtts import gTTS
+        tts = gTTS(text=text, lang='en')
+        output_file = io.BytesIO()
+        tts.write_to_fp(output_file)
+        return output_file.getvalue()
+
+
+def wav_header(sample_rate: int, data_size: int = 0xFFFFFFFF, channels: int = 1, sample_width: int = 2) -> bytes:
+    """RIFF/WAV header for PCM audio. The default size marks a stream of unknown length."""
+    riff_size = 0xFFFFFFFF if data_size == 0xFFFFFFFF else 36 + data_size
+    byte_rate = sample_rate * channels * sample_width
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+class PiperTextToSpeech(TextToSpeech):
+    """Local neural TTS on CPU via Piper (ONNX). Produces 16-bit mono WAV."""
+    name = "piper"
+    media_type = "audio/wav"
+
+    def __init__(self, voice_path: str = PIPER_VOICE_PATH):
+        from piper import PiperVoice
+        self.voice = PiperVoice.load(voice_path)
+        self.sample_rate = self.voice.config.sample_rate
+
+    def _pcm(self, text: str) -> bytes:
+        if hasattr(self.voice, "synthesize_stream_raw"):  # piper-tts < 1.3
+            return b"".join(self.voice.synthesize_stream_raw(text))
+        return b"".join(chunk.audio_int16_bytes for chunk in self.voice.synthesize(text))
+
+    def synthesize(self, text: str) -> bytes:
+        pcm = self._pcm(text)
+        return wav_header(self.sample_rate, len(pcm)) + pcm
+
+    def synthesize_chunk(self, text: str, first: bool) -> bytes:
+        # One streaming WAV per answer: header (unknown length) first, raw PCM after.
+        pcm = self._pcm(text)
+        return wav_header(self.sample_rate) + pcm if first else pcm
+
+    def warmup(self):
+        self._pcm("Hello.")
+
+
+def create_stt_backend(name: str) -> SpeechToText:
+    if name == "groq":
+        return GroqSpeechToText()
+    if name == "faster_whisper":
+        return FasterWhisperSpeechToText()
+    raise ValueError(f"Unknown STT backend '{name}'. Expected one of {STT_BACKENDS}.")
+
+
+def create_tts_backend(name: str) -> TextToSpeech:
+    if name == "gtts":
+        return GTTSTextToSpeech()
+    if name == "piper":
+        return PiperTextToSpeech()
+    raise ValueError(f"Unknown TTS backend '{name}'. Expected one of {TTS_BACKENDS}.")
+
+
+def audio_duration_seconds(audio: bytes) -> float:
+    """
+    Duration of a WAV or MP3 clip. WAV is exact. For anything else, faster-whisper's
+    decoder is used when installed, otherwise the size is divided by gTTS's
+    32 kbit/s constant bitrate.
+    """
+    if audio[:4] == b"RIFF":
+        with wave.open(io.BytesIO(audio)) as wav:
+            return wav.getnframes() / wav.getframerate()
+    try:
+        from faster_whisper import decode_audio
+        return len(decode_audio(io.BytesIO(audio))) / 16000
+    except ImportError:
+        return len(audio) * 8 / 32000
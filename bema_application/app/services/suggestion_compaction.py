@@ -0,0 +1,104 @@
+"""
+One-off compaction of duplicate suggestion_items rows.
+
+Before content hashing, every recommendation inserted 11 new suggestion_items
+rows even when identical text was already stored. This job merges rows with
+the same contentHash into the oldest one, repoints user_suggestions to it,
+adds the unique key that enables insert-or-reuse, rebuilds the table, and
+reports the size before and after.
+
+    python -m services.suggestion_compaction --dry-run
+    python -m services.suggestion_compaction
+"""
+import argparse
+from core.db import (
+    DB_CONFIG, DB_NAME, SUGGESTION_CONTENT_HASH_SQL, add_suggestion_content_hash_key,
+    count_duplicate_suggestion_items, get_db_connection, index_exists, migrate_suggestion_content_hash
+)
+
+
+def _table_size(cursor, table: str) -> dict:
+    """Exact row count plus InnoDB data + index bytes (refreshed with ANALYZE TABLE first)."""
+    cursor.execute(f"ANALYZE TABLE {table}")
+    cursor.fetchall()
+    cursor.execute(
+        "SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+        (DB_NAME, table)
+    )
+    data_length, index_length = cursor.fetchone()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return {"rows": cursor.fetchone()[0], "bytes": int(data_length) + int(index_length)}
+
+
+def _merge_duplicates(cursor) -> int:
+    """Repoints links from duplicate items to the oldest identical item, then deletes the duplicates."""
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS suggestion_item_merge")
+    cursor.execute(
+        "CREATE TEMPORARY TABLE suggestion_item_merge (PRIMARY KEY (duplicateId)) AS "
+        "SELECT s.id AS duplicateId, k.keepId FROM suggestion_items s "
+        "JOIN (SELECT contentHash, MIN(id) AS keepId FROM suggestion_items "
+        "      GROUP BY contentHash HAVING COUNT(*) > 1) k "
+        "ON s.contentHash = k.contentHash AND s.id <> k.keepId"
+    )
+    cursor.execute(
+        "UPDATE user_suggestions us JOIN suggestion_item_merge m ON us.suggestionItemId = m.duplicateId "
+        "SET us.suggestionItemId = m.keepId"
+    )
+    print(f"  Repointed {cursor.rowcount} user_suggestions link(s)")
+    # Links were moved first, so the ON DELETE CASCADE on user_suggestions removes nothing here.
+    cursor.execute("DELETE s FROM suggestion_items s JOIN suggestion_item_merge m ON s.id = m.duplicateId")
+    merged = cursor.rowcount
+    cursor.execute("DROP TEMPORARY TABLE suggestion_item_merge")
+    return merged
+
+
+def run_compaction(dry_run: bool = False, optimize: bool = True) -> dict:
+    db_conn = get_db_connection(DB_CONFIG)
+    if not db_conn:
+        raise SystemExit("Could not connect to the database.")
+    cursor = db_conn.cursor()
+    try:
+        before = _table_size(cursor, "suggestion_items")
+        if dry_run:
+            # Hash on the fly so a dry run works (and changes nothing) even before the migration.
+            cursor.execute(f"SELECT COUNT(*) - COUNT(DISTINCT {SUGGESTION_CONTENT_HASH_SQL}) FROM suggestion_items")
+            duplicates = int(cursor.fetchone()[0] or 0)
+            print(f"suggestion_items: {before['rows']} rows, {before['bytes'] / 1024:.1f} KiB, {duplicates} duplicate(s)")
+            return {"before": before, "duplicates": duplicates}
+
+        migrate_suggestion_content_hash(cursor)
+        db_conn.commit()
+        duplicates = count_duplicate_suggestion_items(cursor)
+        print(f"suggestion_items: {before['rows']} rows, {before['bytes'] / 1024:.1f} KiB, {duplicates} duplicate(s)")
+
+        merged = _merge_duplicates(cursor) if duplicates else 0
+        db_conn.commit()
+        print(f"  Merged {merged} duplicate row(s)")
+        if not index_exists(cursor, "suggestion_items", "uq_suggestion_items_contentHash"):
+            # This ALTER rebuilds the table, which also reclaims the space of the deleted rows.
+            add_suggestion_content_hash_key(cursor)
+            print("  Added unique key on contentHash")
+        elif optimize and merged:
+            # Deleted rows leave free pages behind; rebuilding returns them so the size drop is real.
+            cursor.execute("OPTIMIZE TABLE suggestion_items")
+            cursor.fetchall()
+
+        after = _table_size(cursor, "suggestion_items")
+        saved = before["bytes"] - after["bytes"]
+        percent = 100 * saved / before["bytes"] if before["bytes"] else 0.0
+        print(
+            f"\nsuggestion_items: {before['rows']} -> {after['rows']} rows, "
+            f"{before['bytes'] / 1024:.1f} -> {after['bytes'] / 1024:.1f} KiB ({percent:.1f}% smaller)"
+        )
+        return {"before": before, "after": after, "merged": merged}
+    finally:
+        cursor.close()
+        db_conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only report the table size and duplicate count")
+    parser.add_argument("--no-optimize", action="store_true", help="Skip the OPTIMIZE TABLE rebuild")
+    args = parser.parse_args()
+    run_compaction(dry_run=args.dry_run, optimize=not args.no_optimize)
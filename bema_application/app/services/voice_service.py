@@ -1,53 +1,194 @@
+import asyncio
 import io
 import json
-from groq import Groq
-from gtts import gTTS
-from services.chat_service import answer_question_with_memory
+import os
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from core.llm_scheduler import INTERACTIVE, llm_scheduler
+from core.metrics import metrics, span
+from core.model_registry import model_registry
+from services.chat_service import answer_question_with_memory, stream_answer_with_memory
+from services.speech_backends import create_stt_backend, create_tts_backend
+from utils.text_stream import JsonStringFieldExtractor, SentenceSplitter
 
-client = Groq()
+load_dotenv()
 
-async def transcribe_audio_data(audio_data):
+# Speech backends: "groq" (cloud) or "faster_whisper" (local CPU) for STT,
+# "gtts" (cloud) or "piper" (local CPU) for TTS. See services/speech_backends.py.
+VOICE_STT_BACKEND = os.getenv("VOICE_STT_BACKEND", "groq")
+VOICE_TTS_BACKEND = os.getenv("VOICE_TTS_BACKEND", "gtts")
+
+# Created on first use (or at startup by main.lifespan) rather than at import time.
+model_registry.register("stt", lambda: create_stt_backend(VOICE_STT_BACKEND), warmup=lambda backend: backend.warmup())
+model_registry.register("tts", lambda: create_tts_backend(VOICE_TTS_BACKEND), warmup=lambda backend: backend.warmup())
+
+# Max concurrent calls per voice stage; extra requests wait for a slot.
+VOICE_STT_CONCURRENCY = int(os.getenv("VOICE_STT_CONCURRENCY", "4"))
+VOICE_LLM_CONCURRENCY = int(os.getenv("VOICE_LLM_CONCURRENCY", "4"))
+VOICE_TTS_CONCURRENCY = int(os.getenv("VOICE_TTS_CONCURRENCY", "4"))
+# Pipelined mode: shorter sentences are merged with the next one before synthesis.
+VOICE_MIN_SENTENCE_CHARS = int(os.getenv("VOICE_MIN_SENTENCE_CHARS", "20"))
+
+_stage_limits = {
+    "stt": asyncio.Semaphore(VOICE_STT_CONCURRENCY),
+    "llm": asyncio.Semaphore(VOICE_LLM_CONCURRENCY),
+    "tts": asyncio.Semaphore(VOICE_TTS_CONCURRENCY),
+}
+
+# Stage name -> {"dur": ms spent in the stage, "wait": ms spent waiting for a slot}
+StageTimings = Dict[str, Dict[str, float]]
+
+
+async def _run_stage(stage: str, fn: Callable, *args, timings: Optional[StageTimings] = None):
+    """
+    Runs a blocking stage function on the thread pool so the event loop keeps serving,
+    bounded by the stage's semaphore. The "llm" stage uses the scheduler's interactive threads. Wait and run times go to `timings` and the metrics.
+    """
+    queued = time.perf_counter()
+    async with _stage_limits[stage]:
+        started = time.perf_counter()
+        metrics.observe("voice.stage_wait.seconds", started - queued, labels={"stage": stage})
+        try:
+            with span("voice.stage", labels={"stage": stage}):
+                if stage == "llm":
+                    return await llm_scheduler.run_in_threadpool(INTERACTIVE, fn, *args)
+                return await run_in_threadpool(fn, *args)
+        finally:
+            if timings is not None:
+                timings[stage] = {
+                    "dur": (time.perf_counter() - started) * 1000,
+                    "wait": (started - queued) * 1000,
+                }
+
+
+def server_timing_header(timings: StageTimings) -> str:
+    """Formats stage timings as a Server-Timing header, e.g. `stt;dur=412.3;desc="wait 0.1ms"`."""
+    return ", ".join(
+        f'{stage};dur={timing["dur"]:.1f};desc="wait {timing["wait"]:.1f}ms"'
+        for stage, timing in timings.items()
+    )
+
+
+def _transcribe(audio_data: bytes) -> str:
+    print(f"Audio file created, size: {len(audio_data)} bytes")
+    return model_registry.get("stt").transcribe(audio_data)
+
+
+def _synthesize(text: str) -> bytes:
+    return model_registry.get("tts").synthesize(text)
+
+
+def _synthesize_chunk(text: str, first: bool) -> bytes:
+    return model_registry.get("tts").synthesize_chunk(text, first)
+
+
+def tts_media_type() -> str:
+    """Content type of the audio produced by the configured TTS backend."""
+    return model_registry.get("tts").media_type
+
+
+async def transcribe_audio_data(audio_data, timings: Optional[StageTimings] = None):
     print("Starting transcription...")
     try:
-        audio_file = io.BytesIO(audio_data)
-        print(f"Audio file created, size: {len(audio_data)} bytes")
-        
-        transcription = client.audio.transcriptions.create(
-            file=("audio.mp3", audio_file),
-            model="whisper-large-v3-turbo",
-            prompt="Specify context or spelling",
-            response_format="json",
-            language="en",
-            temperature=0.0
-        )
-        
-        print(f"Transcription completed: {transcription.text}")
-        return transcription.text
+        text = await _run_stage("stt", _transcribe, audio_data, timings=timings)
+        print(f"Transcription completed: {text}")
+        return text
     except Exception as e:
         print(f"Error in transcribe_audio_data: {str(e)}")
         return None
 
-async def text_to_speech(text):
+async def answer_question(question: str, timings: Optional[StageTimings] = None, user_id: Optional[str] = None) -> dict:
+    """Runs the (blocking) memory-augmented chat LLM call as the "llm" stage."""
+    return await _run_stage("llm", answer_question_with_memory, question, None, user_id, timings=timings)
+
+async def text_to_speech(text, timings: Optional[StageTimings] = None):
     print(f"Converting text to speech: '{text}'")
     try:
-        tts = gTTS(text=text, lang='en')
-        output_file = io.BytesIO()
-        tts.write_to_fp(output_file)
-        output_file.seek(0)
-        audio_data = output_file.getvalue()
+        audio_data = await _run_stage("tts", _synthesize, text, timings=timings)
         print(f"Text-to-speech conversion completed, audio size: {len(audio_data)} bytes")
         return audio_data
     except Exception as e:
         print(f"Error in text_to_speech: {str(e)}")
         return None
     
+async def stream_spoken_answer(
+    question: str, timings: Optional[StageTimings] = None, user_id: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Pipelined answer: the LLM response is streamed, the "answer" field is cut into
+    sentences as it arrives, every sentence is synthesized as soon as it is complete
+    (concurrently, within the TTS limit) and the MP3 chunks are yielded in order.
+    The first audio is ready after roughly one sentence of LLM + TTS time.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    tts_tasks: "asyncio.Queue[Optional[asyncio.Task]]" = asyncio.Queue()
+    stop = threading.Event()
+
+    scheduled = 0
+
+    def schedule(sentence: str):
+        nonlocal scheduled
+        print(f"🗣️ Sentence ready for TTS: '{sentence}'")
+        tts_tasks.put_nowait(asyncio.ensure_future(_run_stage("tts", _synthesize_chunk, sentence, scheduled == 0)))
+        scheduled += 1
+
+    def generate_sentences():
+        # Runs on the thread pool; hands sentences back to the event loop.
+        extractor = JsonStringFieldExtractor("answer")
+        splitter = SentenceSplitter(VOICE_MIN_SENTENCE_CHARS)
+        for fragment in stream_answer_with_memory(question, user_id=user_id):
+            if stop.is_set():
+                return
+            for sentence in splitter.feed(extractor.feed(fragment)):
+                loop.call_soon_threadsafe(schedule, sentence)
+        rest = splitter.flush()
+        if rest:
+            loop.call_soon_threadsafe(schedule, rest)
+
+    async def produce():
+        try:
+            await _run_stage("llm", generate_sentences, timings=timings)
+        finally:
+            tts_tasks.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    pending = []
+    try:
+        chunks = 0
+        while True:
+            task = await tts_tasks.get()
+            if task is None:
+                break
+            pending.append(task)
+            audio = await task
+            if chunks == 0:
+                metrics.observe("voice.first_audio.seconds", time.perf_counter() - started)
+            chunks += 1
+            yield audio
+        await producer  # re-raises LLM errors
+        metrics.observe("voice.sentences", chunks)
+    finally:
+        # Client went away or something failed: stop the LLM stream and pending synthesis.
+        stop.set()
+        producer.cancel()
+        while not tts_tasks.empty():
+            task = tts_tasks.get_nowait()
+            if task is not None:
+                pending.append(task)
+        for task in pending:
+            task.cancel()
+
 async def process_audio_message(audio_data):
     print("Processing audio message...")
     try:
         transcribed_text = await transcribe_audio_data(audio_data)
         if transcribed_text:
             print(f"Transcribed text: '{transcribed_text}'")
-            response = answer_question_with_memory(question=transcribed_text)
+            response = await answer_question(transcribed_text)
             
             # Extract only the "answer" part for TTS
             answer_text = ""
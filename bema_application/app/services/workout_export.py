@@ -0,0 +1,219 @@
+"""
+Bulk export of workout_sessions for analytics, as CSV, NDJSON or Parquet.
+
+Rows are streamed from one unbuffered MySQL cursor and encoded batch by batch,
+so memory stays flat however large the table is. Every export ends at a
+(created_at, id) watermark fixed before it starts; pass it back to get only
+the sessions recorded since.
+
+    python -m services.workout_export --format parquet --output sessions.parquet
+    python -m services.workout_export --format ndjson --output new.ndjson --watermark-file export_watermark.json
+
+With --watermark-file the export resumes after the stored watermark and,
+once the output is complete, the file is updated to the new one.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
+from dotenv import load_dotenv
+from core.db import WORKOUT_EXPORT_COLUMNS, get_workout_export_watermark, iter_workout_sessions
+from utils.pagination import decode_cursor, encode_cursor
+
+load_dotenv()
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Rows fetched from MySQL and encoded per step (one Parquet row group per batch).
+WORKOUT_EXPORT_BATCH_SIZE = int(os.getenv("WORKOUT_EXPORT_BATCH_SIZE", "5000"))
+# Sessions younger than this are left for the next export (see get_workout_export_watermark).
+WORKOUT_EXPORT_SETTLE_SECONDS = int(os.getenv("WORKOUT_EXPORT_SETTLE_SECONDS", "5"))
+
+
+def export_watermark(
+    after: Optional[Tuple[datetime, int]] = None,
+    settle_seconds: int = WORKOUT_EXPORT_SETTLE_SECONDS
+) -> Optional[Tuple[datetime, int]]:
+    """Where an export starting after `after` ends. Equal to `after` when nothing new was recorded."""
+    until = get_workout_export_watermark(settle_seconds)
+    if until is None or (after and tuple(until) <= tuple(after)):
+        return after
+    return until
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ndjson_chunks(batches) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(json.dumps(row, default=_json_value) + "\n" for row in rows).encode("utf-8")
+
+
+def _csv_chunks(batches) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(WORKOUT_EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows([row[column] for column in WORKOUT_EXPORT_COLUMNS] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only: nothing to export
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.string()),
+        ("exercise", pa.string()),
+        ("reps", pa.int32()),
+        ("accuracy", pa.float32()),
+        ("timestamp", pa.string()),
+        ("duration", pa.int32()),
+        ("feedback_points", pa.string()),
+        ("created_at", pa.timestamp("s")),
+    ])
+
+
+def _parquet_chunks(batches) -> Iterator[bytes]:
+    # Each batch becomes one Arrow record batch and one row group, written out as soon as it is encoded.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in batches:
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()  # footer
+
+
+ENCODERS = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "parquet": _parquet_chunks}
+
+
+def check_format(fmt: str):
+    """Raises ValueError for an unknown format, or when Parquet is requested without pyarrow installed."""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown export format '{fmt}'. Expected one of {EXPORT_FORMATS}.")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow).") from e
+
+
+def export_workout_sessions(
+    fmt: str,
+    after: Optional[Tuple[datetime, int]],
+    until: Optional[Tuple[datetime, int]],
+    batch_size: int = WORKOUT_EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """Encoded chunks of the sessions after `after` up to and including `until` (see export_watermark())."""
+    check_format(fmt)
+    batches = iter_workout_sessions(after, until, batch_size) if until and until != after else iter(())
+    return ENCODERS[fmt](batches)
+
+
+def _load_watermark(path: str) -> Optional[Tuple[datetime, int]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return decode_cursor(json.load(f)["cursor"])
+
+
+def _save_watermark(path: str, watermark: Tuple[datetime, int]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "cursor": encode_cursor(*watermark),
+            "created_at": watermark[0].isoformat(),
+            "id": watermark[1],
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+        }, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_export(
+    fmt: str,
+    output: str,
+    since: Optional[str] = None,
+    watermark_file: Optional[str] = None,
+    batch_size: int = WORKOUT_EXPORT_BATCH_SIZE
+) -> dict:
+    """
+    Writes one export to `output` and returns its watermark and size.
+
+    `since` is a watermark cursor from a previous export; `watermark_file`
+    both supplies it and receives the new one once the output is complete.
+    """
+    check_format(fmt)
+    after = decode_cursor(since) if since else (_load_watermark(watermark_file) if watermark_file else None)
+    until = export_watermark(after)
+    print(f"Exporting workout sessions after {after[0].isoformat() if after else 'the beginning'} as {fmt}...")
+
+    written = 0
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in export_workout_sessions(fmt, after, until, batch_size):
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(tmp_path, output)
+
+    result = {"output": output, "bytes": written, "cursor": encode_cursor(*until) if until else None}
+    print(f"✅ Wrote {written / 1024:.1f} KiB to {output}")
+    if until:
+        print(f"   Next export: --since {result['cursor']}")
+        if watermark_file and until != after:
+            _save_watermark(watermark_file, until)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--output", required=True, help="File to write (replaced atomically when complete)")
+    parser.add_argument("--since", help="Watermark cursor printed by a previous export")
+    parser.add_argument("--watermark-file", help="JSON file holding the watermark between incremental runs")
+    parser.add_argument("--batch-size", type=int, default=WORKOUT_EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    run_export(args.format, args.output, args.since, args.watermark_file, args.batch_size)
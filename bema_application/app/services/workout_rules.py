@@ -0,0 +1,116 @@
+import re
+from datetime import date
+from typing import Dict, List
+from models.user_health import UserHealthProfile
+
+EXERCISES = ("squats", "pushups", "plank")
+
+# Keywords in the free-text disability/surgery descriptions and the exercises they rule out.
+# Matched as whole words, so plurals and other forms are listed explicitly ("arm" must not match "army").
+LOWER_BODY_KEYWORDS = (
+    "wheelchair", "wheelchairs", "paralysis", "paralyzed", "paralysed", "paralytic",
+    "paraplegia", "paraplegic", "amputation", "amputations", "amputee", "amputated",
+    "leg", "legs", "knee", "knees", "hip", "hips", "ankle", "ankles", "foot", "feet",
+    "balance", "vertigo", "dizzy", "dizziness", "fall", "falls", "falling",
+    "parkinson", "parkinsons", "multiple sclerosis", "ms", "stroke", "strokes", "cerebral palsy",
+)
+UPPER_BODY_KEYWORDS = (
+    "quadriplegia", "quadriplegic", "tetraplegia", "tetraplegic", "shoulder", "shoulders", "rotator cuff",
+    "wrist", "wrists", "elbow", "elbows", "arm", "arms", "hand", "hands", "carpal tunnel",
+)
+CORE_KEYWORDS = (
+    "back", "spine", "spinal", "disc", "discs", "disk", "disks", "hernia", "hernias", "herniated",
+    "abdomen", "abdominal", "c-section", "caesarean", "cesarean", "pregnant", "pregnancy",
+)
+CARDIAC_KEYWORDS = (
+    "heart", "cardiac", "bypass", "stent", "stents", "valve", "valves", "pacemaker", "pacemakers",
+)
+
+# Surgeries within this many years cap every exercise until the user is cleared by a doctor.
+RECENT_SURGERY_YEARS = 1
+
+
+class _Plan:
+    def __init__(self, base: int):
+        self.times = {exercise: base for exercise in EXERCISES}
+        self.reasons: Dict[str, List[str]] = {exercise: [] for exercise in EXERCISES}
+
+    def exclude(self, exercises, reason: str):
+        for exercise in exercises:
+            if self.times[exercise] != 0:
+                self.times[exercise] = 0
+                self.reasons[exercise].append(reason)
+
+    def cap(self, exercises, limit: int, reason: str):
+        for exercise in exercises:
+            if self.times[exercise] > limit:
+                self.times[exercise] = limit
+                self.reasons[exercise].append(reason)
+
+
+def _mentions(text: str, keywords) -> bool:
+    # Whole words only: a prefix match would read "background" as "back" and drop the plank.
+    text = text.lower()
+    return any(re.search(rf"\b{re.escape(k)}\b", text) for k in keywords)
+
+
+def decide_workout_plan(profile: UserHealthProfile) -> Dict[str, dict]:
+    """
+    Deterministic, safety-first workout frequencies for squats, pushups and plank.
+
+    Returns {exercise: {"times_per_day": 0-3, "rules": [why it was lowered or excluded]}}.
+    Free-text conditions are matched by keyword; an unrecognised disability or a
+    recent surgery falls back to the most conservative non-zero plan.
+    """
+    plan = _Plan(base=2 if profile.exercises else 1)
+    if profile.exercises and profile.age < 40 and not (
+        profile.hasDisabilitiesOrSpecialNeeds or profile.hadSurgeries or profile.hasHighBloodPressure
+    ):
+        plan.times = {exercise: 3 for exercise in EXERCISES}
+
+    if profile.hasDisabilitiesOrSpecialNeeds:
+        description = profile.disabilityDiscription or ""
+        matched = False
+        if _mentions(description, LOWER_BODY_KEYWORDS):
+            plan.exclude(["squats"], f"Squats are not safe with the reported condition ({description}).")
+            matched = True
+        if _mentions(description, UPPER_BODY_KEYWORDS):
+            plan.exclude(["pushups", "plank"], f"Pushups and plank load the arms and shoulders, which the reported condition ({description}) rules out.")
+            matched = True
+        if _mentions(description, CORE_KEYWORDS):
+            plan.exclude(["plank"], f"Plank loads the spine and core, which the reported condition ({description}) rules out.")
+            plan.cap(["squats", "pushups"], 1, "Kept to once a day to protect the back.")
+            matched = True
+        if not matched:
+            plan.cap(EXERCISES, 1, "Kept to once a day because of the reported disability or special need.")
+
+    if profile.hadSurgeries:
+        surgery = profile.surgeryType or ""
+        if _mentions(surgery, LOWER_BODY_KEYWORDS):
+            plan.exclude(["squats"], f"Squats are not recommended after {surgery} surgery.")
+        if _mentions(surgery, UPPER_BODY_KEYWORDS):
+            plan.exclude(["pushups", "plank"], f"Pushups and plank are not recommended after {surgery} surgery.")
+        if _mentions(surgery, CORE_KEYWORDS) or _mentions(surgery, CARDIAC_KEYWORDS):
+            plan.exclude(["plank", "pushups"], f"Straining floor exercises are not recommended after {surgery} surgery.")
+        if profile.surgeryYear and date.today().year - profile.surgeryYear <= RECENT_SURGERY_YEARS:
+            plan.cap(EXERCISES, 1, "Kept to once a day because the surgery was recent; get medical clearance before doing more.")
+
+    if profile.hasHighBloodPressure:
+        # Sustained isometric holds and breath-holding raise blood pressure the most.
+        plan.cap(["plank"], 1, "Plank is a sustained hold that raises blood pressure, so it is kept to once a day.")
+        plan.cap(["squats", "pushups"], 2, "Limited to twice a day because of high blood pressure.")
+
+    if profile.age >= 65:
+        plan.cap(EXERCISES, 1, "Kept to once a day for safe recovery at an older age.")
+
+    return {exercise: {"times_per_day": plan.times[exercise], "rules": plan.reasons[exercise]} for exercise in EXERCISES}
+
+
+def default_reason(exercise: str, decision: dict) -> str:
+    """Plain-text explanation built from the rules, used when the LLM text is unavailable."""
+    times = decision["times_per_day"]
+    if decision["rules"]:
+        return " ".join(decision["rules"])
+    if times == 0:
+        return f"Doing {exercise} is not recommended for you right now."
+    return f"Doing {exercise} {times} time(s) a day is a safe amount for your current activity level."
@@ -1,23 +1,94 @@
 import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 from models.user_health import UserHealthProfile
-from models.workout_per_day import WorkoutSummary
+from models.workout_per_day import WorkoutReasons, WorkoutSummary
 from fastapi import APIRouter
 from datetime import datetime
 import logging
-import requests
 import os
 from dotenv import load_dotenv
+from core.db import on_profile_stored
+from core.llm_scheduler import BULK, llm_scheduler
+from core.metrics import metrics
+from core.ollama_pool import model_for, ollama_pool
+from services.workout_rules import EXERCISES, decide_workout_plan, default_reason
 
 load_dotenv()
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-NGROK_URL = os.getenv("NGROK_URL")
+# Plans are cached per user and profile version; entries expire after the TTL (seconds).
+WORKOUT_PLAN_CACHE_SIZE = int(os.getenv("WORKOUT_PLAN_CACHE_SIZE", "1024"))
+WORKOUT_PLAN_CACHE_TTL = float(os.getenv("WORKOUT_PLAN_CACHE_TTL", "86400"))
+# Plans whose LLM reasons failed (rule-text fallback) are only cached this long, so the next
+# request after a transient Ollama error gets real reasons again.
+WORKOUT_PLAN_FALLBACK_TTL = float(os.getenv("WORKOUT_PLAN_FALLBACK_TTL", "300"))
+# "llm" (default): the rule engine decides times_per_day and the LLM only writes the reasons.
+# "rules": reasons are built from the rules too, no LLM call at all.
+WORKOUT_PLAN_REASONS = os.getenv("WORKOUT_PLAN_REASONS", "llm")
+
+
+class WorkoutPlanCache:
+    """
+    LRU cache of generated workout plans keyed by userId.
+
+    Each entry remembers the profile version (hash of the profile) it was built
+    from, so a changed profile is a miss even if the invalidation hook was
+    missed (e.g. the profile was written by another process).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 86400):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def profile_version(profile: UserHealthProfile) -> str:
+        return hashlib.sha256(profile.model_dump_json().encode("utf-8")).hexdigest()
+
+    def get(self, user_id: str, version: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry:
+                return None
+            cached_version, expires_at, plan = entry
+            if cached_version != version or time.time() > expires_at:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return plan
+
+    def put(self, user_id: str, version: str, plan: dict, ttl_seconds: Optional[float] = None):
+        """Caches a plan for `ttl_seconds` (default: the cache's TTL)."""
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._entries[user_id] = (version, expires_at, plan)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+workout_plan_cache = WorkoutPlanCache(WORKOUT_PLAN_CACHE_SIZE, WORKOUT_PLAN_CACHE_TTL)
+on_profile_stored(workout_plan_cache.invalidate)
 
 
 async def generate_workout_motivation(user_id: str, performance_context: str) -> str:
     """Generate AI motivational feedback for workout performance"""
+    # Blocking, and possibly queued behind other LLM calls: keep it off the event loop.
+    return await llm_scheduler.run_in_threadpool(BULK, _generate_workout_motivation, user_id, performance_context)
+
+
+def _generate_workout_motivation(user_id: str, performance_context: str) -> str:
     try:
         prompt = f"""You are a supportive fitness coach. Based on the user's workout performance, provide a brief, motivational message (2-3 sentences max).
         
@@ -26,18 +97,14 @@ Performance: {performance_context}
 Provide encouragement, celebrate achievements, and offer constructive tips for improvement. Be positive and energetic!"""
 
         payload = {
-            "model": "qwen3:8b",
+            "model": model_for("workout_motivation"),
             "prompt": prompt,
             "stream": False,
             "options": {"temperature": 0.7}
         }
         
-        res = requests.post(
-            f"{NGROK_URL}/api/generate",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=30
-        )
+        with llm_scheduler.slot(BULK, user_id=user_id):
+            res = ollama_pool.post("/api/generate", payload, timeout=30)
         res.raise_for_status()
         
         return res.json().get('response', 'Great job! Keep up the excellent work!')
@@ -46,61 +113,74 @@ Provide encouragement, celebrate achievements, and offer constructive tips for i
         return "Great work! Keep pushing yourself to be better every day!"
     
 
-async def generate_workout_times_per_day(user_id: str, user_health_profile: UserHealthProfile) -> dict:
-    """Generate AI feedback on workout times per day"""
+def _generate_workout_reasons(user_health_profile: UserHealthProfile, decisions: dict) -> Optional[dict]:
+    """Asks the LLM to explain an already-decided plan. Returns None if the call fails."""
+    plan_lines = "\n".join(
+        f"- {exercise}: {decision['times_per_day']} time(s) per day"
+        + (f" (rules applied: {' '.join(decision['rules'])})" if decision["rules"] else "")
+        for exercise, decision in decisions.items()
+    )
+    prompt = f"""You are a supportive adaptive fitness advisor. The workout frequencies below have already been decided by safety rules and MUST NOT be changed.
+        For each exercise, write 1-2 sentences addressed to the user explaining why this frequency suits their health profile. For 0 times per day, explain why the exercise is not safe for them right now.
+
+        Workout plan:
+        {plan_lines}
+
+        User Health Profile:
+        {user_health_profile.model_dump_json(exclude={"userId"})}
+        """
     try:
-        prompt = f"""You are an expert adaptive fitness advisor specializing in personalized exercise planning for diverse health conditions and disabilities.
-
-            Analyze the user's complete health profile thoroughly:
-            - Current health conditions and disabilities
-            - Physical limitations and mobility restrictions
-            - Age, fitness level, and medical history
-            - Chronic conditions (heart disease, diabetes, arthritis, etc.)
-            - Neurological conditions (MS, Parkinson's, stroke recovery, etc.)
-            - Joint problems, chronic pain, or injuries
-            - Cardiovascular or respiratory limitations
-
-            CRITICAL DISABILITY ASSESSMENT:
-            - If the user has disabilities or conditions that make squats, pushups, or plank UNSAFE or CONTRAINDICATED, set times_per_day to 0
-            - For mobility impairments affecting lower body: set squats to 0
-            - For upper body limitations, shoulder injuries, or severe arthritis: set pushups and plank to 0
-            - For balance disorders or fall risk: set squats to 0
-            - For cardiovascular conditions limiting floor exercises: adjust accordingly
-            - For wheelchair users or severe mobility restrictions: prioritize adaptive alternatives
-
-            Provide specific, evidence-based recommendations for each exercise:
-            - Squats: Consider knee health, lower body mobility, balance, fall risk
-            - Pushups: Consider shoulder health, upper body strength, wrist/elbow conditions
-            - Plank: Consider core stability, back conditions, shoulder health
-
-            For each workout, specify:
-            1. Safe frequency (times_per_day: 0-3) based on their specific conditions
-            2. Detailed reasoning explaining WHY this frequency is recommended, addressing their specific health conditions and any disabilities
-
-            Be encouraging but PRIORITIZE SAFETY. Never recommend exercises that could worsen existing conditions or disabilities.
-
-            User Health Profile:
-            {user_health_profile.model_dump_json() if hasattr(user_health_profile, 'model_dump_json') else str(user_health_profile)}
-            """
-        res = requests.post(
-            f"{NGROK_URL}/api/generate",
-            headers={"Content-Type": "application/json"},
-            json={
-                "model": "qwen3:8b",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0.7},
-                "format": WorkoutSummary.model_json_schema()
-            },
-            timeout=60
-        )
+        with llm_scheduler.slot(BULK, user_id=user_health_profile.userId):
+            res = ollama_pool.post(
+                "/api/generate",
+                {
+                    "model": model_for("workout_reasons"),
+                    "prompt": prompt,
+                    "stream": False,
+                    "options": {"temperature": 0.7},
+                    "format": WorkoutReasons.model_json_schema()
+                },
+                timeout=60
+            )
         res.raise_for_status()
-        llm_response_json_str = res.json().get('response', '{}')
-        return json.loads(llm_response_json_str)
+        return WorkoutReasons.model_validate_json(res.json().get('response', '{}')).model_dump()
     except Exception as e:
-        logger.error(f"Error generating motivation: {str(e)}")
-        return {'squats': {'times_per_day': 0, 'reason_for_the_workout_plan': 'No data'},
-                'pushups': {'times_per_day': 0, 'reason_for_the_workout_plan': 'No data'},
-                'plank': {'times_per_day': 0, 'reason_for_the_workout_plan': 'No data'}}
-
+        logger.error(f"Error generating workout plan reasons: {str(e)}")
+        return None
+
+
+def build_workout_plan(user_health_profile: UserHealthProfile) -> dict:
+    """
+    Rule-based workout plan: times_per_day always comes from services.workout_rules;
+    the LLM (if enabled) only writes reason_for_the_workout_plan. Blocking.
+    """
+    return _build_workout_plan(user_health_profile)[0]
+
+
+def _build_workout_plan(user_health_profile: UserHealthProfile) -> Tuple[dict, bool]:
+    """The plan, and whether it fell back to rule-based reasons because the LLM call failed."""
+    decisions = decide_workout_plan(user_health_profile)
+    reasons = _generate_workout_reasons(user_health_profile, decisions) if WORKOUT_PLAN_REASONS == "llm" else None
+    plan = {
+        exercise: {
+            "times_per_day": decisions[exercise]["times_per_day"],
+            "reason_for_the_workout_plan": (reasons or {}).get(exercise) or default_reason(exercise, decisions[exercise]),
+        }
+        for exercise in EXERCISES
+    }
+    degraded = WORKOUT_PLAN_REASONS == "llm" and reasons is None
+    return WorkoutSummary.model_validate(plan).model_dump(), degraded
+
+
+async def get_workout_plan_cached(user_id: str, user_health_profile: UserHealthProfile) -> dict:
+    """Returns the cached plan for this profile version, building (and caching) it on a miss."""
+    version = WorkoutPlanCache.profile_version(user_health_profile)
+    plan = workout_plan_cache.get(user_id, version)
+    if plan is not None:
+        metrics.increment("workout.plan_cache", labels={"result": "hit"})
+        return plan
+    metrics.increment("workout.plan_cache", labels={"result": "miss"})
+    plan, degraded = await llm_scheduler.run_in_threadpool(BULK, _build_workout_plan, user_health_profile)
+    workout_plan_cache.put(user_id, version, plan, ttl_seconds=WORKOUT_PLAN_FALLBACK_TTL if degraded else None)
+    return plan
 
@@ -0,0 +1,68 @@
+import os
+from typing import Optional
+from ultralytics import YOLO
+
+YOLO_BACKENDS = ("torch", "onnx", "openvino")
+
+
+def export_path_for(model_path: str, backend: str, int8: bool = False) -> str:
+    """Where the exported copy of `model_path` is cached (next to the .pt file)."""
+    stem, _ = os.path.splitext(model_path)
+    if backend == "onnx":
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        # Same naming as ultralytics' own OpenVINO export.
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    return model_path
+
+
+def _is_fresh(export_path: str, model_path: str) -> bool:
+    return os.path.exists(export_path) and os.path.getmtime(export_path) >= os.path.getmtime(model_path)
+
+
+def _export(model_path: str, backend: str, int8: bool, imgsz: int, calibration_data: Optional[str]) -> str:
+    model = YOLO(model_path)
+    if backend == "onnx":
+        # Dynamic axes so the exported graph accepts the micro-batches built by the inference worker.
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if not int8:
+            return exported
+        # ultralytics has no int8 ONNX export; quantize the weights with onnxruntime instead.
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized = export_path_for(model_path, "onnx", int8=True)
+        quantize_dynamic(exported, quantized, weight_type=QuantType.QUInt8)
+        return quantized
+
+    export_args = {"format": "openvino", "imgsz": imgsz, "dynamic": True}
+    if int8:
+        export_args["int8"] = True
+        if calibration_data:
+            export_args["data"] = calibration_data
+    return model.export(**export_args)
+
+
+def load_yolo_model(
+    model_path: str,
+    backend: str = "torch",
+    int8: bool = False,
+    imgsz: int = 640,
+    calibration_data: Optional[str] = None
+) -> YOLO:
+    """
+    Loads a YOLO model on the requested CPU backend.
+
+    For "onnx" and "openvino" the .pt model is exported once and the export is
+    reused until the .pt file changes. The returned object has the same
+    predict interface whatever the backend.
+    """
+    if backend not in YOLO_BACKENDS:
+        raise ValueError(f"Unknown YOLO backend '{backend}'. Expected one of {YOLO_BACKENDS}.")
+    if backend == "torch":
+        return YOLO(model_path)
+
+    export_path = export_path_for(model_path, backend, int8)
+    if not _is_fresh(export_path, model_path):
+        print(f"--- Exporting {model_path} to {backend}{' (int8)' if int8 else ''} ---")
+        export_path = _export(model_path, backend, int8, imgsz, calibration_data)
+        print(f"  Export cached at '{export_path}'")
+    return YOLO(export_path, task="detect")
@@ -0,0 +1,126 @@
+"""
+utils.compact_index: int8 search quality, persistence and recovery from interrupted appends.
+
+    cd bema_application/app && python -m pytest tests/test_compact_index.py
+"""
+import os
+import numpy as np
+import pytest
+from utils.compact_index import CompactCollection, CompactVectorIndex
+
+DIMS = 32
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, DIMS)).astype(np.float32)
+
+
+def _fill(index: CompactVectorIndex, vectors: np.ndarray, start: int = 0):
+    ids = [f"id-{start + i}" for i in range(len(vectors))]
+    index.add(ids, vectors, [f"document {start + i}" for i in range(len(vectors))])
+
+
+def _exact_top(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [f"id-{i}" for i in np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k]]
+
+
+def test_search_matches_exact_cosine_ranking(tmp_path):
+    vectors = _vectors(3000)
+    index = CompactVectorIndex(str(tmp_path))
+    _fill(index, vectors)
+    for query in _vectors(20, seed=1):
+        hits = index.search(query, 5)
+        assert [entry_id for entry_id, _, _ in hits] == _exact_top(vectors, query, 5)
+        scores = [score for _, _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_search_returns_documents_and_exact_scores(tmp_path):
+    vectors = _vectors(100)
+    index = CompactVectorIndex(str(tmp_path))
+    _fill(index, vectors)
+    entry_id, document, score = index.search(vectors[42], 1)[0]
+    assert (entry_id, document) == ("id-42", "document 42")
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_pca_codes_still_rank_by_the_exact_vectors(tmp_path):
+    vectors = _vectors(2000)
+    index = CompactVectorIndex(str(tmp_path))
+    index.fit_pca(vectors[:500], code_dims=16)
+    _fill(index, vectors)
+    assert index.resident_bytes() == 2000 * (16 + 4 + 8)
+    for query in vectors[:10]:
+        assert index.search(query, 3)[0][0] == _exact_top(vectors, query, 1)[0]
+    with pytest.raises(ValueError):
+        index.fit_pca(vectors[:500], code_dims=8)
+
+
+def test_empty_index_and_dimension_mismatch(tmp_path):
+    index = CompactVectorIndex(str(tmp_path))
+    assert index.search(_vectors(1)[0], 5) == []
+    _fill(index, _vectors(3))
+    with pytest.raises(ValueError):
+        index.add(["x"], np.ones((1, DIMS + 1)), ["x"])
+
+
+def test_reopened_index_keeps_appending(tmp_path):
+    vectors = _vectors(300)
+    index = CompactVectorIndex(str(tmp_path))
+    _fill(index, vectors[:200])
+    index.search(vectors[0], 1)  # maps the files before the next append
+
+    reopened = CompactVectorIndex(str(tmp_path))
+    assert reopened.count() == 200
+    _fill(reopened, vectors[200:], start=200)
+    assert reopened.count() == 300
+    assert reopened.search(vectors[250], 1)[0][:2] == ("id-250", "document 250")
+    assert reopened.search(vectors[10], 1)[0][:2] == ("id-10", "document 10")
+
+
+def _append_garbage(directory, rows: int):
+    """What an add() that crashed before writing meta.json leaves behind (a partial last row included)."""
+    for name, row_bytes in (("codes.i8", DIMS), ("scales.f32", 4), ("vectors.f32", 4 * DIMS)):
+        with open(os.path.join(directory, name), "ab") as f:
+            f.write(b"\x7f" * (row_bytes * rows - 1))
+    with open(os.path.join(directory, "documents.jsonl"), "ab") as f:
+        f.write(b'{"id": "lost", "document": "lost"}\n' * (rows - 1) + b'{"id": "lo')
+
+
+def test_interrupted_append_is_discarded_on_open(tmp_path):
+    vectors = _vectors(60)
+    _fill(CompactVectorIndex(str(tmp_path)), vectors[:50])
+    _append_garbage(tmp_path, rows=7)
+
+    index = CompactVectorIndex(str(tmp_path))
+    assert index.count() == 50
+    assert os.path.getsize(tmp_path / "codes.i8") == 50 * DIMS
+    _fill(index, vectors[50:], start=50)
+    for i in (0, 49, 50, 59):
+        assert index.search(vectors[i], 1)[0][:2] == (f"id-{i}", f"document {i}")
+
+
+def test_interrupted_first_append_is_discarded_on_open(tmp_path):
+    # The crash happened before the first meta.json was written.
+    _append_garbage(tmp_path, rows=7)
+    assert not os.path.exists(tmp_path / "meta.json")
+
+    index = CompactVectorIndex(str(tmp_path))
+    assert index.count() == 0
+    for name in ("codes.i8", "scales.f32", "vectors.f32", "documents.jsonl"):
+        assert os.path.getsize(tmp_path / name) == 0
+    vectors = _vectors(20)
+    _fill(index, vectors)
+    assert [index.search(v, 1)[0][0] for v in vectors] == [f"id-{i}" for i in range(20)]
+
+
+def test_collection_answers_like_chroma(tmp_path):
+    vectors = {"water": [1.0, 0.0, 0.0], "sleep": [0.0, 1.0, 0.0], "walk": [0.0, 0.0, 1.0]}
+    collection = CompactCollection(str(tmp_path), lambda texts: [vectors[text.split()[0]] for text in texts])
+    collection.add(["a", "b", "c"], ["water intake", "sleep schedule", "walk daily"])
+    result = collection.query(["water glasses", "sleep better"], n_results=2)
+    assert collection.count() == 3
+    assert [ids[0] for ids in result["ids"]] == ["a", "b"]
+    assert result["documents"][0][0] == "water intake"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
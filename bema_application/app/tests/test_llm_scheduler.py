@@ -0,0 +1,175 @@
+"""
+core.llm_scheduler: slot order, caps, fairness and deadlines, with a simulated backend.
+
+    cd bema_application/app && python -m pytest tests/test_llm_scheduler.py
+"""
+import asyncio
+import threading
+import time
+import anyio
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from core.llm_scheduler import BULK, INTERACTIVE, LlmDeadlineExceeded, LlmScheduler
+
+
+def _scheduler(concurrency=1, interactive=1, bulk=1, max_wait=5.0, threads=None) -> LlmScheduler:
+    return LlmScheduler(
+        concurrency=concurrency,
+        class_concurrency={INTERACTIVE: interactive, BULK: bulk},
+        max_wait={INTERACTIVE: max_wait, BULK: max_wait},
+        threads=threads,
+    )
+
+
+def _queue_behind(scheduler: LlmScheduler, blocker: threading.Event, calls):
+    """
+    Holds the only slot until every call in `calls` ((priority, user_id, label)) is
+    queued, then releases it. Returns the labels in the order they got a slot.
+    """
+    order, lock = [], threading.Lock()
+    holding = threading.Event()
+
+    def hold():
+        with scheduler.slot(BULK, user_id="holder"):
+            holding.set()
+            blocker.wait(5)
+
+    def call(priority, user_id, label):
+        with scheduler.slot(priority, user_id=user_id):
+            with lock:
+                order.append(label)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert holding.wait(5)
+    threads = []
+    for priority, user_id, label in calls:
+        thread = threading.Thread(target=call, args=(priority, user_id, label))
+        thread.start()
+        threads.append(thread)
+        # Queue in a fixed order.
+        while sum(s["queued"] for s in scheduler.status().values()) < len(threads):
+            time.sleep(0.001)
+    blocker.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    return order
+
+
+def test_interactive_is_served_before_bulk():
+    order = _queue_behind(_scheduler(), threading.Event(), [
+        (BULK, "a", "bulk-1"),
+        (BULK, "b", "bulk-2"),
+        (INTERACTIVE, "c", "chat"),
+    ])
+    assert order == ["chat", "bulk-1", "bulk-2"]
+
+
+def test_users_are_served_round_robin_within_a_class():
+    order = _queue_behind(_scheduler(), threading.Event(), [
+        (BULK, "burst", "burst-1"),
+        (BULK, "burst", "burst-2"),
+        (BULK, "burst", "burst-3"),
+        (BULK, "other", "other-1"),
+    ])
+    assert order == ["burst-1", "other-1", "burst-2", "burst-3"]
+
+
+def test_class_cap_leaves_slots_for_the_other_class():
+    scheduler = _scheduler(concurrency=3, interactive=3, bulk=1)
+    release = threading.Event()
+    running = threading.Semaphore(0)
+
+    def bulk_call():
+        with scheduler.slot(BULK, user_id="bulk"):
+            running.release()
+            release.wait(5)
+
+    threads = [threading.Thread(target=bulk_call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert running.acquire(timeout=5)
+    try:
+        while scheduler.status()[BULK]["queued"] < 2:
+            time.sleep(0.001)
+        assert scheduler.status()[BULK]["running"] == 1
+        # Two slots stay free for chat even though bulk calls are waiting.
+        with scheduler.slot(INTERACTIVE, user_id="chat"), scheduler.slot(INTERACTIVE, user_id="chat"):
+            assert scheduler.status()[INTERACTIVE]["running"] == 2
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+    assert scheduler.status()[BULK] == {"queued": 0, "running": 0, "limit": 1, "users_waiting": 0}
+
+
+def test_call_still_queued_at_its_deadline_is_dropped():
+    scheduler = _scheduler()
+    with scheduler.slot(BULK, user_id="holder"):
+        started = time.monotonic()
+        with pytest.raises(LlmDeadlineExceeded):
+            with scheduler.slot(INTERACTIVE, user_id="late", deadline=time.monotonic() + 0.1):
+                pytest.fail("got a slot that was never free")
+        assert time.monotonic() - started < 2
+        assert scheduler.status()[INTERACTIVE]["queued"] == 0
+    # The dropped call gave nothing back, so the slot is free again.
+    with scheduler.slot(INTERACTIVE, user_id="next"):
+        assert scheduler.status()[INTERACTIVE]["running"] == 1
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        with _scheduler().slot("urgent"):
+            pass
+
+
+def test_chat_is_admitted_while_bulk_callers_fill_the_shared_threadpool():
+    # 50 queued bulk calls are more than the shared pool's 40 threads.
+    scheduler = _scheduler(concurrency=4, interactive=2, bulk=2, max_wait=30.0, threads={INTERACTIVE: 4, BULK: 4})
+    release = threading.Event()
+
+    def bulk_call(user_id):
+        with scheduler.slot(BULK, user_id=user_id):
+            release.wait(30)
+
+    def chat_call():
+        with scheduler.slot(INTERACTIVE, user_id="chat"):
+            return "answered"
+
+    async def main():
+        bulk = [asyncio.ensure_future(run_in_threadpool(bulk_call, f"user-{i}")) for i in range(50)]
+        try:
+            while scheduler.status()[BULK]["running"] < 2:
+                await asyncio.sleep(0.01)
+            with anyio.fail_after(5):
+                assert await scheduler.run_in_threadpool(INTERACTIVE, chat_call) == "answered"
+        finally:
+            release.set()
+            await asyncio.gather(*bulk)
+
+    asyncio.run(main())
+
+
+def test_bulk_calls_wait_without_taking_the_shared_threadpool():
+    scheduler = _scheduler(concurrency=4, interactive=2, bulk=2, max_wait=30.0, threads={INTERACTIVE: 4, BULK: 4})
+    release = threading.Event()
+
+    def bulk_call(user_id):
+        with scheduler.slot(BULK, user_id=user_id):
+            release.wait(30)
+
+    async def main():
+        bulk = [asyncio.ensure_future(scheduler.run_in_threadpool(BULK, bulk_call, f"user-{i}")) for i in range(50)]
+        try:
+            # Only the bulk thread limit is busy: 2 calls running and 2 queued for a slot.
+            while scheduler.status()[BULK] != {"queued": 2, "running": 2, "limit": 2, "users_waiting": 2}:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            assert scheduler.status()[BULK]["queued"] == 2
+            with anyio.fail_after(5):
+                assert await run_in_threadpool(lambda: "served") == "served"
+        finally:
+            release.set()
+            await asyncio.gather(*bulk)
+
+    asyncio.run(main())
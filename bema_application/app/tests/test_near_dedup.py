@@ -0,0 +1,67 @@
+"""
+utils.near_dedup: MinHash/LSH near-duplicate detection for RAG chunks.
+
+    cd bema_application/app && python -m pytest tests/test_near_dedup.py
+"""
+import numpy as np
+import pytest
+from utils.near_dedup import _lsh_bands, minhash_signatures, near_duplicate_indices
+
+CHUNK = (
+    "Adults should aim for at least 150 minutes of moderate aerobic activity every week, "
+    "spread over most days, together with muscle strengthening exercises on two or more days. "
+    "Short bouts of activity count, and any amount of movement is better than none at all. "
+    "People with chronic conditions should talk to their doctor before starting a new routine."
+)
+OTHER = (
+    "Drink water regularly through the day and more when it is hot or when you exercise. "
+    "Thirst, dark urine and headaches can be signs of dehydration, especially in older adults. "
+    "Sugary drinks add calories without making you feel full, so prefer water or unsweetened tea."
+)
+
+
+def test_exact_and_near_copies_are_dropped_after_the_first():
+    footer = CHUNK + " Source: www.example.org/activity"
+    texts = [CHUNK, OTHER, CHUNK, footer, OTHER.upper()]
+    assert near_duplicate_indices(texts, threshold=0.8) == [2, 3, 4]
+
+
+def test_distinct_texts_are_kept():
+    texts = [CHUNK, OTHER, "Sleep seven to nine hours a night on a regular schedule.", ""]
+    assert near_duplicate_indices(texts, threshold=0.8) == []
+
+
+def _with_new_ending(text: str, words: int) -> str:
+    kept = text.split()[:-words]
+    return " ".join(kept + [f"new{i}" for i in range(words)])
+
+
+def test_threshold_decides_how_close_a_copy_must_be():
+    # Roughly 0.64 Jaccard similarity of the 5-word shingles.
+    edited = _with_new_ending(CHUNK, 12)
+    assert near_duplicate_indices([CHUNK, edited], threshold=0.3) == [1]
+    assert near_duplicate_indices([CHUNK, edited], threshold=0.9) == []
+    # Roughly 0.29: unrelated enough to keep even at a low threshold.
+    assert near_duplicate_indices([CHUNK, _with_new_ending(CHUNK, 30)], threshold=0.7) == []
+
+
+def test_whichever_copy_comes_first_is_kept():
+    edited = _with_new_ending(CHUNK, 2)
+    assert near_duplicate_indices([CHUNK, edited, CHUNK], threshold=0.7) == [1, 2]
+    assert near_duplicate_indices([edited, OTHER, CHUNK], threshold=0.7) == [2]
+
+
+def test_signatures_are_deterministic_and_case_insensitive():
+    first = minhash_signatures([CHUNK, OTHER])
+    assert first.shape == (2, 128) and first.dtype == np.uint64
+    assert np.array_equal(first, minhash_signatures([CHUNK, OTHER]))
+    assert np.mean(first[0] == first[1]) < 0.1
+    assert np.array_equal(minhash_signatures([CHUNK])[0], minhash_signatures([CHUNK.upper()])[0])
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.9])
+def test_lsh_bands_split_the_signature(threshold):
+    bands, rows = _lsh_bands(128, threshold)
+    assert bands * rows == 128
+    # The S-curve midpoint should sit near the threshold.
+    assert abs((1 / bands) ** (1 / rows) - threshold) < 0.15
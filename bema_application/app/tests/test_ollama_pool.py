@@ -0,0 +1,171 @@
+"""
+core.ollama_pool: failover, circuit breakers and half-open trials against local stand-in servers.
+
+    cd bema_application/app && python -m pytest tests/test_ollama_pool.py
+"""
+import socket
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import requests
+from core.ollama_pool import CLOSED, HALF_OPEN, OPEN, NoEndpointAvailableError, OllamaPool
+
+PAYLOAD = {"model": "qwen3:8b", "prompt": "How much water should I drink?", "stream": False}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_standin(*args) -> tuple:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.standin_server", "--port", str(port),
+         "--latency-ms", "0", "--jitter-ms", "0", "--token-delay-ms", "0", *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 20
+    while True:
+        try:
+            requests.get(f"{url}/api/version", timeout=1).raise_for_status()
+            return server, url
+        except requests.RequestException:
+            if server.poll() is not None or time.time() > deadline:
+                server.kill()
+                pytest.skip("stand-in server did not start")
+            time.sleep(0.1)
+
+
+@pytest.fixture(scope="module")
+def servers():
+    started = {"good": _start_standin(), "failing": _start_standin("--error-rate", "1")}
+    yield {name: url for name, (_, url) in started.items()}
+    for server, _ in started.values():
+        server.kill()
+        server.wait()
+
+
+@pytest.fixture
+def dead_url() -> str:
+    return f"http://127.0.0.1:{_free_port()}"  # nothing listens there
+
+
+def _pool(urls, **kwargs) -> OllamaPool:
+    kwargs.setdefault("breaker_failures", 2)
+    kwargs.setdefault("breaker_cooldown", 60)
+    return OllamaPool(urls, health_interval=0, **kwargs)
+
+
+def test_connection_failures_fail_over_and_open_the_breaker(servers, dead_url):
+    pool = _pool([dead_url, servers["good"]])
+    for _ in range(10):
+        assert pool.post("/api/generate", PAYLOAD, timeout=5).status_code == 200
+    dead, good = pool.endpoints
+    assert dead.state == OPEN
+    assert good.state == CLOSED
+    assert dead.outstanding == good.outstanding == 0
+
+
+def test_5xx_counts_against_the_breaker(servers):
+    pool = _pool([servers["failing"]])
+    for _ in range(2):
+        assert pool.post("/api/generate", PAYLOAD, timeout=5).status_code == 500
+    assert pool.endpoints[0].state == OPEN
+    with pytest.raises(NoEndpointAvailableError):
+        pool.post("/api/generate", PAYLOAD, timeout=5)
+
+
+def test_4xx_leaves_the_endpoint_healthy(servers):
+    pool = _pool([servers["good"]])
+    unknown_model = dict(PAYLOAD, model="missing-model")
+    for _ in range(3):
+        assert pool.post("/api/generate", unknown_model, timeout=5).status_code == 404
+        with pool.stream("/api/generate", dict(unknown_model, stream=True), timeout=5) as res:
+            with pytest.raises(requests.HTTPError):
+                res.raise_for_status()
+    assert pool.endpoints[0].state == CLOSED
+    assert pool.endpoints[0].failures == 0
+
+
+def test_half_open_trial_closes_the_breaker_on_success(servers):
+    pool = _pool([servers["good"]], breaker_cooldown=0.2)
+    endpoint = pool.endpoints[0]
+    endpoint.state, endpoint.opened_at = OPEN, time.monotonic()
+    with pytest.raises(NoEndpointAvailableError):
+        pool.post("/api/generate", PAYLOAD, timeout=5)
+    time.sleep(0.3)
+    assert pool.post("/api/generate", PAYLOAD, timeout=5).status_code == 200
+    assert endpoint.state == CLOSED
+    assert not endpoint.probing
+
+
+def test_half_open_trial_reopens_the_breaker_on_failure(servers):
+    pool = _pool([servers["failing"]], breaker_cooldown=0.2)
+    endpoint = pool.endpoints[0]
+    endpoint.state, endpoint.opened_at = OPEN, time.monotonic() - 1
+    assert pool.post("/api/generate", PAYLOAD, timeout=5).status_code == 500
+    assert endpoint.state == OPEN
+    assert not endpoint.probing
+
+
+def test_only_the_trial_request_ends_the_trial():
+    pool = _pool(["http://127.0.0.1:9"], breaker_cooldown=0.2)
+    endpoint = pool.endpoints[0]
+    # Sent while the breaker was still closed, still running when it opens.
+    slow, slow_is_probe = pool._pick(None)
+    assert not slow_is_probe
+    endpoint.state, endpoint.opened_at = OPEN, time.monotonic() - 1
+
+    probe, is_probe = pool._pick(None)
+    assert probe is endpoint and is_probe and endpoint.state == HALF_OPEN
+    pool._finish(slow, False, slow_is_probe)
+    # The slow request finishing must not let a second trial through.
+    assert endpoint.probing
+    with pytest.raises(NoEndpointAvailableError):
+        pool._pick(None)
+
+    pool._finish(probe, True, is_probe)
+    assert endpoint.state == CLOSED and not endpoint.probing
+    assert pool._pick(None) == (endpoint, False)
+
+
+def test_streams_are_counted_until_the_block_exits(servers):
+    pool = _pool([servers["good"]])
+    with pool.stream("/api/generate", dict(PAYLOAD, stream=True), timeout=5) as res:
+        res.raise_for_status()
+        assert pool.endpoints[0].outstanding == 1
+        assert sum(1 for line in res.iter_lines() if line) > 1
+    assert pool.endpoints[0].outstanding == 0
+
+
+def test_requests_prefer_endpoints_that_have_the_model():
+    pool = _pool(["http://gpu-1:11434", "http://gpu-2:11434"])
+    pool.endpoints[0].models = {"qwen3:1.7b"}
+    pool.endpoints[1].models = {"qwen3:8b"}
+    for _ in range(5):
+        endpoint, _ = pool._pick("qwen3:8b")
+        pool._finish(endpoint, True, False)
+        assert endpoint is pool.endpoints[1]
+
+
+def test_start_runs_the_first_health_check_in_the_background():
+    pool = OllamaPool(["http://127.0.0.1:9"], health_interval=60)
+    checked = threading.Event()
+
+    def slow_check():
+        time.sleep(0.5)
+        checked.set()
+
+    pool.check_health = slow_check
+    started = time.perf_counter()
+    pool.start()
+    try:
+        assert time.perf_counter() - started < 0.25
+        assert checked.wait(5)
+    finally:
+        pool.shutdown()
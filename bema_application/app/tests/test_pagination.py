@@ -0,0 +1,90 @@
+"""
+utils.pagination: the opaque (createdAt, id) cursors of the history endpoints.
+
+    cd bema_application/app && python -m pytest tests/test_pagination.py
+"""
+import base64
+from datetime import datetime
+import pytest
+from utils.pagination import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("created_at, row_id", [
+    (datetime(2025, 10, 17, 14, 30), 1),
+    (datetime(2025, 10, 17, 14, 30, 5, 123456), 987654321),
+    (datetime(1970, 1, 1), 0),
+])
+def test_cursor_round_trip(created_at, row_id):
+    assert decode_cursor(encode_cursor(created_at, row_id)) == (created_at, row_id)
+
+
+def test_cursor_is_url_safe_and_unpadded():
+    cursor = encode_cursor(datetime(2025, 10, 17, 14, 30, 5, 123456), 2 ** 40)
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "%%%",
+    _b64(b"not json"),
+    _b64(b'{"createdAt": "2025-10-17T14:30:00", "id": 1}'),
+    _b64(b'["2025-10-17T14:30:00"]'),
+    _b64(b'["2025-10-17T14:30:00", 1, 2]'),
+    _b64(b'["yesterday", 1]'),
+    _b64(b'["2025-10-17T14:30:00", "one"]'),
+    _b64(b'[null, 1]'),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routes import history_routes
+
+    rows = [
+        {"id": row_id, "createdAt": datetime(2025, 10, 17, 14, 20 + row_id // 2), "title": f"Suggestion {row_id}"}
+        for row_id in range(10, 0, -1)
+    ]
+    seeks = []
+
+    def fake_history(user_id, limit, before, fields):
+        seeks.append(before)
+        newer = [r for r in rows if before is None or (r["createdAt"], r["id"]) < before]
+        return newer[:limit], len(newer) > limit
+
+    monkeypatch.setattr(history_routes, "get_suggestion_history", fake_history)
+    app = FastAPI()
+    app.include_router(history_routes.router, prefix="/api")
+    return TestClient(app), seeks
+
+
+def test_history_pages_follow_next_cursor(client):
+    http, seeks = client
+    ids, cursor = [], None
+    while True:
+        page = http.get("/api/history/suggestions/u1", params={"limit": 4, **({"cursor": cursor} if cursor else {})}).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    assert ids == list(range(10, 0, -1))
+    # Every other pair of rows shares a timestamp, so pages only line up if the id breaks ties.
+    assert seeks[1] == (datetime(2025, 10, 17, 14, 23), 7)
+
+
+def test_history_rejects_an_invalid_cursor_without_querying(client):
+    http, seeks = client
+    res = http.get("/api/history/suggestions/u1", params={"cursor": "not a cursor"})
+    assert res.status_code == 400
+    assert res.json() == {"detail": "Invalid cursor"}
+    assert seeks == []
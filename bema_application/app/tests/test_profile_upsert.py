@@ -0,0 +1,110 @@
+"""
+Profile upserts against a real MySQL 8.0.19+ server (skipped when none is reachable).
+
+Uses the DB_HOST/DB_USER/DB_PASSWORD settings and a throwaway `<DB_NAME>_test` database:
+
+    cd bema_application/app && python -m pytest tests/test_profile_upsert.py
+"""
+import pytest
+from benchmarks.fixtures import SAMPLE_PROFILE
+from core import db
+
+
+def _global_status(cursor, name: str) -> int:
+    cursor.execute("SHOW GLOBAL STATUS LIKE %s", (name,))
+    return int(cursor.fetchone()[1])
+
+
+@pytest.fixture(scope="module")
+def test_db():
+    probe = db.get_db_connection(db.DB_CONFIG, with_database=False)
+    if not probe:
+        pytest.skip("MySQL is not reachable")
+    probe.close()
+
+    original_name = db.DB_NAME
+    db.DB_NAME = f"{original_name}_test"
+    db.initialize_database()
+    yield db.DB_NAME
+
+    conn = db.get_db_connection(db.DB_CONFIG, with_database=False)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{db.DB_NAME}`")
+    cursor.close()
+    conn.close()
+    db.DB_NAME = original_name
+
+
+def _seed_history(user_id: str, sessions: int):
+    conn = db.get_db_connection(db.DB_CONFIG)
+    cursor = conn.cursor()
+    item_id = db._suggestion_item_id(cursor, "water_intake", {"title": "Water", "detail": "Drink water", "total": 8})
+    cursor.execute("INSERT INTO user_suggestions (userId, suggestionItemId) VALUES (%s, %s)", (user_id, item_id))
+    cursor.executemany(
+        "INSERT INTO workout_sessions (user_id, exercise, reps, accuracy, timestamp, duration, feedback_points) "
+        "VALUES (%s, 'squat', 10, 90.0, '2025-10-17T14:30:00.000Z', 60, '')",
+        [(user_id,)] * sessions
+    )
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def _count(table: str, column: str, user_id: str) -> int:
+    conn = db.get_db_connection(db.DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} = %s", (user_id,))
+    count = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    return count
+
+
+def _rows_written_by_update(profile) -> dict:
+    conn = db.get_db_connection(db.DB_CONFIG)
+    cursor = conn.cursor()
+    before = {name: _global_status(cursor, name) for name in ("Innodb_rows_deleted", "Innodb_rows_inserted")}
+    assert db.store_user_health_profile(profile)
+    after = {name: _global_status(cursor, name) for name in before}
+    cursor.close()
+    conn.close()
+    return {name: after[name] - before[name] for name in before}
+
+
+def test_update_keeps_dependent_rows(test_db):
+    profile = SAMPLE_PROFILE.model_copy(update={"userId": "upsert-keeps-history"})
+    assert db.store_user_health_profile(profile)
+    _seed_history(profile.userId, sessions=5)
+
+    assert db.store_user_health_profile(profile.model_copy(update={"age": profile.age + 1}))
+
+    assert db.get_user_health_profile(profile.userId).age == profile.age + 1
+    assert _count("workout_sessions", "user_id", profile.userId) == 5
+    assert _count("user_suggestions", "userId", profile.userId) == 1
+
+
+@pytest.mark.parametrize("sessions", [1, 500])
+def test_update_cost_does_not_scale_with_history(test_db, sessions):
+    profile = SAMPLE_PROFILE.model_copy(update={"userId": f"upsert-cost-{sessions}"})
+    assert db.store_user_health_profile(profile)
+    _seed_history(profile.userId, sessions=sessions)
+
+    written = _rows_written_by_update(profile.model_copy(update={"weight": profile.weight + 1}))
+
+    # REPLACE INTO deleted the profile plus every cascaded row and inserted the profile again.
+    assert written == {"Innodb_rows_deleted": 0, "Innodb_rows_inserted": 0}
+    assert _count("workout_sessions", "user_id", profile.userId) == sessions
+
+
+def test_unchanged_profile_notifies_nobody(test_db):
+    profile = SAMPLE_PROFILE.model_copy(update={"userId": "upsert-unchanged"})
+    assert db.store_user_health_profile(profile)
+    notified = []
+    db.on_profile_stored(notified.append)
+    try:
+        assert db.store_user_health_profile(profile)
+        assert notified == []
+        assert db.store_user_health_profile(profile.model_copy(update={"smokes": not profile.smokes}))
+        assert notified == [profile.userId]
+    finally:
+        db._profile_stored_listeners.remove(notified.append)
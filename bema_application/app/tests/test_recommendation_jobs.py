@@ -0,0 +1,49 @@
+"""
+services.recommendation_job_service: the bounded job queue and its worker threads.
+
+    cd bema_application/app && python -m pytest tests/test_recommendation_jobs.py
+"""
+import threading
+import time
+import pytest
+from benchmarks.fixtures import SAMPLE_PROFILE
+from models.recommendation_job import JobStatus
+from services.recommendation_job_service import JobQueueFullError, RecommendationJobQueue
+
+
+def _profile(n: int):
+    return SAMPLE_PROFILE.model_copy(update={"userId": f"job-user-{n}"})
+
+
+def test_duplicate_profiles_share_a_job_and_a_full_queue_rejects():
+    jobs = RecommendationJobQueue(runner=lambda profile, on_stage: None, max_workers=1, max_queue_size=2)
+    first, deduplicated = jobs.submit(_profile(0))
+    assert not deduplicated
+    assert jobs.submit(_profile(0)) == (first, True)
+    jobs.submit(_profile(1))
+    with pytest.raises(JobQueueFullError):
+        jobs.submit(_profile(2))
+
+
+def test_shutdown_with_a_full_queue_does_not_wait_out_the_timeout():
+    release = threading.Event()
+    running = threading.Semaphore(0)
+
+    def runner(profile, on_stage):
+        running.release()
+        release.wait(10)
+
+    jobs = RecommendationJobQueue(runner=runner, max_workers=2, max_queue_size=2)
+    jobs.start()
+    for n in range(2):
+        jobs.submit(_profile(n))
+    assert running.acquire(timeout=5) and running.acquire(timeout=5)
+    queued = [jobs.submit(_profile(n))[0] for n in (2, 3)]  # the queue is full again
+
+    # The running jobs finish shortly after shutdown begins.
+    threading.Timer(0.2, release.set).start()
+    started = time.perf_counter()
+    jobs.shutdown(timeout=5)
+    assert time.perf_counter() - started < 2
+    # Both workers stopped after their running job instead of starting the queued ones.
+    assert [jobs.get(job.job_id).status for job in queued] == [JobStatus.QUEUED, JobStatus.QUEUED]
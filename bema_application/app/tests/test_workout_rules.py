@@ -0,0 +1,120 @@
+"""
+services.workout_rules: the safety rules that exclude or cap squats, pushups and plank.
+
+    cd bema_application/app && python -m pytest tests/test_workout_rules.py
+"""
+from datetime import date
+import pytest
+from benchmarks.fixtures import SAMPLE_PROFILE
+from services.workout_rules import decide_workout_plan, default_reason
+
+# Young, active and without conditions: every exercise three times a day.
+HEALTHY = SAMPLE_PROFILE.model_copy(update={
+    "userId": "rules-user", "age": 30, "exercises": True,
+    "hasHighBloodPressure": False, "highBloodPressureTreatmentYears": None,
+})
+
+
+def _times(**changes) -> dict:
+    plan = decide_workout_plan(HEALTHY.model_copy(update=changes))
+    return {exercise: decision["times_per_day"] for exercise, decision in plan.items()}
+
+
+def _disability(description: str) -> dict:
+    return _times(hasDisabilitiesOrSpecialNeeds=True, disabilityDiscription=description)
+
+
+def _surgery(surgery_type: str, years_ago: int = 5) -> dict:
+    return _times(hadSurgeries=True, surgeryType=surgery_type, surgeryYear=date.today().year - years_ago)
+
+
+def test_healthy_active_user_gets_the_full_plan():
+    assert _times() == {"squats": 3, "pushups": 3, "plank": 3}
+
+
+def test_inactive_user_starts_at_once_a_day():
+    assert _times(exercises=False) == {"squats": 1, "pushups": 1, "plank": 1}
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("Uses a wheelchair", {"squats": 0, "pushups": 2, "plank": 2}),
+    ("Both knees replaced", {"squats": 0, "pushups": 2, "plank": 2}),
+    ("Multiple sclerosis", {"squats": 0, "pushups": 2, "plank": 2}),
+    ("Rotator cuff tear", {"squats": 2, "pushups": 0, "plank": 0}),
+    ("Carpal tunnel in both wrists", {"squats": 2, "pushups": 0, "plank": 0}),
+    ("Herniated disc", {"squats": 1, "pushups": 1, "plank": 0}),
+    ("Pregnant, second trimester", {"squats": 1, "pushups": 1, "plank": 0}),
+    ("Paraplegic, limited shoulder mobility", {"squats": 0, "pushups": 0, "plank": 0}),
+])
+def test_disability_keyword_classes(description, expected):
+    assert _disability(description) == expected
+
+
+@pytest.mark.parametrize("description", [
+    "Served in the army",
+    "Hearing loss since childhood, background noise is hard",
+    "Legally blind",
+    "Handicapped parking permit for autism",
+    "Dyslexia affects memos and forms",
+])
+def test_keywords_only_match_whole_words(description):
+    # None of these mention a body part, so the unmatched-disability fallback applies.
+    assert _disability(description) == {"squats": 1, "pushups": 1, "plank": 1}
+
+
+def test_unmatched_disability_caps_everything_at_once_a_day():
+    plan = decide_workout_plan(HEALTHY.model_copy(update={
+        "hasDisabilitiesOrSpecialNeeds": True, "disabilityDiscription": "Type 1 diabetes",
+    }))
+    assert {exercise: decision["times_per_day"] for exercise, decision in plan.items()} == {"squats": 1, "pushups": 1, "plank": 1}
+    assert all(decision["rules"] for decision in plan.values())
+
+
+def test_missing_disability_description_is_treated_as_unmatched():
+    assert _disability(None) == {"squats": 1, "pushups": 1, "plank": 1}
+
+
+@pytest.mark.parametrize("surgery_type, expected", [
+    ("knee replacement", {"squats": 0, "pushups": 2, "plank": 2}),
+    ("shoulder", {"squats": 2, "pushups": 0, "plank": 0}),
+    ("spinal fusion", {"squats": 2, "pushups": 0, "plank": 0}),
+    ("heart bypass", {"squats": 2, "pushups": 0, "plank": 0}),
+    ("appendix removal", {"squats": 2, "pushups": 2, "plank": 2}),
+])
+def test_old_surgery_only_rules_out_what_it_affects(surgery_type, expected):
+    assert _surgery(surgery_type, years_ago=5) == expected
+
+
+def test_recent_surgery_caps_everything_at_once_a_day():
+    assert _surgery("appendix removal", years_ago=0) == {"squats": 1, "pushups": 1, "plank": 1}
+    assert _surgery("knee replacement", years_ago=1) == {"squats": 0, "pushups": 1, "plank": 1}
+    assert _surgery("appendix removal", years_ago=2) == {"squats": 2, "pushups": 2, "plank": 2}
+
+
+def test_surgery_without_a_year_is_not_treated_as_recent():
+    assert _times(hadSurgeries=True, surgeryType="appendix removal", surgeryYear=None) == {"squats": 2, "pushups": 2, "plank": 2}
+
+
+def test_high_blood_pressure_limits_plank_most():
+    assert _times(hasHighBloodPressure=True) == {"squats": 2, "pushups": 2, "plank": 1}
+
+
+@pytest.mark.parametrize("age, expected", [
+    (64, {"squats": 2, "pushups": 2, "plank": 2}),
+    (65, {"squats": 1, "pushups": 1, "plank": 1}),
+    (80, {"squats": 1, "pushups": 1, "plank": 1}),
+])
+def test_users_65_and_older_are_capped_at_once_a_day(age, expected):
+    assert _times(age=age) == expected
+
+
+def test_exclusions_are_not_raised_by_later_caps():
+    assert _times(age=70, hasDisabilitiesOrSpecialNeeds=True, disabilityDiscription="Left leg amputation") == {
+        "squats": 0, "pushups": 1, "plank": 1
+    }
+
+
+def test_default_reason_explains_the_applied_rules():
+    plan = decide_workout_plan(HEALTHY.model_copy(update={"age": 70}))
+    assert "older age" in default_reason("plank", plan["plank"])
+    assert default_reason("plank", {"times_per_day": 0, "rules": []}) == "Doing plank is not recommended for you right now."
@@ -0,0 +1,218 @@
+import json
+import mmap
+import os
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Rows scored per step of the scan. Small blocks keep the float32 temporary in CPU cache,
+# which is ~3x faster than converting large slabs of codes at once.
+BLOCK_ROWS = 2048
+
+
+class CompactVectorIndex:
+    """
+    Append-only cosine-similarity index that keeps only int8 codes in memory.
+
+    Files in `directory`:
+        meta.json        dims, code dims, row count
+        codes.i8         (rows, code_dims) int8, memory-mapped and scanned for every query
+        scales.f32       (rows,) per-row dequantization scale
+        vectors.f32      (rows, dims) normalized float32 originals, read only to re-score candidates
+        pca.npy          (code_dims, dims) projection when the codes are dimension-reduced
+        documents.jsonl  one {"id", "document"} line per row
+
+    search() scans all codes with one vectorized NumPy product per block, takes the
+    best `k * rescore_factor` candidates and re-ranks them with the exact float
+    vectors, so the int8 (and PCA) error only decides which rows get re-scored.
+    Resident memory is code_dims + 4 bytes per row plus the OS page cache, instead
+    of 4 * dims bytes for float32.
+    """
+
+    def __init__(self, directory: str, dims: Optional[int] = None, rescore_factor: int = 10):
+        self.directory = directory
+        self.rescore_factor = rescore_factor
+        self._lock = threading.Lock()
+        self._codes = self._scales = None  # memory maps, reopened after appends
+        os.makedirs(directory, exist_ok=True)
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dims, self.code_dims, self._rows = meta["dims"], meta["code_dims"], meta["rows"]
+        else:
+            self.dims, self.code_dims, self._rows = dims, dims, 0
+        pca_path = self._path("pca.npy")
+        self._projection = np.load(pca_path) if os.path.exists(pca_path) else None
+        self._truncate_partial_append()
+        self._offsets = self._read_offsets()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _truncate_partial_append(self):
+        # meta.json is written last, so rows beyond its count belong to an interrupted add().
+        # Without meta.json (the first add() never finished) there are no committed rows at all.
+        for name, row_bytes in (("codes.i8", self.code_dims), ("scales.f32", 4), ("vectors.f32", 4 * (self.dims or 0))):
+            path = self._path(name)
+            size = self._rows * row_bytes if self.dims else 0
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def _read_offsets(self) -> np.ndarray:
+        offsets, position = [], 0
+        path = self._path("documents.jsonl")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if len(offsets) == self._rows:
+                        break
+                    offsets.append(position)
+                    position += len(line)
+            if os.path.getsize(path) > position:
+                os.truncate(path, position)
+        return np.array(offsets, dtype=np.int64)
+
+    def _write_meta(self):
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dims": self.dims, "code_dims": self.code_dims, "rows": self._rows}, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def count(self) -> int:
+        return self._rows
+
+    def resident_bytes(self) -> int:
+        """Bytes the scan touches per query (codes, scales, document offsets)."""
+        return self._rows * (self.code_dims + 4 + 8)
+
+    def fit_pca(self, sample: np.ndarray, code_dims: int):
+        """
+        Reduces the codes to `code_dims` dimensions using the top principal axes of
+        `sample` (uncentered, which best preserves inner products). Only before the first add().
+        """
+        if self._rows:
+            raise ValueError("PCA must be fitted before any vectors are added.")
+        sample = _normalize(np.asarray(sample, dtype=np.float32))
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        self._projection = vt[:code_dims].astype(np.float32)
+        self.dims, self.code_dims = sample.shape[1], code_dims
+        np.save(self._path("pca.npy"), self._projection)
+        self._write_meta()
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        reduced = vectors @ self._projection.T if self._projection is not None else vectors
+        scales = np.abs(reduced).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(reduced / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def add(self, ids: Sequence[str], embeddings, documents: Sequence[str]):
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dims is None:
+                self.dims = self.code_dims = vectors.shape[1]
+            if vectors.shape[1] != self.dims:
+                raise ValueError(f"Expected {self.dims}-d embeddings, got {vectors.shape[1]}-d.")
+            codes, scales = self._encode(vectors)
+            with open(self._path("codes.i8"), "ab") as f:
+                f.write(codes.tobytes())
+            with open(self._path("scales.f32"), "ab") as f:
+                f.write(scales.tobytes())
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            path = self._path("documents.jsonl")
+            position = os.path.getsize(path) if os.path.exists(path) else 0
+            offsets = []
+            with open(path, "ab") as f:
+                for entry_id, document in zip(ids, documents):
+                    line = (json.dumps({"id": entry_id, "document": document}) + "\n").encode("utf-8")
+                    offsets.append(position)
+                    f.write(line)
+                    position += len(line)
+            self._rows += len(vectors)
+            self._write_meta()
+            self._offsets = np.concatenate([self._offsets, np.array(offsets, dtype=np.int64)])
+            self._codes = self._scales = None
+
+    def _maps(self):
+        with self._lock:
+            if self._codes is None and self._rows:
+                self._codes = _map(self._path("codes.i8"), np.int8, (self._rows, self.code_dims), "MADV_SEQUENTIAL")
+                self._scales = _map(self._path("scales.f32"), np.float32, (self._rows,), "MADV_SEQUENTIAL")
+            return self._codes, self._scales, self._offsets
+
+    def search(self, embedding, k: int) -> List[Tuple[str, str, float]]:
+        """The k most similar rows as (id, document, cosine similarity), best first."""
+        codes, scales, offsets = self._maps()
+        if codes is None:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        reduced = self._projection @ query if self._projection is not None else query
+
+        rows = len(codes)
+        approximate = np.empty(rows, dtype=np.float32)
+        for start in range(0, rows, BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS]
+            approximate[start:start + len(block)] = (block.astype(np.float32) @ reduced) * scales[start:start + len(block)]
+
+        candidates = min(rows, max(k * self.rescore_factor, k))
+        top = np.argpartition(-approximate, candidates - 1)[:candidates] if candidates < rows else np.arange(rows)
+        top.sort()  # forward reads through vectors.f32
+        exact = self._read_vectors(top) @ query
+        order = np.argsort(-exact)[:k]
+        return [(*self._document(offsets[top[i]]), float(exact[i])) for i in order]
+
+    def _read_vectors(self, rows: np.ndarray) -> np.ndarray:
+        # Plain reads rather than a memory map: faulting in single rows of a mapping pulls in
+        # the surrounding pages too, and the process would soon have the whole file resident.
+        row_bytes = 4 * self.dims
+        with open(self._path("vectors.f32"), "rb") as f:
+            data = bytearray()
+            for row in rows:
+                f.seek(int(row) * row_bytes)
+                data += f.read(row_bytes)
+        return np.frombuffer(bytes(data), dtype=np.float32).reshape(len(rows), self.dims)
+
+    def _document(self, offset: int) -> Tuple[str, str]:
+        with open(self._path("documents.jsonl"), "rb") as f:
+            f.seek(offset)
+            entry = json.loads(f.readline())
+        return entry["id"], entry["document"]
+
+
+def _map(path: str, dtype, shape: tuple, advice: str) -> np.ndarray:
+    """Read-only memory map of the first prod(shape) items of `path`, with an madvise() access hint."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, advice):  # no madvise() on Windows
+        mapped.madvise(getattr(mmap, advice))
+    return np.frombuffer(mapped, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class CompactCollection:
+    """The part of the Chroma collection API that chat memory uses, on top of a CompactVectorIndex."""
+
+    def __init__(self, directory: str, embed_documents: Callable[[List[str]], List[List[float]]]):
+        self.index = CompactVectorIndex(directory)
+        self.embed_documents = embed_documents
+
+    def count(self) -> int:
+        return self.index.count()
+
+    def add(self, ids: List[str], documents: List[str]):
+        self.index.add(ids, self.embed_documents(documents), documents)
+
+    def query(self, query_texts: List[str], n_results: int = 10) -> dict:
+        results = [self.index.search(embedding, n_results) for embedding in self.embed_documents(query_texts)]
+        return {
+            "ids": [[entry_id for entry_id, _, _ in hits] for hits in results],
+            "documents": [[document for _, document, _ in hits] for hits in results],
+            "distances": [[1.0 - score for _, _, score in hits] for hits in results],
+        }
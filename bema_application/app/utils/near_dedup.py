@@ -0,0 +1,63 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Tuple
+import numpy as np
+
+# Mersenne prime for the universal hash family h(x) = (a*x + b) mod p over 32-bit shingle hashes.
+_PRIME = np.uint64((1 << 61) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text: str, size: int) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) whose LSH S-curve (1/bands)^(1/rows) is closest to `threshold`."""
+    pairs = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(pairs, key=lambda p: abs((1 / p[0]) ** (1 / p[1]) - threshold))
+
+
+def minhash_signatures(texts: List[str], num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> np.ndarray:
+    """One MinHash signature per text (num_perm uint64 values) over lowercase word shingles."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in _shingles(text, shingle_size)), dtype=np.uint64
+        )
+        # a, b and the hashes are < 2^32, so a*x + b can't overflow uint64.
+        signatures[i] = ((np.outer(hashes, a) + b) % _PRIME).min(axis=0)
+    return signatures
+
+
+def near_duplicate_indices(
+    texts: List[str], threshold: float, num_perm: int = 128, shingle_size: int = 5
+) -> List[int]:
+    """
+    Indices of texts that are near-duplicates (estimated Jaccard similarity of
+    word shingles >= threshold) of an earlier text. The first occurrence is kept.
+
+    Candidate pairs come from LSH banding of MinHash signatures, so the cost grows
+    with the number of texts, not the number of pairs; every candidate is then
+    checked against the threshold with the full signature.
+    """
+    signatures = minhash_signatures(texts, num_perm, shingle_size)
+    bands, rows = _lsh_bands(num_perm, threshold)
+    buckets = defaultdict(list)  # (band, band hash) -> kept text indices
+    duplicates = []
+    for i, signature in enumerate(signatures):
+        keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+        candidates = {j for key in keys for j in buckets.get(key, ())}
+        if any(np.mean(signatures[j] == signature) >= threshold for j in candidates):
+            duplicates.append(i)
+            continue
+        for key in keys:
+            buckets[key].append(i)
+    return duplicates
@@ -1,11 +1,13 @@
 import os
-from typing import List
+import time
+from typing import Callable, List, Optional, Tuple
 from langchain_community.document_loaders import WebBaseLoader, PyMuPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.vectorstores import VectorStoreRetriever
-from functools import lru_cache
+from core.model_registry import model_registry
+from utils.near_dedup import near_duplicate_indices
 
 # --- NEW: Define paths using environment variables with sane defaults ---
 # This is the path INSIDE the container where the volume will be mounted.
@@ -14,22 +16,94 @@ PERSIST_DIRECTORY = os.getenv("PERSIST_DIRECTORY", "core/chroma_db")
 DATA_DIRECTORY = os.getenv("DATA_DIRECTORY", "data")
 VECTORSTORE_HOST = os.getenv("VECTORSTORE_HOST", "localhost")
 VECTORSTORE_PORT = os.getenv("VECTORSTORE_PORT", "8000")
+# "embedded": every process opens the store on disk. "http": all workers share the Chroma server
+# at VECTORSTORE_HOST:VECTORSTORE_PORT, so the index is held once and chat history writes don't race on SQLite.
+CHROMA_MODE = os.getenv("CHROMA_MODE", "embedded")
+# Chunks whose word-shingle Jaccard similarity to an earlier chunk is at least this are
+# dropped before embedding (the source PDFs overlap heavily). 0 turns deduplication off.
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.85"))
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+RAG_COLLECTION_NAME = "rag-chroma"
+
+# Sources the RAG index is built from (see services.rag_index_service).
+RAG_SOURCE_URLS = [
+    "https://developers.googleblog.com/en/a2a-a-new-era-of-agent-interoperability/",
+    "https://a2a-protocol.org/latest/",
+]
+RAG_PDF_FILENAMES = [
+    "alzheimers_dementia.pdf", "home_care.pdf", "Daily_routine_DOC.pdf",
+    "Life_Behavior_Monitoring_App_User_Responses.pdf", "LifestyleDiseasesEnglishFolder.pdf",
+]
+
+# (stage, done, total) callback used to report index build progress.
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def _embeddings_for(embedding_model_name: str) -> HuggingFaceEmbeddings:
+    """The default MiniLM model is loaded once through the registry and shared with chat memory."""
+    if embedding_model_name == EMBEDDING_MODEL_NAME:
+        return model_registry.get("embeddings")
+    return HuggingFaceEmbeddings(model_name=embedding_model_name)
+
+
+def get_embeddings() -> HuggingFaceEmbeddings:
+    return model_registry.get("embeddings")
+
+
+def _create_chroma_client():
+    import chromadb
+    from chromadb.config import Settings
+    print(f"Connecting to Chroma server at {VECTORSTORE_HOST}:{VECTORSTORE_PORT}...")
+    return chromadb.HttpClient(
+        host=VECTORSTORE_HOST, port=int(VECTORSTORE_PORT), settings=Settings(anonymized_telemetry=False)
+    )
+
+
+def get_chroma_client():
+    """
+    The process-wide Chroma HTTP client (CHROMA_MODE=http). Both collections share it,
+    so requests reuse its keep-alive connections instead of reconnecting per call.
+    """
+    return model_registry.get("chroma_client")
+
+
+def chroma_store_args(persist_directory: str) -> dict:
+    """Where a langchain Chroma store lives: the shared server in http mode, otherwise `persist_directory`."""
+    if CHROMA_MODE == "http":
+        return {"client": get_chroma_client()}
+    return {"persist_directory": persist_directory}
+
+
+def default_sources() -> Tuple[List[str], List[str]]:
+    """The URLs and local PDF paths (under DATA_DIRECTORY) of the RAG index."""
+    return list(RAG_SOURCE_URLS), [os.path.join(DATA_DIRECTORY, fname) for fname in RAG_PDF_FILENAMES]
 
 
 def create_vector_store(
     urls: List[str],
     pdf_paths: List[str],
-    embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    embedding_model_name: str = EMBEDDING_MODEL_NAME,
     chunk_size: int = 1000,
     chunk_overlap: int = 200,
     persist_directory: str = PERSIST_DIRECTORY, # Use the global var
-    collection_name: str = "rag-chroma"
-) -> bool:
+    collection_name: str = RAG_COLLECTION_NAME,
+    embed_batch_size: int = 64,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+    on_progress: Optional[ProgressCallback] = None
+) -> Optional[dict]:
     """
     Loads documents, creates embeddings, and persists a new vector store.
+    Chunks are embedded `embed_batch_size` at a time so `on_progress` can report how far along it is.
+
+    Returns build stats (chunk counts, near-duplicates removed, embedding time and
+    the estimated time saved, index size on disk), or None if nothing was loaded.
     """
     print("--- Creating New Vector Store ---")
+    report = on_progress or (lambda stage, done, total: None)
     all_docs = []
+    sources_total = len(urls or []) + len(pdf_paths or [])
+    sources_done = 0
+    report("loading", 0, sources_total)
 
     # 1. Load from Web URLs
     if urls:
@@ -43,14 +117,18 @@ def create_vector_store(
                 print(f"  Successfully loaded: {url}")
             except Exception as e:
                 print(f"  Failed to load URL {url}: {e}")
+            sources_done += 1
+            report("loading", sources_done, sources_total)
 
     # 2. Load from Local PDFs
     if pdf_paths:
         print(f"\nLoading {len(pdf_paths)} document(s) from local PDF files...")
         # ... (no changes in this block)
         for pdf_path in pdf_paths:
+            sources_done += 1
             if not os.path.exists(pdf_path):
                 print(f"  Warning: File not found at {pdf_path}, skipping.")
+                report("loading", sources_done, sources_total)
                 continue
             try:
                 loader = PyMuPDFLoader(pdf_path)
@@ -59,10 +137,11 @@ def create_vector_store(
                 print(f"  Successfully loaded: {pdf_path}")
             except Exception as e:
                 print(f"  Failed to load PDF {pdf_path}: {e}")
+            report("loading", sources_done, sources_total)
     
     if not all_docs:
         print("\nNo documents were loaded. Exiting vector store creation.")
-        return False
+        return None
 
     # 3. Split Documents into Chunks
     print(f"\nSplitting {len(all_docs)} loaded documents into chunks...")
@@ -71,47 +150,83 @@ def create_vector_store(
     )
     doc_splits = text_splitter.split_documents(all_docs)
     print(f"  Created {len(doc_splits)} document chunks.")
+    stats = {"documents": len(all_docs), "chunks": len(doc_splits), "duplicates_removed": 0}
+
+    # 3b. Drop near-duplicate chunks (overlapping sources, chunk overlap) before paying to embed them
+    if dedup_threshold > 0 and doc_splits:
+        report("deduplicating", 0, len(doc_splits))
+        started = time.perf_counter()
+        duplicates = set(near_duplicate_indices([doc.page_content for doc in doc_splits], dedup_threshold))
+        doc_splits = [doc for i, doc in enumerate(doc_splits) if i not in duplicates]
+        stats.update(duplicates_removed=len(duplicates), dedup_seconds=round(time.perf_counter() - started, 3))
+        print(f"  Removed {len(duplicates)} near-duplicate chunk(s) (threshold {dedup_threshold}) in {stats['dedup_seconds']}s.")
 
     # 4. Initialize Embedding Model
     print(f"\nInitializing embedding model: {embedding_model_name}...")
-    embeddings = HuggingFaceEmbeddings(model_name=embedding_model_name)
+    embeddings = _embeddings_for(embedding_model_name)
 
     # 5. Create and Persist Vector Store
-    print(f"\nCreating and persisting new vector store in '{persist_directory}'...")
-    Chroma.from_documents(
-        documents=doc_splits,
-        embedding=embeddings,
-        persist_directory=persist_directory,
+    location = f"{VECTORSTORE_HOST}:{VECTORSTORE_PORT}" if CHROMA_MODE == "http" else persist_directory
+    print(f"\nCreating and persisting new vector store '{collection_name}' in '{location}'...")
+    vectorstore = Chroma(
         collection_name=collection_name,
+        embedding_function=embeddings,
+        **chroma_store_args(persist_directory),
     )
+    report("embedding", 0, len(doc_splits))
+    started = time.perf_counter()
+    for start in range(0, len(doc_splits), embed_batch_size):
+        batch = doc_splits[start:start + embed_batch_size]
+        vectorstore.add_documents(batch)
+        report("embedding", start + len(batch), len(doc_splits))
+    embedding_seconds = time.perf_counter() - started
     print("  Vector store created and saved successfully.")
-    return True
+
+    per_chunk = embedding_seconds / len(doc_splits) if doc_splits else 0.0
+    stats.update(
+        embedded_chunks=len(doc_splits),
+        embedding_seconds=round(embedding_seconds, 3),
+        embedding_seconds_saved=round(per_chunk * stats["duplicates_removed"], 3),
+        index_bytes=_directory_bytes(persist_directory) if CHROMA_MODE != "http" else None,
+    )
+    size_note = f", index {stats['index_bytes'] / 2**20:.1f} MiB" if stats["index_bytes"] is not None else ""
+    print(
+        f"  Embedded {len(doc_splits)} of {stats['chunks']} chunks in {embedding_seconds:.1f}s "
+        f"(~{stats['embedding_seconds_saved']:.1f}s saved by deduplication{size_note})."
+    )
+    return stats
 
 
-@lru_cache(maxsize=1)
-def get_retriever(
+def _directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files
+    )
+
+
+def load_retriever(
     persist_directory: str = PERSIST_DIRECTORY, # Use the global var
-    embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
-    collection_name: str = "rag-chroma"
+    embedding_model_name: str = EMBEDDING_MODEL_NAME,
+    collection_name: str = RAG_COLLECTION_NAME
 ) -> VectorStoreRetriever:
     """
     Loads an existing vector store from disk and returns a retriever.
+    Use services.rag_index_service.get_retriever() for the active (versioned) index.
     """
     print("--- Loading Retriever from Existing Vector Store ---")
 
-    if not os.path.exists(persist_directory):
+    if CHROMA_MODE != "http" and not os.path.exists(persist_directory):
         print(f"Error: Persist directory '{persist_directory}' not found.")
         return None
 
     # ... (rest of the function is unchanged)
     print(f"\nInitializing embedding model: {embedding_model_name}...")
-    embeddings = HuggingFaceEmbeddings(model_name=embedding_model_name)
+    embeddings = _embeddings_for(embedding_model_name)
 
-    print(f"\nLoading existing vector store from '{persist_directory}'...")
+    print(f"\nLoading existing vector store '{collection_name}'...")
     vectorstore = Chroma(
         collection_name=collection_name,
-        persist_directory=persist_directory,
-        embedding_function=embeddings
+        embedding_function=embeddings,
+        **chroma_store_args(persist_directory)
     )
     print("Vector store loaded successfully.")
     
@@ -119,29 +234,12 @@ def get_retriever(
     print("--- Retriever is ready. ---")
     return retriever
 
-def check_and_create_vector_store():
-    """Checks if the vector store exists, creates it if not."""
-    print("\n---  Checking for Vector Store (ChromaDB) ---")
-    if not os.path.exists(PERSIST_DIRECTORY) or not os.listdir(PERSIST_DIRECTORY):
-        print(f"Vector store not found in '{PERSIST_DIRECTORY}'. Creating a new one.")
-        
-        URLS_TO_SCRAPE = [
-            "https://developers.googleblog.com/en/a2a-a-new-era-of-agent-interoperability/",
-            "https://a2a-protocol.org/latest/",
-        ]
-        
-        pdf_filenames = [
-            "alzheimers_dementia.pdf", "home_care.pdf", "Daily_routine_DOC.pdf",
-            "Life_Behavior_Monitoring_App_User_Responses.pdf", "LifestyleDiseasesEnglishFolder.pdf",
-        ]
-        
-        # Create full paths
-        LOCAL_PDF_PATHS = [os.path.join(DATA_DIRECTORY, fname) for fname in pdf_filenames]
-
-        create_vector_store(urls=URLS_TO_SCRAPE, pdf_paths=LOCAL_PDF_PATHS)
-    else:
-        print(" ✅ Vector store already exists. Skipping creation.")
 
+# Startup loading and warmup (see main.lifespan). The RAG retriever itself is
+# registered by services.rag_index_service, which owns the active index version.
+model_registry.register("embeddings", lambda: HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), warmup=lambda embeddings: embeddings.embed_query("warmup"))
+if CHROMA_MODE == "http":
+    model_registry.register("chroma_client", _create_chroma_client, warmup=lambda client: client.heartbeat())
 
 
 # --- Example Usage ---
@@ -0,0 +1,94 @@
+import json
+import re
+from typing import List, Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonStringFieldExtractor:
+    """
+    Pulls the value of one top-level string field out of a JSON document that
+    arrives in fragments (e.g. streamed LLM output), without waiting for the
+    document to be complete.
+
+        extractor = JsonStringFieldExtractor("answer")
+        extractor.feed('{"answer": "Drink wa')   # -> "Drink wa"
+        extractor.feed('ter.", "justif')         # -> "ter."
+    """
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._in_value = False
+        self.done = False
+
+    def feed(self, fragment: str) -> str:
+        """Adds the next fragment; returns the newly decoded characters of the field value."""
+        if self.done:
+            return ""
+        self._buffer += fragment
+        if not self._in_value:
+            match = self._key.search(self._buffer)
+            if not match:
+                return ""
+            self._buffer = self._buffer[match.end():]
+            self._in_value = True
+
+        out = []
+        i = 0
+        while i < len(self._buffer):
+            char = self._buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            # Escape sequence: wait for the rest of it if it is split across fragments.
+            if i + 1 >= len(self._buffer):
+                break
+            code = self._buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(self._buffer):
+                    break
+                out.append(json.loads(f'"{self._buffer[i:i + 6]}"'))
+                i += 6
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._buffer = self._buffer[i:]
+        return "".join(out)
+
+
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+
+class SentenceSplitter:
+    """
+    Splits streamed text into sentences as soon as each one is complete.
+    Sentences shorter than `min_chars` are merged with the next one, so that
+    abbreviations and very short fragments don't become separate TTS calls.
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Returns whatever is left once the stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None